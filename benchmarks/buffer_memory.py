@@ -0,0 +1,84 @@
+"""Measure how much time and memory repeated splicing costs on a large
+document, with plain str splicing and with a TextBuffer.
+
+Run from the repository root:
+
+    python -m benchmarks.buffer_memory [size in MB] [number of edits]
+"""
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from helper_files import helpers as dbl
+from helper_files.text_buffer import TextBuffer
+
+PARAGRAPH = ('The kernel of the linear map is a subspace (Smith, p. 12) and so '
+             'is its image, since \\(T(0) = 0\\). ')
+EQUATION = '\\[{y = a_{1}x + a_{2}x^{2} + a_{3}x^{3}}\\]\n\n'
+
+
+def make_document(size: int) -> str:
+    """Return a document of about size characters made of paragraphs,
+    display equations and page citations.
+    """
+    block = PARAGRAPH * 3 + '\n\n' + EQUATION
+    return block * (size // len(block) + 1)
+
+
+def splice_str(text: str, edits: int) -> str:
+    """Wrap the first edits display equations in text, splicing a str."""
+    pos = 0
+    for _ in range(edits):
+        pos = text.find('\\[', pos)
+        if pos == -1:
+            break
+        text = text[:pos] + '\\[\\displaystyle ' + text[pos + 2:]
+        pos += 2
+    return text
+
+
+def splice_buffer(text: str, edits: int) -> str:
+    """Same as splice_str, but with a TextBuffer."""
+    buffer = TextBuffer(text)
+    pos = 0
+    for _ in range(edits):
+        pos = buffer.find('\\[', pos)
+        if pos == -1:
+            break
+        buffer.splice(pos, pos + 2, '\\[\\displaystyle ')
+        pos += 2
+    return str(buffer)
+
+
+def measure(name: str, func: Callable[[], str]) -> str:
+    """Run func twice, once to time it and once with tracemalloc on, print
+    its running time and peak traced memory, and return what it returned.
+    """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:40s} {elapsed:8.3f} s {peak / 2 ** 20:8.1f} MB peak')
+    return result
+
+
+def main(size_mb: float = 5, edits: int = 2000) -> None:
+    """Print the measurements for a document of size_mb megabytes."""
+    text = make_document(int(size_mb * 2 ** 20))
+    print(f'document: {len(text) / 2 ** 20:.1f} MB, {edits} edits')
+    by_str = measure('str splicing', lambda: splice_str(text, edits))
+    by_buffer = measure('TextBuffer splicing', lambda: splice_buffer(text, edits))
+    assert by_str == by_buffer
+    measure('modify_equations (whole document)',
+            lambda: dbl.modify_equations(text, lambda eq: eq.replace('x', 'x ')))
+    measure('citation_page_handler (whole document)',
+            lambda: dbl.citation_page_handler(text, 'Smith', 'apa2', True,
+                                              cite_properities={'citation_kw': 'cite'}))
+
+
+if __name__ == '__main__':
+    main(*[float(arg) if i == 0 else int(arg) for i, arg in enumerate(sys.argv[1:])])
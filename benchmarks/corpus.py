@@ -0,0 +1,264 @@
+"""Synthetic documents that look like what pandoc produces for a Word file.
+
+The documents are dense in everything latex_repair has to deal with:
+alignment regions written the way Word writes them (\\[{...}{...}\\]),
+longtables, tables used as environments and frames, verbatims, \\text{}
+groups, page citations and a bibliography.
+
+The same size and seed always give the same document.
+"""
+import random
+
+PREAMBLE = r"""\documentclass[
+]{article}
+\usepackage{amsmath,amssymb}
+\usepackage{lmodern}
+\usepackage{iftex}
+\ifPDFTeX
+  \usepackage[T1]{fontenc}
+  \usepackage[utf8]{inputenc}
+  \usepackage{textcomp} % provide euro and other symbols
+\else % if luatex or xetex
+  \usepackage{unicode-math}
+  \defaultfontfeatures{Scale=MatchLowercase}
+  \defaultfontfeatures[\rmfamily]{Ligatures=TeX,Scale=1}
+\fi
+\usepackage{longtable,booktabs,array}
+\usepackage{graphicx}
+\usepackage{hyperref}
+\hypersetup{
+  hidelinks,
+  pdfcreator={LaTeX via pandoc}}
+\urlstyle{same} % disable monospaced font for URLs
+\setlength{\emergencystretch}{3em} % prevent overfull lines
+\providecommand{\tightlist}{%
+  \setlength{\itemsep}{0pt}\setlength{\parskip}{0pt}}
+\setcounter{secnumdepth}{-\maxdimen} % remove section numbering
+\ifLuaTeX
+  \usepackage{selnolig}  % disable illegal ligatures
+\fi
+
+\author{}
+\date{}
+
+\begin{document}
+"""
+
+WORDS = ('the matrix vector space linear map basis kernel image rank proof '
+         'follows since every element is mapped onto a unique value and hence '
+         'we conclude that it holds for all real numbers x in the set').split()
+ENVIRONMENTS = ['Theorem', 'Lemma', 'Corollary', 'Proposition', 'Conjecture', 'Remark',
+                'Note', 'Claim', 'Definition', 'Condition', 'Problem', 'Example']
+CITATION_KEYS = ['Smith2020', 'Jones2019', 'Nguyen2021', 'Garcia2018']
+INLINE_MATH = [r'\(x^{2} + y\)', r'\(\alpha + \beta\)', r'\(\frac{dy}{dx}\)',
+               r'\(\overset{⃑}{v}\)', r'\(f^{′}(x)\)', r'\(\text{α is fine}\)',
+               r'\(A \subseteq B\)', r'\(\text{if }x > 0\)', r'\(\sum_{i = 1}^{n}i\)']
+BIB_ENTRY = """@book{%s,
+  title = {A book about {Things}},
+  author = {Someone},
+  year = {2020},
+}"""
+MINIPAGE = '\\begin{minipage}[b]{\\linewidth}\\raggedright\n%s\n\\end{minipage}'
+
+
+class _Generator:
+    """Generates the blocks of a document.
+
+    Instance Attributes:
+        - rand: where every random choice comes from.
+        - sections: how many sections were generated so far.
+        - tables: how many captioned tables were generated so far.
+        - figures: how many figures were generated so far.
+        - equations: how many numbered equations were generated so far.
+        - verbatims: how many verbatims were generated so far.
+    """
+    rand: random.Random
+    sections: int
+    tables: int
+    figures: int
+    equations: int
+    verbatims: int
+
+    def __init__(self, seed: int) -> None:
+        self.rand = random.Random(seed)
+        self.sections = self.tables = self.figures = self.equations = self.verbatims = 0
+
+    def words(self, n: int) -> str:
+        """Return n random words."""
+        return ' '.join(self.rand.choice(WORDS) for _ in range(n))
+
+    def paragraph(self) -> str:
+        """Return a paragraph with inline math, citations and references."""
+        r = self.rand
+        parts = []
+        for _ in range(r.randint(2, 6)):
+            parts.append(self.words(r.randint(4, 14)))
+            x = r.random()
+            if x < 0.35:
+                parts.append(r.choice(INLINE_MATH))
+            elif x < 0.42:
+                parts.append('(%s, p. %d)' % (r.choice(CITATION_KEYS), r.randint(1, 300)))
+            elif x < 0.47:
+                parts.append('(%s)' % r.choice(CITATION_KEYS))
+            elif x < 0.50:
+                parts.append('(%s, %s)' % (CITATION_KEYS[0], CITATION_KEYS[1]))
+            elif x < 0.55 and self.tables:
+                parts.append('Table %d' % r.randint(1, self.tables))
+            elif x < 0.58 and self.equations:
+                parts.append('Equation %d' % r.randint(1, self.equations))
+            elif x < 0.62:
+                parts.append(r'\texttt{code\_%d}' % r.randint(1, 99))
+            elif x < 0.64:
+                parts.append('½ of the LaTeX ones')
+        return ' '.join(parts) + '.'
+
+    def display(self) -> str:
+        """Return a display equation, a matrix equation, an alignment region
+        or a numbered alignment region.
+        """
+        r = self.rand
+        x = r.random()
+        if x < 0.3:
+            terms = ' + '.join('a_{%d}x^{%d}' % (i, i) for i in range(r.randint(3, 40)))
+            return '\\[y = ' + terms + '\\]'
+        if x < 0.5:
+            return ('\\[\\begin{bmatrix}\n1 & 2 \\\\\n3 & 4 \\\\\n\\end{bmatrix}'
+                    '\\overset{⃑}{x} = \\overset{⃑}{b}\\]')
+        if x < 0.8:
+            lines = ''.join('{y_{%d} = %s}' % (i, ' + '.join(['x'] * r.randint(1, 30)))
+                            for i in range(r.randint(2, 5)))
+            return '\\[' + lines + '\\]'
+        self.equations += 1
+        return ('\\[{\\begin{matrix}\nf(x) = x^{2} + 1\\#(%d) \\\\\n\\end{matrix}\n}'
+                '{\\begin{matrix}\ng(x) = 2x\\#(%d.1) \\\\\n\\end{matrix}\n}\\]') % (self.equations, self.equations)
+
+    def environment(self) -> str:
+        """Return a paragraph that starts the way environments do in Word."""
+        name = self.rand.choice(ENVIRONMENTS)
+        form = self.rand.random()
+        if form < 0.4:
+            head = '\\textbf{%s - %s:}' % (name, self.words(2))
+        elif form < 0.7:
+            head = '\\textbf{%s} (%s).' % (name, self.words(2))
+        else:
+            head = '\\textbf{%s.}' % name
+        return head + ' ' + self.paragraph()
+
+    def proof(self) -> str:
+        """Return a proof."""
+        return '\\emph{Proof.} ' + self.paragraph() + ' \\(\\blacksquare\\)'
+
+    def table(self) -> str:
+        """Return a captioned longtable."""
+        r = self.rand
+        self.tables += 1
+        cols = r.randint(2, 4)
+        head = ' & '.join(MINIPAGE % self.words(1) for _ in range(cols))
+        rows = '\n'.join(' & '.join(r.choice([self.words(2), '\\(x + 1\\)', str(r.randint(1, 99))])
+                                    for _ in range(cols)) + ' \\\\' for _ in range(r.randint(2, 8)))
+        return (_longtable_start(cols) + head + ' \\\\\n\\midrule()\n\\endhead\n' + rows +
+                '\n\\bottomrule()\n\\end{longtable}\n\nTable %d: %s' % (self.tables, self.words(5)))
+
+    def environment_table(self) -> str:
+        """Return a one column table used as an environment, or a 1x1 table,
+        which is framed.
+        """
+        if self.rand.random() < 0.25:
+            return (_longtable_start(1) + MINIPAGE % self.paragraph() +
+                    ' \\\\\n\\midrule()\n\\endhead\n\\bottomrule()\n\\end{longtable}')
+        rows = self.words(2) + ' \\\\\n' + self.paragraph() + ' ' + self.rand.choice(INLINE_MATH) + ' \\\\'
+        return (_longtable_start(1) + MINIPAGE % self.rand.choice(ENVIRONMENTS) +
+                ' \\\\\n\\midrule()\n\\endhead\n' + rows + '\n\\bottomrule()\n\\end{longtable}')
+
+    def figure(self) -> str:
+        """Return a captioned image."""
+        self.figures += 1
+        return ('\\includegraphics[width=3.5in,height=2.1in]{media/image%d.png}\n\n'
+                'Figure %d: %s' % (self.figures, self.figures, self.words(4)))
+
+    def verbatim(self) -> str:
+        """Return a verbatim with a language declaration and curly quotes."""
+        self.verbatims += 1
+        return '\\begin{verbatim}\n# python\ndef f%d(x):\n    return “x” + 1\n\\end{verbatim}' % self.verbatims
+
+    def itemize(self) -> str:
+        """Return a list of quoted items."""
+        items = '\n'.join('\\item\n  “%s”' % self.words(4) for _ in range(self.rand.randint(2, 5)))
+        return '\\begin{itemize}\n\\tightlist\n' + items + '\n\\end{itemize}'
+
+    def block(self) -> str:
+        """Return a random block."""
+        x = self.rand.random()
+        if x < 0.40:
+            return self.paragraph()
+        if x < 0.58:
+            return self.display()
+        if x < 0.66:
+            return self.environment()
+        if x < 0.70:
+            return self.proof()
+        if x < 0.76:
+            return self.table()
+        if x < 0.80:
+            return self.environment_table()
+        if x < 0.84:
+            return self.figure()
+        if x < 0.88:
+            return self.verbatim()
+        if x < 0.93:
+            return self.itemize()
+        return self.paragraph()
+
+    def section(self) -> str:
+        """Return a section or subsection header, with its hypertarget."""
+        self.sections += 1
+        level = 'section' if self.rand.random() < 0.6 else 'subsection'
+        title = self.words(3)
+        slug = title.replace(' ', '-') + '-%d' % self.sections
+        return '\\hypertarget{%s}{%%\n\\%s{%s}\\label{%s}}' % (slug, level, title, slug)
+
+
+def _longtable_start(cols: int) -> str:
+    """Return the start of a longtable with cols columns, up to its header row."""
+    spec = '\n'.join('  >{\\raggedright\\arraybackslash}p{(\\columnwidth - %d\\tabcolsep) * \\real{%.2f}}'
+                     % (2 * cols - 2, 1 / cols) for _ in range(cols))
+    return '\\begin{longtable}[]{@{}\n' + spec + '@{}}\n\\toprule()\n'
+
+
+def make_document(size: int, seed: int = 0) -> str:
+    """Return a synthetic pandoc standalone document of roughly size characters.
+
+    >>> make_document(1000) == make_document(1000)
+    True
+    >>> make_document(1000).endswith('\\\\end{document}\\n')
+    True
+    """
+    gen = _Generator(seed)
+    blocks = ['\\textbf{Abstract} ' + gen.paragraph()]
+    total = len(PREAMBLE) + len(blocks[0])
+    while total < size:
+        new_blocks = [gen.section()] + [gen.block() for _ in range(gen.rand.randint(3, 12))]
+        blocks.extend(new_blocks)
+        total += sum(len(block) + 2 for block in new_blocks)
+    blocks.append('\\hypertarget{bibliography}{%\n\\section{Bibliography}\\label{bibliography}}')
+    blocks.append('\\begin{verbatim}\n' + '\n\n'.join(BIB_ENTRY % key for key in CITATION_KEYS) +
+                  '\n\\end{verbatim}')
+    return PREAMBLE + '\n\n'.join(blocks) + '\n\n\\end{document}\n'
+
+
+def make_table_document(tables: int, seed: int = 0) -> str:
+    """Return a synthetic pandoc standalone document with exactly tables
+    longtables, most of them captioned and the rest used as environments
+    or frames, with a paragraph before each of them.
+
+    >>> make_table_document(25).count('\\\\begin{longtable}')
+    25
+    """
+    gen = _Generator(seed)
+    blocks = ['\\textbf{Abstract} ' + gen.paragraph()]
+    for i in range(tables):
+        if i % 3 == 0:
+            blocks.append(gen.section())
+        blocks.append(gen.paragraph())
+        blocks.append(gen.table() if gen.rand.random() < 0.8 else gen.environment_table())
+    return PREAMBLE + '\n\n'.join(blocks) + '\n\n\\end{document}\n'
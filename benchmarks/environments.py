@@ -0,0 +1,66 @@
+"""Time helpers.work_with_environments, which is what latex_repair runs for
+environments, on documents that use every default environment many times.
+
+Environments start the way Word documents start them, with
+\\textbf{Theorem - Name:}, \\textbf{Theorem} (Name). or \\textbf{Theorem.},
+and every fourth one is a one column table whose header is the name of the
+environment.
+
+Run from the repository root:
+
+    python -m benchmarks.environments [--uses 250 500 1000] [--repeat 3]
+"""
+import argparse
+import time
+from typing import Callable, Optional
+
+from benchmarks import corpus
+from helper_files import helpers as dbl
+
+DEFAULT_USES = [250, 500, 1000]
+
+
+def make_document(uses: int, seed: int = 0) -> str:
+    """Return a document with uses environments for every default environment.
+
+    >>> make_document(2).count('\\\\begin{longtable}') > 0
+    True
+    """
+    gen = corpus._Generator(seed)
+    blocks = []
+    for i in range(uses * len(corpus.ENVIRONMENTS)):
+        blocks.append(gen.environment_table() if i % 4 == 3 else gen.environment())
+        blocks.append(gen.paragraph())
+    return '\n\n'.join(blocks) + '\n\n'
+
+
+def fastest(func: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """Return the fastest running time of func out of repeat runs, and what it returned."""
+    best = float('inf')
+    result = None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmark. Return 0."""
+    parser = argparse.ArgumentParser(description='Time work_with_environments on documents full of environments.')
+    parser.add_argument('--uses', nargs='+', type=int, default=DEFAULT_USES,
+                        help='how many times each default environment is used')
+    parser.add_argument('--repeat', type=int, default=3, help='keep the fastest of this many runs')
+    args = parser.parse_args(argv)
+
+    print(f'{"uses":>6} {"KB":>7} {"work_with_environments":>23}')
+    for uses in args.uses:
+        text = make_document(uses)
+        seconds, _ = fastest(lambda: dbl.work_with_environments(text, corpus.ENVIRONMENTS), args.repeat)
+        print(f'{uses:6} {len(text) // 1024:7} {seconds:23.3f}', flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
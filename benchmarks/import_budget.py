@@ -0,0 +1,143 @@
+"""Check that importing converter stays fast, and that it does not import
+modules only some conversions need.
+
+tkinter is only needed to prompt for files, and multiprocessing only for
+batch mode and parallel sections, so a headless conversion must not pay for
+importing them, or fail without a display. pygments is never imported.
+
+Each run imports converter in a fresh interpreter with python -X importtime.
+Importing a forbidden module always fails the check. How long the import
+may take is measured against REFERENCE_MODULES, a few standard library
+modules imported the same way, so the budget holds on slow and fast machines
+alike: the fastest run must import converter within --max-ratio times the
+fastest reference import. An absolute budget can be given with --budget-ms.
+
+Run from the repository root:
+
+    python -m benchmarks.import_budget [--max-ratio 2.5] [--budget-ms MS] [--repeat 5]
+                                       [--module converter]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# importing converter took about 1.6 times as long as importing these, and 3.4 times
+# as long before tkinter and multiprocessing were imported only when needed
+REFERENCE_MODULES = ('json', 'logging', 'subprocess', 'dataclasses', 're', 'typing')
+DEFAULT_MAX_RATIO = 2.5
+# modules that must not be imported along with converter
+FORBIDDEN = ('tkinter', 'pygments', 'multiprocessing', 'concurrent.futures.process')
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Return how many microseconds importing module in a fresh interpreter
+    took for every module it imported, including the modules those imported.
+    """
+    return parse_import_times(_import_time_output(module))
+
+
+def reference_time() -> int:
+    """Return how many microseconds importing REFERENCE_MODULES in a fresh
+    interpreter took.
+    """
+    return top_level_time(_import_time_output(', '.join(REFERENCE_MODULES)))
+
+
+def _import_time_output(modules: str) -> str:
+    """Return what python -X importtime wrote when importing modules, which
+    are separated by commas, in a fresh interpreter.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modules}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stderr
+
+
+def parse_import_times(output: str) -> dict[str, int]:
+    """Return the cumulative microseconds of every module in output, which
+    python -X importtime wrote.
+
+    >>> parse_import_times('import time: self [us] | cumulative | imported package\\n'
+    ...                    'import time:       120 |        120 |   re\\n'
+    ...                    'import time:       900 |       1020 | converter\\n')
+    {'re': 120, 'converter': 1020}
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def top_level_time(output: str) -> int:
+    """Return the cumulative microseconds of the modules in output, which
+    python -X importtime wrote, that were not imported by another module.
+
+    >>> top_level_time('import time: self [us] | cumulative | imported package\\n'
+    ...                'import time:       120 |        120 |   re\\n'
+    ...                'import time:       900 |       1020 | json\\n'
+    ...                'import time:        30 |         30 | typing\\n')
+    1050
+    """
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            total += int(cumulative)
+    return total
+
+
+def forbidden_imports(times: dict[str, int]) -> list[str]:
+    """Return the modules in times that are, or are inside, a FORBIDDEN module.
+
+    >>> forbidden_imports({'re': 1, 'tkinter.filedialog': 2, 'pygmentsx': 3})
+    ['tkinter.filedialog']
+    """
+    return [name for name in times if any(name == f or name.startswith(f + '.') for f in FORBIDDEN)]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the check. Return 1 if it failed, and 0 otherwise."""
+    parser = argparse.ArgumentParser(description='Check how long importing converter takes.')
+    parser.add_argument('--module', default='converter', help='the module to import')
+    parser.add_argument('--max-ratio', type=float, default=DEFAULT_MAX_RATIO,
+                        help='how many times as long as importing REFERENCE_MODULES the import may take')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='how many milliseconds the import may take; not checked by default')
+    parser.add_argument('--repeat', type=int, default=5, help='keep the fastest of this many runs')
+    args = parser.parse_args(argv)
+
+    runs = [import_times(args.module) for _ in range(max(args.repeat, 1))]
+    fastest = min(runs, key=lambda times: times.get(args.module, 0))
+    milliseconds = fastest.get(args.module, 0) / 1000
+    reference = min(reference_time() for _ in range(max(args.repeat, 1))) / 1000
+    ratio = milliseconds / reference if reference else 0.0
+    slowest_children = sorted((name for name in fastest if name != args.module),
+                              key=fastest.get, reverse=True)[:10]
+    print(f'{"module":40}{"ms":>10}')
+    for name in slowest_children:
+        print(f'{name:40}{fastest[name] / 1000:10.2f}')
+    print(f'{args.module:40}{milliseconds:10.2f}')
+    print(f'{"reference":40}{reference:10.2f}  (ratio {ratio:.2f}, at most {args.max_ratio:.2f})')
+
+    failures = [f'{name} was imported' for name in forbidden_imports(fastest)]
+    if ratio > args.max_ratio:
+        failures.append(f'importing {args.module} took {ratio:.2f} times as long as importing the '
+                        f'reference modules, over the limit of {args.max_ratio:.2f}')
+    if args.budget_ms is not None and milliseconds > args.budget_ms:
+        failures.append(f'importing {args.module} took {milliseconds:.1f} ms, over the budget of '
+                        f'{args.budget_ms:.0f} ms')
+    for failure in failures:
+        print('FAILED', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
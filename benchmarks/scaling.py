@@ -0,0 +1,180 @@
+"""Time every stage of latex_repair, and the whole of it, on synthetic
+documents of growing size, and check how the running times scale.
+
+Neither pandoc nor LaTeX is needed: the documents come from
+benchmarks.corpus and are handed to WordFile as if pandoc produced them.
+
+The running times of each stage are fitted to seconds = c * size ** k.
+The scaling exponent k is compared to the one in baseline.json, and the
+run fails if it grew by more than the threshold. Exponents are used instead
+of running times so that the baseline holds on any machine.
+
+Run from the repository root:
+
+    python -m benchmarks.scaling [--sizes 10KB 100KB 1MB 10MB] [--config PATH]
+                                 [--threshold 0.25] [--write-baseline]
+
+The 10MB document is left out unless it is asked for, since the slowest
+stages still take minutes on it.
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+from typing import Optional
+
+import converter as conv
+import stage_profiler
+from benchmarks import corpus
+
+SIZES = {'10KB': 10 * 2 ** 10, '100KB': 100 * 2 ** 10, '1MB': 2 ** 20, '10MB': 10 * 2 ** 20}
+DEFAULT_SIZES = ['10KB', '100KB', '1MB']
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_CONFIG = os.path.join('config_modes', 'config_standard.json')
+PIPELINE = 'latex_repair'  # the name the whole pipeline is recorded under
+# stages faster than this on the largest document are too noisy to fit
+MIN_SECONDS = 0.005
+# timings below this are mostly noise, so they are not fitted
+MIN_POINT_SECONDS = 0.0005
+# only the largest sizes are fitted, since the smaller ones are dominated by constant costs
+FIT_POINTS = 2
+
+
+def repair_timings(text: str, config_path: str) -> dict[str, float]:
+    """Return how many seconds latex_repair spent in each stage when
+    repairing text with the config at config_path, and in total under
+    PIPELINE. Stages that run more than once are added up.
+    """
+    preferences, _ = conv.check_config(config_path, {'pandoc_cache': False})
+    if isinstance(preferences.preamble_path, str):
+        preferences.preamble_path = os.path.abspath(preferences.preamble_path)
+    else:
+        preferences.preamble_path = [os.path.abspath(path) for path in preferences.preamble_path]
+    word_file = conv.WordFile('benchmark.docx', preferences, disable_file_prompts=True, pandoc_output=text)
+    profiler = stage_profiler.StageProfiler()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)  # latex_repair may write the bib file
+        try:
+            start = time.perf_counter()
+            word_file.latex_repair(profiler)
+            total = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    timings = {}
+    for record in profiler.records:
+        timings[record.name] = timings.get(record.name, 0.0) + record.seconds
+    timings[PIPELINE] = total
+    return timings
+
+
+def scaling_exponent(sizes: list[int], seconds: list[float]) -> float:
+    """Return k, where seconds = c * size ** k fits best in the least
+    squares sense on a log-log scale.
+
+    >>> round(scaling_exponent([10, 100, 1000], [0.5, 5.0, 50.0]), 6)
+    1.0
+    >>> round(scaling_exponent([10, 100, 1000], [1.0, 100.0, 10000.0]), 6)
+    2.0
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(second, 1e-9)) for second in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / \
+        sum((x - mean_x) ** 2 for x in xs)
+
+
+def exponents(timings: dict[int, dict[str, float]]) -> dict[str, float]:
+    """Return the scaling exponent of every stage in timings, which maps
+    each document size to repair_timings of that document.
+
+    Stages that are faster than MIN_SECONDS on the largest document, or
+    that did not run on every document, are left out. Only the FIT_POINTS
+    largest documents are fitted, and timings below MIN_POINT_SECONDS are not.
+    """
+    sizes = sorted(timings)
+    result = {}
+    for stage, seconds in timings[sizes[-1]].items():
+        if seconds < MIN_SECONDS or any(stage not in timings[size] for size in sizes):
+            continue
+        points = [(size, timings[size][stage]) for size in sizes if timings[size][stage] >= MIN_POINT_SECONDS]
+        points = points[-FIT_POINTS:]
+        if len(points) >= 2:
+            result[stage] = scaling_exponent([size for size, _ in points], [second for _, second in points])
+    return result
+
+
+def regressions(current: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """Return a message for every stage whose exponent in current is more
+    than threshold above its exponent in baseline.
+
+    >>> regressions({'a': 1.1, 'b': 2.0, 'c': 3.0}, {'a': 1.0, 'b': 1.0}, 0.25)
+    ['b: scaling exponent 2.00, baseline 1.00']
+    """
+    return [f'{stage}: scaling exponent {k:.2f}, baseline {baseline[stage]:.2f}'
+            for stage, k in current.items() if stage in baseline and k > baseline[stage] + threshold]
+
+
+def print_table(timings: dict[int, dict[str, float]], current: dict[str, float],
+                baseline: dict[str, float]) -> None:
+    """Print the timings and exponents of every fitted stage, slowest first."""
+    sizes = sorted(timings)
+    names = {size: name for name, size in SIZES.items()}
+    header = ''.join(f'{names.get(size, size):>10}' for size in sizes)
+    print(f'{"stage":32}{header}{"k":>7}{"base":>7}')
+    for stage in sorted(current, key=lambda s: timings[sizes[-1]][s], reverse=True):
+        row = ''.join(f'{timings[size][stage]:10.4f}' for size in sizes)
+        base = f'{baseline[stage]:7.2f}' if stage in baseline else f'{"-":>7}'
+        print(f'{stage:32}{row}{current[stage]:7.2f}{base}')
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmark. Return 1 if an exponent regressed, and 0 otherwise."""
+    parser = argparse.ArgumentParser(description='Check how latex_repair scales with document size.')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES,
+                        help='the document sizes to time')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='the config file to use')
+    parser.add_argument('--repeat', type=int, default=1, help='keep the fastest of this many runs')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='how much an exponent may grow before the run fails')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='the baseline exponents')
+    parser.add_argument('--write-baseline', action='store_true',
+                        help='store the exponents of this run as the baseline instead of checking them')
+    args = parser.parse_args(argv)
+    if len(args.sizes) < 2:
+        parser.error('at least two sizes are needed to fit an exponent')
+
+    timings = {}
+    for name in args.sizes:
+        text = corpus.make_document(SIZES[name])
+        runs = [repair_timings(text, args.config) for _ in range(args.repeat)]
+        timings[SIZES[name]] = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+        print(f'{name}: {timings[SIZES[name]][PIPELINE]:.3f} s', flush=True)
+    current = exponents(timings)
+
+    if args.write_baseline:
+        with open(args.baseline, 'w', encoding='UTF-8') as f:
+            json.dump({stage: round(k, 3) for stage, k in sorted(current.items())}, f, indent=2)
+            f.write('\n')
+        print_table(timings, current, current)
+        print(f'Wrote the baseline to {args.baseline}')
+        return 0
+
+    try:
+        with open(args.baseline, encoding='UTF-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+        print(f'No baseline at {args.baseline}; run with --write-baseline to make one.')
+    print_table(timings, current, baseline)
+    failures = regressions(current, baseline, args.threshold)
+    for failure in failures:
+        print('REGRESSION', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
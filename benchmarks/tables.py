@@ -0,0 +1,76 @@
+"""Time every stage of latex_repair on documents with more and more tables,
+and check how the running times scale with the number of tables.
+
+Table stages search the document once per table, so a stage that also
+walks the whole document for every table is quadratic in the number of
+tables, which only shows on documents with many of them.
+
+The documents come from benchmarks.corpus.make_table_document. Scaling
+exponents are fitted and compared to tables_baseline.json the same way
+benchmarks.scaling does it, except that they are fitted to the number of
+tables instead of the size of the document.
+
+Run from the repository root:
+
+    python -m benchmarks.tables [--tables 250 500 1000 2000] [--config PATH]
+                                [--threshold 0.25] [--write-baseline]
+"""
+import argparse
+import json
+import os
+from typing import Optional
+
+from benchmarks import corpus, scaling
+
+DEFAULT_TABLES = [250, 500, 1000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables_baseline.json')
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmark. Return 1 if an exponent regressed, and 0 otherwise."""
+    parser = argparse.ArgumentParser(description='Check how latex_repair scales with the number of tables.')
+    parser.add_argument('--tables', nargs='+', type=int, default=DEFAULT_TABLES,
+                        help='how many tables each document has')
+    parser.add_argument('--config', default=scaling.DEFAULT_CONFIG, help='the config file to use')
+    parser.add_argument('--repeat', type=int, default=1, help='keep the fastest of this many runs')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='how much an exponent may grow before the run fails')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='the baseline exponents')
+    parser.add_argument('--write-baseline', action='store_true',
+                        help='store the exponents of this run as the baseline instead of checking them')
+    args = parser.parse_args(argv)
+    if len(set(args.tables)) < 2:
+        parser.error('at least two table counts are needed to fit an exponent')
+
+    timings = {}
+    for tables in sorted(set(args.tables)):
+        text = corpus.make_table_document(tables)
+        runs = [scaling.repair_timings(text, args.config) for _ in range(args.repeat)]
+        timings[tables] = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+        print(f'{tables} tables, {len(text) // 1024} KB: {timings[tables][scaling.PIPELINE]:.3f} s', flush=True)
+    current = scaling.exponents(timings)
+
+    if args.write_baseline:
+        with open(args.baseline, 'w', encoding='UTF-8') as f:
+            json.dump({stage: round(k, 3) for stage, k in sorted(current.items())}, f, indent=2)
+            f.write('\n')
+        scaling.print_table(timings, current, current)
+        print(f'Wrote the baseline to {args.baseline}')
+        return 0
+
+    try:
+        with open(args.baseline, encoding='UTF-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+        print(f'No baseline at {args.baseline}; run with --write-baseline to make one.')
+    scaling.print_table(timings, current, baseline)
+    failures = scaling.regressions(current, baseline, args.threshold)
+    for failure in failures:
+        print('REGRESSION', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
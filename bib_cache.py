@@ -0,0 +1,88 @@
+"""
+Keep the index of a .bib file next to it, so a bibliography is only
+parsed again when it changes.
+
+The index of refs.bib is stored in refs.bib.index.json, along with the
+size, modification time and SHA-256 of the file it was built from. If the
+size and modification time still match, the stored index is used as is.
+Otherwise the file is hashed, and only parsed again if its contents changed.
+The file is parsed from a memory map, so it is never read into one string.
+"""
+import hashlib
+import json
+import mmap
+import os
+from typing import Any, Optional
+
+from helper_files import bibtex
+
+INDEX_SUFFIX = '.index.json'
+_FORMAT = 1  # bump this whenever BibIndex.to_dict() changes
+
+
+def index_path(bib_path: str) -> str:
+    """Return where the index of bib_path is stored."""
+    return bib_path + INDEX_SUFFIX
+
+
+def load_index(bib_path: str, use_cache: bool = True) -> bibtex.BibIndex:
+    """Return the index of the .bib file at bib_path, from the stored index
+    if it is up to date. Store the index if it had to be built again.
+    """
+    if not use_cache:
+        return _parse_file(bib_path)
+    stat = os.stat(bib_path)
+    stored = _read_stored(bib_path)
+    if stored is not None and (stored['size'], stored['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return bibtex.BibIndex.from_dict(stored['index'])
+    digest = file_digest(bib_path)
+    if stored is not None and stored['sha256'] == digest:
+        index = bibtex.BibIndex.from_dict(stored['index'])
+    else:
+        index = _parse_file(bib_path)
+    store_index(bib_path, index, digest)
+    return index
+
+
+def store_index(bib_path: str, index: bibtex.BibIndex, digest: Optional[str] = None) -> None:
+    """Store index as the index of the .bib file at bib_path. Nothing is
+    stored if the folder of bib_path cannot be written to.
+    """
+    stat = os.stat(bib_path)
+    data = {'format': _FORMAT, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest or file_digest(bib_path), 'index': index.to_dict()}
+    try:
+        with open(index_path(bib_path), 'w', encoding='UTF-8') as f:
+            json.dump(data, f)
+    except OSError:
+        pass
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_stored(bib_path: str) -> Optional[dict[str, Any]]:
+    """Return what was stored for bib_path, or None if nothing usable was."""
+    try:
+        with open(index_path(bib_path), encoding='UTF-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(stored, dict) or stored.get('format') != _FORMAT:
+        return None
+    return stored
+
+
+def _parse_file(bib_path: str) -> bibtex.BibIndex:
+    """Return the index of the .bib file at bib_path, parsed from a memory map."""
+    with open(bib_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return bibtex.BibIndex([])  # empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return bibtex.BibIndex.from_buffer(buffer)
@@ -1,18 +1,27 @@
 """This file chooses which modules to include when converting files.
 """
+import copy
+import functools
+import hashlib
 import json
 import logging
 import os
 import platform
+import re
+import shutil
+import tempfile
 import time
 from dataclasses import dataclass, fields, asdict
 
-from tkinter.filedialog import askopenfile
-from typing import Optional, Union, Any
+from typing import Optional, Union, Any, Iterable, TYPE_CHECKING
 import subprocess
 
-from helper_files import helpers as dbl, alignments as w2l
+from helper_files import helpers as dbl, alignments as w2l, bibtex
+import bib_cache
 import cleanup
+import latex_runner
+import pandoc_cache
+import stage_profiler
 
 has_pygments = True
 
@@ -26,6 +35,11 @@ except ModuleNotFoundError:
                     ' omitted.')
     has_pygments = False
 
+# tkinter and multiprocessing are slow to import, and a headless conversion
+# needs neither of them, so each is only imported where it is used
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
 USE_SUBPROCESSES = True
 
 TEMP_TEX_FILENAME = 'temp.tex'
@@ -36,6 +50,21 @@ REPLAC = {'α': R'\alpha', 'β': R'\beta', 'γ': R'\gamma', 'δ': R'\delta', 'ϵ
 ALLOWED_LATEX_COMPILERS = {'pdflatex', 'xelatex', 'luatex'}
 FOLDER_TO_RUN_IN = 'export'  # the folder to run it.
 FOLDER_TO_RUN_IN_SLASH = FOLDER_TO_RUN_IN + '\\'
+SECTION_CACHE_SIZE = 4096  # the most repaired sections a section cache keeps
+LOW_MEMORY_CHUNK_SIZE = 2 ** 20  # how many characters low_memory repairs at once, roughly
+# the contents of every preamble file read so far, and the mtime they were read at
+_PREAMBLE_CACHE: dict[str, tuple[int, str]] = {}
+# the path of an image a tex file includes
+_INCLUDED_IMAGE = re.compile(r'\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]*)\}')
+
+
+def ask_open_file(**kwargs: Any) -> Any:
+    """Show a file open box and return what askopenfile returns for kwargs.
+    tkinter is only imported here, so conversions that never prompt for a
+    file do not need a display.
+    """
+    from tkinter.filedialog import askopenfile
+    return askopenfile(**kwargs)
 
 
 def open_file(file: str, allow_exceptions: bool = False) -> str:
@@ -61,6 +90,14 @@ def write_file(text: str, filename: str) -> None:
         f.write(text)
 
 
+def write_pieces(pieces: Iterable[str], filename: str) -> None:
+    """Write file with given name, whose contents are pieces joined
+    together, one piece at a time.
+    """
+    with open(filename, 'w', encoding='UTF-8') as f:
+        f.writelines(pieces)
+
+
 def check_suffix(dir_path: str, suffix: str) -> bool:
     """Return True if the file path has the suffix.
     The suffix may NOT include the leading dot.
@@ -103,7 +140,7 @@ class SpaceError(Exception):
         return 'file directory has a space character in it.'
 
 
-@dataclass
+@dataclass(**dbl.DATACLASS_SLOTS)
 class Preferences:
     """A custom data type that represents the preferences for a word document.
     All preferences are set to false by default.
@@ -233,6 +270,25 @@ class Preferences:
     no_quotes_in_lists: bool = True
     no_unicode_fractions: bool = True
     center_tikz: bool = True
+    pandoc_cache: bool = True  # reuse what pandoc produced the last time this Word file was converted
+    # with the same pandoc command. Cached output lives in the pandoc_cache folder.
+    pandoc_cache_size: int = 500  # the most space the pandoc cache may take up, in MB.
+    max_latex_passes: int = 3  # the most times the LaTeX engine runs. It only runs again if
+    # the aux, toc or similar files changed during the previous run.
+    bib_index_cache: bool = True  # store the index of a .bib file next to it, in <bib file>.index.json,
+    # so the bib file is only parsed again when it changes.
+    parallel_sections: bool = False  # repair the sections of the document at the same time, in
+    # separate processes, for the stages that never look outside of a section.
+    parallel_tables: bool = False  # rebuild the longtables of the document at the same time, in
+    # separate processes. Only worth it for documents with hundreds of tables.
+    parallel_workers: int = 0  # how many processes repair sections or tables at once. 0 uses every core.
+    low_memory: bool = False  # keep fewer copies of the document in memory, for very large documents.
+    # Stages that never look outside of a section repair it a chunk of sections at a time, and the
+    # tex file is written in pieces instead of being put together first.
+    skip_unchanged_pdf: bool = False  # do not compile the PDF again if the last compile succeeded, and
+    # neither the tex file nor the bibliography, sty and cls files and images it uses changed since.
+    profile_stages: bool = False  # time every stage of the repair and count the hot helper calls.
+    # The results are printed and written to <word file name>_profile.json.
 
     def recalculate_invariants(self) -> None:
         """Recalculate some of its
@@ -270,12 +326,17 @@ class WordFile:
         - preferences: the preferences of this word file.
         - output_path: the final output path of this word file.
         - text: the text contents of this word file.
+        - tex_pieces: the tex file in the pieces it is written in, if low_memory kept it
+          in pieces after latex_repair, in which case text is empty. None otherwise.
+        - section_cache: the repaired sections of earlier conversions, by the hash of the
+          section and the stages that repaired it, or None if sections are not cached.
     """
     word_file_path: str
     word_file_nosuffix: str
     preferences: Preferences
     output_path: str  # in the form filename.tex
     text: str  # our latex converted stuff
+    tex_pieces: Optional[list[str]]
     citation_path: str  # must ALWAYS be a valid .txt file
     bib_path: Optional[str]  # not a directory; just the name of the bib file
     raw_text: str
@@ -284,18 +345,28 @@ class WordFile:
     citations_enabled: bool
     contains_longtable: bool
     disable_file_prompts: bool
+    section_cache: Optional[dict[str, tuple[str, list[Any]]]]
 
     _temp_tex_file: str
     _disallow_pdf: bool
+    _profiler: Optional[stage_profiler.StageProfiler]
+    _pool: Optional['ProcessPoolExecutor']
 
     def __init__(self, word_file_path: str, preferences: Preferences = DEFAULT_PREF,
-                 disable_file_prompts: bool = False) -> None:
+                 disable_file_prompts: bool = False, temp_tex_file: Optional[str] = None,
+                 pandoc_output: Optional[str] = None,
+                 section_cache: Optional[dict[str, tuple[str, list[Any]]]] = None) -> None:
         """Initialize a new WordFile object.
 
         Raise an InvalidFileTypeError if word_file_path is not a Microsoft word file.
-        The only IO function allowed here is to open the Word file and create temp.tex
+        The only IO function allowed here is to open the Word file and create temp.tex,
+        or temp_tex_file if it is specified. If pandoc_output is specified, it is used
+        as what pandoc produced for the Word file, and neither is done.
+        If section_cache is specified, sections repaired before are taken from it,
+        and newly repaired sections are added to it.
         """
         self.disable_file_prompts = disable_file_prompts
+        self.section_cache = section_cache
         self.contains_longtable = False
         self.citations_enabled = False
         if word_file_path[-5:] != '.docx' and word_file_path[-4:] != '.tex':
@@ -306,11 +377,11 @@ class WordFile:
         self.word_file_nosuffix = os.path.basename(word_file_path)[:-5]
         self.preferences = preferences
         self.preferences.recalculate_invariants()
-        self._temp_tex_file = TEMP_TEX_FILENAME
+        self._temp_tex_file = TEMP_TEX_FILENAME if temp_tex_file is None else temp_tex_file
         export_suffix = self.preferences.export_file_name_suffix + '.tex'
         self.output_path = self.word_file_nosuffix + export_suffix
         if word_file_path[-5:] == '.docx':
-            self.text = self.open_word_file()
+            self.text = self.open_word_file() if pandoc_output is None else pandoc_output
             # print(self.text)
             self.original_tex = False
             self._disallow_pdf = False
@@ -319,6 +390,7 @@ class WordFile:
             self.original_tex = True
             self._disallow_pdf = True
         self.raw_text = self.text
+        self.tex_pieces = None
         self.citation_path = 'placeholder'
         self.bib_path = ''
         self._recalculate_erase_preamble()
@@ -346,8 +418,8 @@ class WordFile:
                 raise AttemptedFilePromptError
             else:
                 print('Opening the bib document file open box. If nothing opens, consider re-running this program.')
-                file_info = askopenfile(mode='r', title='Open the bib file you want to combine',
-                                        filetypes=[('Bib Files', '*.bib')])
+                file_info = ask_open_file(mode='r', title='Open the bib file you want to combine',
+                                          filetypes=[('Bib Files', '*.bib')])
                 self.bib_path = file_info.name.replace("/", "\\") if file_info is not None else None
                 if self.bib_path is None:
                     print('You did not specify a bib path, so we\'re assuming you\'re not citing anything')
@@ -369,7 +441,7 @@ class WordFile:
     def sequence(self) -> None:
         """Completely process and export the word file to tex."""
         if self.preferences.exclude_preamble:
-            self.preferences._disallow_pdf = True
+            self._disallow_pdf = True
         if not self.preferences.disable_repair:  # if disable repair is FALSE
             self.latex_repair()
         self.export()
@@ -428,11 +500,136 @@ class WordFile:
                 (self._temp_tex_file, True)
             ]
             command_list = process_permissive_list(command_list_raw)
-            subprocess.run(command_list)
-            return open_file(self._temp_tex_file)
+            media_folder = media_path[len('--extract-media='):]
+            cache_key = None
+            if self.preferences.pandoc_cache:
+                cache_key = pandoc_cache.cache_key(
+                    self.word_file_path,
+                    [c for c in command_list if c not in (self.word_file_path, self._temp_tex_file)])
+            if cache_key is not None:
+                cached_text = pandoc_cache.load(cache_key, media_folder)
+                if cached_text is not None:
+                    print('Using the cached pandoc output of this Word file.')
+                    return cached_text
+            try:
+                os.remove(self._temp_tex_file)  # so a failed run cannot leave an older conversion behind
+            except FileNotFoundError:
+                pass
+            subprocess.run(command_list, check=True)  # only cache what a successful run wrote
+            text = open_file(self._temp_tex_file)
+            if cache_key is not None:
+                pandoc_cache.store(cache_key, text, media_folder, self.preferences.pandoc_cache_size)
+            return text
 
-    def latex_repair(self) -> None:
+    def latex_repair(self, profiler: Optional[stage_profiler.StageProfiler] = None) -> None:
         """Repair generated latex file.
+
+        If profiler is specified, record every stage in it. Otherwise, if
+        stages are to be profiled, print and export the records.
+        """
+        report = profiler is None and self.preferences.profile_stages
+        self._profiler = stage_profiler.StageProfiler() if report else profiler
+        self._pool = None
+        try:
+            if self._profiler is None:
+                self._latex_repair()
+                return
+            with self._profiler.counting_helpers():
+                self._latex_repair()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        if report:
+            self._profiler.print_table()
+            self._profiler.write_json(self.word_file_nosuffix + '_profile.json')
+
+    def _run_stage(self, name: str, func: Any, text: str, *args: Any, **kwargs: Any) -> Any:
+        """Return func(text, *args, **kwargs), timing it as the stage name
+        if stages are being profiled.
+        """
+        if self._profiler is None:
+            return func(text, *args, **kwargs)
+        return self._profiler.run_stage(name, func, text, *args, **kwargs)
+
+    def _run_local_stages(self, text: str, stages: list[tuple[str, Any, tuple, dict]]) -> tuple[str, list[Any]]:
+        """Run every (name, func, args, kwargs) stage in stages on text, in order,
+        through _run_stage. Return the text and what else each stage returned,
+        or None for stages that only return the text.
+
+        Every stage must only ever look inside the section it is working on.
+        If parallel_sections is on, text is split at its sections and the parts
+        are repaired at the same time. If sections are cached, text is split at
+        every section, and only the sections that are not cached are repaired.
+        Otherwise, if low_memory is on, text is repaired one chunk of sections
+        at a time. Whatever else a stage returns must then be a list, and the
+        lists of every part are joined in order.
+        """
+        parts = [text]
+        cuts = []
+        if self.section_cache is not None and stages:
+            parts = dbl.split_at_sections(text, len(text))  # so editing a section only repairs it again
+        elif self.preferences.parallel_sections and stages:
+            workers = self.preferences.parallel_workers or os.cpu_count() or 1
+            parts = dbl.split_at_sections(text, 4 * workers)  # more parts than workers balances the load
+        elif self.preferences.low_memory and stages:
+            cuts = dbl.section_cuts(text, len(text) // LOW_MEMORY_CHUNK_SIZE)
+        name = ' + '.join(stage[0] for stage in stages)
+        if len(parts) >= 2:
+            return self._run_stage(name, self._repair_parts, text, parts, [stage[1:] for stage in stages])
+        if cuts:
+            return self._run_stage(name, _repair_chunks, text, cuts, [stage[1:] for stage in stages])
+        extras = []
+        for name, func, args, kwargs in stages:
+            result = self._run_stage(name, func, text, *args, **kwargs)
+            text, extra = result if isinstance(result, tuple) else (result, None)
+            extras.append(extra)
+        return text, extras
+
+    def _repair_parts(self, text: str, parts: list[str], stages: list[tuple[Any, tuple, dict]]) \
+            -> tuple[str, list[Any]]:
+        """Return what _run_local_stages returns for text, which is split into parts,
+        running stages on every part that is not in the section cache, in the
+        worker pool if parallel_sections is on.
+        """
+        assert ''.join(parts) == text
+        results = [None] * len(parts)
+        keys = [None] * len(parts)
+        if self.section_cache is not None:
+            stages_key = repr([(func.__module__, func.__qualname__, args, kwargs) for func, args, kwargs in stages])
+            for i, part in enumerate(parts):
+                keys[i] = hashlib.sha256((stages_key + '\0' + part).encode('UTF-8')).hexdigest()
+                results[i] = self.section_cache.pop(keys[i], None)
+                if results[i] is not None:
+                    self.section_cache[keys[i]] = results[i]  # now the most recently used
+        todo = [i for i, result in enumerate(results) if result is None]
+        if self.preferences.parallel_sections and len(todo) >= 2:
+            repaired = self._worker_pool().map(_repair_part, [parts[i] for i in todo], [stages] * len(todo))
+        else:
+            repaired = (_repair_part(parts[i], stages) for i in todo)
+        for i, result in zip(todo, repaired):
+            results[i] = result
+            if keys[i] is not None:
+                self.section_cache[keys[i]] = result
+        if self.section_cache is not None:
+            for key in list(self.section_cache)[:-SECTION_CACHE_SIZE]:
+                del self.section_cache[key]  # the oldest sections go first
+        return _join_repaired(results)
+
+    def _worker_pool(self) -> 'ProcessPoolExecutor':
+        """Return the processes that sections and tables are repaired in when
+        parallel_sections or parallel_tables is on, starting them if needed.
+        The profiler, if any, cannot count the helper calls made in them.
+        """
+        if self._profiler is not None:
+            self._profiler.calls_elsewhere()
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.preferences.parallel_workers or None)
+        return self._pool
+
+    def _latex_repair(self) -> None:
+        """Repair generated latex file, running every stage through _run_stage.
         """
         dataclass_dict = {}
         p_start = open_multiple_files(self.preferences.preamble_path)
@@ -444,48 +641,59 @@ class WordFile:
         start = '\\begin{document}'
         end = '\\end{document}'
         text, start, end = w2l.find_between(text, start, end)
+        raw_head, raw_tail = self.raw_text[:start], self.raw_text[end:]
+        if self.preferences.low_memory:
+            self.text = self.raw_text = ''  # only what is around the document is needed again
         dict_info_hide_verb = {}
 
         if self.preferences.table_of_contents:
-            text = dbl.toc_detector(text, min(self.preferences.header_level, 0))
+            text = self._run_stage('toc_detector', dbl.toc_detector, text, min(self.preferences.header_level, 0))
 
         # PUSH HEADER LEVELS, IF APPLICABLE
         if -2 <= self.preferences.header_level <= -1:
-            text = dbl.make_chapter(text, depth=self.preferences.header_level)
+            text = self._run_stage('make_chapter', dbl.make_chapter, text, depth=self.preferences.header_level)
         # CONCEAL ALL VERBATIMS
         if self.preferences.conceal_verbatims:
-            text, dict_info_hide_verb = dbl.hide_verbatims(text, self.preferences.bibliography_keyword,
-                                                           self.preferences.verbatim_plugin)
+            text, dict_info_hide_verb = self._run_stage('hide_verbatims', dbl.hide_verbatims, text,
+                                                        self.preferences.bibliography_keyword,
+                                                        self.preferences.verbatim_plugin)
         if self.preferences.hypertarget_remover:
-            text = w2l.hypertarget_eliminator(text)
+            text = self._run_stage('hypertarget_eliminator', w2l.hypertarget_eliminator, text)
         if self.preferences.forbid_images:
             logging.warning('About to remove images')
-            text = dbl.remove_images(text)
+            text = self._run_stage('remove_images', dbl.remove_images, text)
         # text = dbl.include_graphics_failsafe(text)
         if self.preferences.fix_vectors:
-            text = w2l.fix_vectors(text)
-            text = w2l.fix_vectors_again(text)
-            text = dbl.fix_accents(text)
+            text, _ = self._run_local_stages(text, [('fix_vectors', w2l.fix_vectors, (), {}),
+                                                    ('fix_vectors_again', w2l.fix_vectors_again, (), {}),
+                                                    ('fix_accents', dbl.fix_accents, (), {})])
         if self.preferences.allow_abstract:
-            text = dbl.abstract_wrapper(text)
+            text = self._run_stage('abstract_wrapper', dbl.abstract_wrapper, text)
         if self.preferences.latexing:
-            text = dbl.latexing(text)
+            text = self._run_stage('latexing', dbl.latexing, text)
+        local_stages = []
         if self.preferences.allow_environments and self.preferences.environments is not None:
-            text = dbl.framed(text)
-            text = dbl.work_with_environments(text, self.preferences.environments,
-                                              self.preferences.disable_legacy_environments)
+            local_stages.append(('framed', dbl.framed, (), {}))
+            local_stages.append(('work_with_environments', dbl.work_with_environments,
+                                 (self.preferences.environments, self.preferences.disable_legacy_environments), {}))
 
         if self.preferences.allow_proofs:
-            text = dbl.qed(text, self.preferences.special_proofs)
+            local_stages.append(('qed', dbl.qed, (self.preferences.special_proofs,), {}))
+        text, _ = self._run_local_stages(text, local_stages)
         # if True:
         #    text = dbl.longtable_backslash_add_full(text)
 
         if self.preferences.modify_tables:  # LONGTABLE ELIMINATOR
             disallow_tab_f = self.preferences.disable_table_figuring or self.preferences.disallow_figures
-            text = dbl.eliminate_all_longtables(text, disallow_tab_f,
-                                                self.preferences.allow_no_longtable,
-                                                float_type=self.preferences.image_float,
-                                                max_page_len=self.preferences.max_page_length)
+            map_tables = map
+            tables = text.count('\\begin{longtable}')
+            if self.preferences.parallel_tables and tables >= 2:
+                workers = self.preferences.parallel_workers or os.cpu_count() or 1
+                # a few chunks per worker, since a single table is too little work to send to a process
+                map_tables = functools.partial(self._worker_pool().map, chunksize=max(1, tables // (4 * workers)))
+            text = self._run_stage('eliminate_all_longtables', dbl.eliminate_all_longtables, text, disallow_tab_f,
+                                   self.preferences.allow_no_longtable, float_type=self.preferences.image_float,
+                                   max_page_len=self.preferences.max_page_length, map_tables=map_tables)
 
         eqn_comment = {'comment_type': self.preferences.eqn_comment_mode, 'label_equations':
             self.preferences.label_equations}
@@ -498,64 +706,63 @@ class WordFile:
             for r_key, r_value in self.preferences.to_replace.items():
                 text = text.replace(r_key, r_value)
 
-        labels_so_far = []
+        local_stages = []
         if self.preferences.allow_alignments:  # alignments must always run first
-            while True:
-                max_line = self.preferences.max_line_length if self.preferences.max_line_align else -1
-                text, stat, labbs = w2l.replace_align_region(text,
-                                                             self.preferences.autodetect_align_symbols,
-                                                             max_line, extra_info=eqn_comment)
-                # print('stat')
-                labels_so_far.extend(labbs)
-                if stat:
-                    break
+            max_line = self.preferences.max_line_length if self.preferences.max_line_align else -1
+            local_stages.append(('replace_all_align_regions', w2l.replace_all_align_regions,
+                                 (self.preferences.autodetect_align_symbols, max_line), {'extra_info': eqn_comment}))
         auto_labeling = self.preferences.label_equations and self.preferences.eqn_comment_mode == 'hidden'
         # eqn_comment['second_time'] = True
         if self.preferences.max_line_length >= 1:
-            text, labels_split_so_far = dbl.split_all_equations(text, self.preferences.max_line_length,
-                                                                label_equations=self.preferences.label_equations,
-                                                                tag_equations=not auto_labeling)
-            labels_so_far.extend(labels_split_so_far)
-            if len(set(labels_so_far)) != len(labels_so_far):
-                logging.warning('Some equations have duplicate labels.')
-            while True:
-                # the second time alignment replacement is used.
-                # this time, discard all labels.
-                text, stat, _ = w2l.replace_align_region(text,
-                                                         self.preferences.autodetect_align_symbols)
-                if stat:
-                    break
+            local_stages.append(('split_all_equations', dbl.split_all_equations, (self.preferences.max_line_length,),
+                                 {'label_equations': self.preferences.label_equations,
+                                  'tag_equations': not auto_labeling}))
+        labelling_stages = len(local_stages)
+        if self.preferences.max_line_length >= 1:
+            # the second time alignment replacement is used.
+            # this time, discard all labels.
+            local_stages.append(('replace_all_align_regions', w2l.replace_all_align_regions,
+                                 (self.preferences.autodetect_align_symbols,), {}))
+        text, extras = self._run_local_stages(text, local_stages)
+        # the labels of the alignments come first, then the labels of the split equations
+        labels_so_far = [label for labels in extras[:labelling_stages] for label in labels]
+        if self.preferences.max_line_length >= 1 and len(set(labels_so_far)) != len(labels_so_far):
+            logging.warning('Some equations have duplicate labels.')
 
         # use refs, which work in a very similar way to how it is implemented in tables
         if self.preferences.label_equations:
-            text = dbl.bulk_labeling(text, labels_so_far, 'equation', 'ref', 'eq')
+            text = self._run_stage('bulk_labeling', dbl.bulk_labeling, text, labels_so_far, 'equation', 'ref', 'eq')
         if self.original_tex:
-            text, self._disallow_pdf = dbl.truncate_path(text, self._disallow_pdf)
+            text, self._disallow_pdf = self._run_stage('truncate_path', dbl.truncate_path, text, self._disallow_pdf)
 
             logging.warning('Removing images')
         elif self.preferences.center_images:
-            text = dbl.detect_include_graphics(text, self.preferences.disallow_figures, self.preferences.image_float,
-                                               self.preferences.tufte)
+            text = self._run_stage('detect_include_graphics', dbl.detect_include_graphics, text,
+                                   self.preferences.disallow_figures, self.preferences.image_float,
+                                   self.preferences.tufte)
 
         if self.preferences.fix_prime_symbols:
-            text = w2l.prime_dealer(text)
+            text = self._run_stage('prime_dealer', w2l.prime_dealer, text)
         if self.preferences.fix_derivatives:
-            text = dbl.dy_fixer(text)
+            text = self._run_stage('dy_fixer', dbl.dy_fixer, text)
 
         if self.preferences.dollar_sign_equations:
-            text = w2l.dollar_sign_equations(text)
+            text = self._run_stage('dollar_sign_equations', w2l.dollar_sign_equations, text)
+        local_stages = []
         if self.preferences.fix_unicode:
             # print(text)
-            text = dbl.text_bound_fixer(text, REPLAC)
+            local_stages.append(('text_bound_fixer', dbl.text_bound_fixer, (REPLAC,), {}))
         if self.preferences.fix_texttt:
-            text = dbl.fix_all_textt(text)
+            local_stages.append(('fix_all_textt', dbl.fix_all_textt, (), {}))
+        text, _ = self._run_local_stages(text, local_stages)
         if self.preferences.combine_aligns:
-            text = dbl.combine_environments(text, 'align*', ' \\\\')
+            text = self._run_stage('combine_environments', dbl.combine_environments, text, 'align*', ' \\\\')
         # combines matrices. This is forced.
-        text = dbl.aug_matrix_spacing(text)
+        text = self._run_stage('aug_matrix_spacing', dbl.aug_matrix_spacing, text)
         if self.preferences.verbatim_plugin in ('lstlisting', 'minted'):
-            text, lang_converted = dbl.verbatim_to_listing(text, self.preferences.verbatim_lang, self.preferences.verbatim_plugin,
-                                                           self.preferences.verbatim_options)
+            text, lang_converted = self._run_stage('verbatim_to_listing', dbl.verbatim_to_listing, text,
+                                                   self.preferences.verbatim_lang, self.preferences.verbatim_plugin,
+                                                   self.preferences.verbatim_options)
             # no language??
             if not lang_converted and self.preferences.verbatim_plugin == "minted":
                 print('No language declarations.')
@@ -565,10 +772,11 @@ class WordFile:
         # text = text.replace('…', '...')  # only occurs in verbatim envs
         has_bib_file = False
         if self.preferences.center_tikz:
-            text = dbl.center_tikz(text, self.preferences.image_float)
+            text = self._run_stage('center_tikz', dbl.center_tikz, text, self.preferences.image_float)
         if self.preferences.allow_citations:  # if citations are allowed
-            proceed_citations, temp_text_here, bib_ind = dbl.detect_if_bib_exists(text,
-                                                                                  self.preferences.bibliography_keyword)
+            proceed_citations, temp_text_here, bib_ind = self._run_stage('detect_if_bib_exists',
+                                                                         dbl.detect_if_bib_exists, text,
+                                                                         self.preferences.bibliography_keyword)
             bib_text = dict_info_hide_verb.get('BIBLO', '')
             if proceed_citations:
                 if bib_text == '':
@@ -577,9 +785,12 @@ class WordFile:
                     self.bib_path = 'DO NOT OPEN!!!!?'
                 if self.bib_path is not None:
                     if self.bib_path != 'DO NOT OPEN!!!!?':
-                        bib_data = open_file(self.bib_path)
+                        # the bib file is only parsed if it changed since its index was stored
+                        bib_data = None
+                        bib_index = bib_cache.load_index(self.bib_path, self.preferences.bib_index_cache)
                     else:
                         bib_data = bib_text
+                        bib_index = bibtex.BibIndex.from_buffer(bib_text)
                         self.bib_path = self.word_file_nosuffix + '-citations.bib'
                     # position the print bibilo first
                     # bib_style = 'unsrt'
@@ -594,8 +805,9 @@ class WordFile:
                     temp_text_here = temp_text_here[:bib_ind] + '\\medskip\n\\printbibliography' + bib_num + \
                         temp_text_here[bib_ind:]
                     # then replace the citations
-                    text = dbl.do_citations(temp_text_here, bib_data, self.preferences.citation_mode,
-                                            self.preferences.citation_brackets, cite_properties)
+                    text = self._run_stage('do_citations', dbl.do_citations, temp_text_here, bib_index,
+                                           self.preferences.citation_mode, self.preferences.citation_brackets,
+                                           cite_properties)
                     last_dbl_backslash = self.bib_path.replace('/', '\\').rfind('\\')
                     if last_dbl_backslash == -1:
                         has_bib_file = self.bib_path
@@ -606,7 +818,10 @@ class WordFile:
                     assert has_bib_file.endswith('.bib')
                     # rewrite the bib file in the same directory as this .py file
                     # ensure that the bib file is written as well in the same location
-                    write_file(bib_data, has_bib_file)
+                    if bib_data is not None:
+                        write_file(bib_data, has_bib_file)
+                    elif not (os.path.exists(has_bib_file) and os.path.samefile(self.bib_path, has_bib_file)):
+                        shutil.copyfile(self.bib_path, has_bib_file)
                     # check if we have used bibtex
                     # modify the preamble to add the bibtex module specified in the config
                     # if self.preferences.bibtex_def != '':
@@ -617,15 +832,15 @@ class WordFile:
         #     text = dbl.do_citations(text, bib_data, self.preferences.citation_mode)
         #     text = text + '\\medskip\n\\printbibliography'
         if self.preferences.subsection_limit >= 1:
-            text = dbl.subsection_limit(text, self.preferences.subsection_limit, 6)
+            text = self._run_stage('subsection_limit', dbl.subsection_limit, text, self.preferences.subsection_limit, 6)
         if self.preferences.no_unicode_fractions:
-            text = dbl.remove_unicode_fractions(text)
+            text = self._run_stage('remove_unicode_fractions', dbl.remove_unicode_fractions, text)
         if self.preferences.no_quotes_in_lists:
-            text = dbl.no_quotes_in_itemize_enumerate(text)
+            text = self._run_stage('no_quotes_in_itemize_enumerate', dbl.no_quotes_in_itemize_enumerate, text)
         if self.preferences.conceal_verbatims:
-            text = dbl.show_verbatims(text, dict_info_hide_verb)
+            text = self._run_stage('show_verbatims', dbl.show_verbatims, text, dict_info_hide_verb)
         # always on
-        text = dbl.verbatim_regular_quotes(text)
+        text = self._run_stage('verbatim_regular_quotes', dbl.verbatim_regular_quotes, text)
         text = text.replace('ò÷öæ🬵🬶	🬷', '')
 
         if '\\begin{longtable}' in text:  # check if text has a longtable
@@ -639,11 +854,11 @@ class WordFile:
             # if a value is not detected then it is
             # always true by default. it will
             # not show up if it is false.
-            p_start = dbl.conditional_preamble(p_start, dataclass_dict)
+            p_start = self._run_stage('conditional_preamble', dbl.conditional_preamble, p_start, dataclass_dict)
 
         if not self.preferences.exclude_preamble:  # if preamble is included
 
-            preamble = w2l.deal_with_preamble(text=self.raw_text[:start],
+            preamble = w2l.deal_with_preamble(text=raw_head,
                                               has_bib_file=has_bib_file,
                                               remove_default_font=self.preferences.replace_font,
                                               preamble_path=p_start,
@@ -652,18 +867,58 @@ class WordFile:
                                               dataclass_dict=dataclass_dict)
 
             if self.preferences.hide_comments:
-                preamble = dbl.remove_comments_from_document(preamble)
+                preamble = self._run_stage('remove_comments_from_document', dbl.remove_comments_from_document,
+                                           preamble)
 
-            text = preamble + '\n' + self.preferences.start_of_doc_text + '\n\n' + text + '\n\n' + \
-                self.raw_text[end:]
-        # else do nothing
+            pieces = [preamble, '\n' + self.preferences.start_of_doc_text + '\n\n', text, '\n\n' + raw_tail]
+        else:
+            pieces = [text]
+        # what is left only changes the preamble, so it can stay apart from the rest
+        if not (self.preferences.low_memory and self._edits_stay_in(pieces[0])):
+            pieces = [''.join(pieces)]
+        text = pieces[0]
         if self.preferences.document_class != '':
-            text = dbl.change_document_class(text, self.preferences.document_class)
+            text = self._run_stage('change_document_class', dbl.change_document_class, text,
+                                   self.preferences.document_class)
         if self.preferences.default_date != '':
             text = text.replace('\\date{}', '\\date{' + self.preferences.default_date + '}', 1)
         if self.preferences.default_author != '':
             text = text.replace('\\author{}', '\\author{' + self.preferences.default_author + '}', 1)
-        self.text = text
+        pieces[0] = text
+        if len(pieces) == 1:
+            self.text, self.tex_pieces = text, None
+        else:
+            self.text, self.tex_pieces = '', pieces
+
+    def _edits_stay_in(self, preamble: str) -> bool:
+        """Return whether changing the document class, date and author of a
+        tex file that starts with preamble only changes preamble.
+        """
+        if self.preferences.default_date != '' and '\\date{}' not in preamble:
+            return False
+        if self.preferences.default_author != '' and '\\author{}' not in preamble:
+            return False
+        if self.preferences.document_class != '':
+            document_class = preamble.find('\\documentclass')
+            if document_class == -1:
+                return False
+            try:
+                dbl.local_env_end(preamble, document_class)
+            except ValueError:
+                return False
+        return True
+
+    def _compile_inputs(self, tex_pieces: list[str]) -> list[str]:
+        """Return the files other than the tex file made of tex_pieces that the
+        PDF is compiled from: the bibliography, the sty and cls files, and
+        every included image.
+        """
+        inputs = list(self.preferences.sty_cls_files)
+        if self.citations_enabled:
+            inputs.append(self.bib_path)
+        for piece in tex_pieces:
+            inputs.extend(match.group(1).strip() for match in _INCLUDED_IMAGE.finditer(piece))
+        return inputs
 
     def export(self) -> None:
         """Export everything in self.text
@@ -684,7 +939,8 @@ class WordFile:
             if latex_engine not in ALLOWED_LATEX_COMPILERS:
                 latex_engine = 'xelatex'
             dq = '"'
-            write_file(self.text, self.output_path)
+            tex_pieces = [self.text] if self.tex_pieces is None else self.tex_pieces
+            write_pieces(tex_pieces, self.output_path)
             if self._disallow_pdf or self.preferences.prevent_pdf_exports:
                 print('No PDF to be exported here.')
                 return
@@ -710,24 +966,38 @@ class WordFile:
 
             if not self._disallow_pdf:
                 output_dir_command = "-output-directory=export" if self.preferences.export_folder else ""
-                if self.preferences.force_shell_escape or '\\usepackage{minted}' in self.text:
+                if self.preferences.force_shell_escape or any('\\usepackage{minted}' in piece for piece in tex_pieces):
                     latex_compile_command = [latex_engine, output_dir_command, '-shell-escape', self.output_path]
                 else:
                     latex_compile_command = [latex_engine, output_dir_command, self.output_path]
                 latex_compile_command = [w for w in latex_compile_command if w != '']
                 # latex_output_path = self.output_path[:-4] + '.pdf'
-                subprocess.run(latex_compile_command)
 
                 # running biblatex on the file
                 # this is broken.
-
-                if self.citations_enabled:
-                    biblatex_command = ['bibtex8', '--wolfgang', self.output_path[:-4]]
-                    print(biblatex_command)
-                    subprocess.run(biblatex_command)
-
-                # export it a second time
-                subprocess.run(latex_compile_command)
+                biblatex_command = ['bibtex8', '--wolfgang', self.output_path[:-4]] \
+                    if self.citations_enabled else None
+
+                pdf_path = self.output_path[:-4] + '.pdf'
+                if self.preferences.export_folder:
+                    pdf_path = os.path.join('export', pdf_path)
+                # the PDF is up to date if the last compile succeeded and nothing it was compiled from changed
+                stamp_path = pdf_path + '.stamp'
+                stamp = None
+                if self.preferences.skip_unchanged_pdf:
+                    stamp = _compile_stamp(tex_pieces, latex_compile_command, self._compile_inputs(tex_pieces))
+                if stamp is not None and os.path.isfile(pdf_path) and open_file(stamp_path, True) == stamp:
+                    print('Nothing the PDF is compiled from changed, so it is already up to date.')
+                else:
+                    if os.path.isfile(stamp_path):
+                        os.remove(stamp_path)  # so an interrupted compile is never taken for a finished one
+                    # export it again only while the aux files change
+                    passes, succeeded = latex_runner.run_latex(latex_compile_command, self.output_path[:-4],
+                                                               'export' if self.preferences.export_folder else '',
+                                                               biblatex_command, self.preferences.max_latex_passes)
+                    print(f'Ran {latex_engine} {passes} time(s).')
+                    if stamp is not None and succeeded and os.path.isfile(pdf_path):
+                        write_file(stamp, stamp_path)
 
                 # command_string_2 = latex_engine + ' "' + self.output_path + '"'
                 command_string_3 = '"' + self.output_path[:-4] + '.pdf' '"'
@@ -805,16 +1075,17 @@ class WordFileCombo(WordFile):
 
     def __init__(self, word_file_path: str, preferences: Preferences = DEFAULT_PREF,
                  disable_file_prompts: Optional[bool] = None,
-                 corresponding_tex_file: Optional[str] = None) -> None:
-        super().__init__(word_file_path, preferences, disable_file_prompts)
+                 corresponding_tex_file: Optional[str] = None,
+                 temp_tex_file: Optional[str] = None) -> None:
+        super().__init__(word_file_path, preferences, disable_file_prompts, temp_tex_file)
         print('Opening the replacement tex file open box. If nothing opens, consider re-running this program.')
 
         if corresponding_tex_file is None:
             if self.disable_file_prompts:
                 raise AttemptedFilePromptError
             else:
-                file_info = askopenfile(mode='r', title='Open the TeX file you want to combine',
-                                        filetypes=[('Tex Files', '*.tex')])
+                file_info = ask_open_file(mode='r', title='Open the TeX file you want to combine',
+                                          filetypes=[('Tex Files', '*.tex')])
                 self.corresponding_tex_file = file_info.name.replace("\\", "/") if file_info is not None else None
                 self.corresponding_tex_file = os.sep.join(self.corresponding_tex_file.split('/'))  # ensures multi os
                 # compatible
@@ -861,8 +1132,7 @@ def open_multiple_files(files: Union[list[str], str]) -> str:
     """
     if isinstance(files, str):
         try:
-            with open(files) as f:
-                prestart = f.read()
+            prestart = _read_preamble(files)
         except FileNotFoundError:
             print('you specified a file that did not exist')
             prestart = ''
@@ -870,8 +1140,7 @@ def open_multiple_files(files: Union[list[str], str]) -> str:
         preamble_text_list = []
         for pr_path in files:
             try:
-                with open(pr_path) as f:
-                    preamble_text_list.append(f.read())
+                preamble_text_list.append(_read_preamble(pr_path))
             except FileNotFoundError:
                 print('you specified a preamble that did not exist')
                 pass
@@ -879,6 +1148,20 @@ def open_multiple_files(files: Union[list[str], str]) -> str:
     return prestart
 
 
+def _read_preamble(path: str) -> str:
+    """Return the contents of the preamble file at path, only reading it
+    again if it changed since the last time it was read.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _PREAMBLE_CACHE.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, f.read())
+        _PREAMBLE_CACHE[path] = cached
+    return cached[1]
+
+
 def move_sty_cls_files(files: list[str]) -> list[str]:
     """Copy all files specified in the list of files to
     the same directory as this .py file.
@@ -921,6 +1204,14 @@ def check_config(json_path: str, overrides: dict[str, Any]) -> tuple[Preferences
     """
     with open(json_path) as json_file:
         data = json.load(json_file)
+    return preferences_from_config(data, overrides)
+
+
+def preferences_from_config(data: dict[str, Any], overrides: dict[str, Any]) -> tuple[Preferences, bool]:
+    """Return Preferences based on the contents of a config file, which
+    are not mutated.
+    """
+    data = copy.deepcopy(data)  # the lists in data may be shared with a cached config
     try:
         # temp_data = dict(data)
 
@@ -938,7 +1229,8 @@ def check_config(json_path: str, overrides: dict[str, Any]) -> tuple[Preferences
 def main(config: str = '', overrides: Optional[dict] = None,
          path_to_wordfile: Optional[str] = None,
          replacement_mode_path: Optional[str] = None,
-         disable_file_prompts: bool = False) -> None:
+         disable_file_prompts: bool = False,
+         temp_tex_file: Optional[str] = None) -> None:
     """The main method of this module.
 
     All paths are relative to main.py.
@@ -959,6 +1251,9 @@ def main(config: str = '', overrides: Optional[dict] = None,
     disable_file_prompts
         if this is set to true, if a file prompt comes up
         an error will be thrown.
+    temp_tex_file
+        where pandoc writes the tex file it converts the Word file to,
+        or None to use TEMP_TEX_FILENAME.
 
     Returns
     -------
@@ -975,8 +1270,8 @@ def main(config: str = '', overrides: Optional[dict] = None,
             if disable_file_prompts:
                 raise AttemptedFilePromptError('A word file prompt would have shown here.')
             else:
-                main_file_mfn = askopenfile(mode='r', title='Open the word file you want to convert',
-                                            filetypes=[('Word Files', '*.docx'), ('Tex Files', '*.tex')])
+                main_file_mfn = ask_open_file(mode='r', title='Open the word file you want to convert',
+                                              filetypes=[('Word Files', '*.docx'), ('Tex Files', '*.tex')])
             path_mfn = main_file_mfn.name.replace("\\", "/") if main_file_mfn is not None else None
         else:
             path_mfn = path_to_wordfile.replace("\\", "/")
@@ -997,9 +1292,11 @@ def main(config: str = '', overrides: Optional[dict] = None,
             print('We are in replacement mode')
             word_file_mfn = WordFileCombo(path_mfn, prefs_mfn,
                                           corresponding_tex_file=replacement_mode_path,
-                                          disable_file_prompts=disable_file_prompts)
+                                          disable_file_prompts=disable_file_prompts,
+                                          temp_tex_file=temp_tex_file)
         else:
-            word_file_mfn = WordFile(path_mfn, prefs_mfn, disable_file_prompts=disable_file_prompts)
+            word_file_mfn = WordFile(path_mfn, prefs_mfn, disable_file_prompts=disable_file_prompts,
+                                     temp_tex_file=temp_tex_file)
 
         # process and export the file.
         word_file_mfn.sequence()
@@ -1010,6 +1307,110 @@ def main(config: str = '', overrides: Optional[dict] = None,
         # time.sleep(2)
 
 
+def batch_main(directory: str, config: str, overrides: Optional[dict] = None,
+               jobs: Optional[int] = None) -> int:
+    """Convert every Word file in directory, jobs files at a time, and
+    print which of them failed.
+
+    Each file is converted by main() in its own process, with its own temp
+    tex file, and never prompts for anything or opens the PDF it exports.
+    Return 0 if every file was converted and 1 otherwise.
+    """
+    if overrides is None:
+        overrides = {}
+    overrides = {**overrides, 'open_after_export': False}
+    word_files = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                        if f.endswith('.docx') and not f.startswith('~$'))  # ~$ files are Word lock files
+    if not word_files:
+        print(f'No Word files found in {directory}.')
+        return 1
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(_batch_convert, word_files,
+                                    [config] * len(word_files), [overrides] * len(word_files)))
+    failures = [(path, error) for path, error in results if error is not None]
+    print(f'\nConverted {len(results) - len(failures)} of {len(results)} Word files.')
+    for path, error in results:
+        if error is None:
+            print(f'OK      {path}')
+        else:
+            print(f'FAILED  {path}: {error}')
+    return 1 if failures else 0
+
+
+def _repair_chunks(text: str, cuts: list[int], stages: list[tuple[Any, tuple, dict]]) -> tuple[str, list[Any]]:
+    """Return what _repair_part returns for text, but running stages on one
+    chunk of text at a time, each from one index in cuts to the next, for
+    WordFile._run_local_stages. Whatever else a stage returns must be a list.
+    """
+    bounds = [0] + cuts + [len(text)]
+    return _join_repaired(_repair_part(text[i:j], stages) for i, j in zip(bounds, bounds[1:]))
+
+
+def _join_repaired(results: Iterable[tuple[str, list[Any]]]) -> tuple[str, list[Any]]:
+    """Return the parts repaired in results joined in order, and the lists
+    every stage returned for each part joined in order, or None for stages
+    that only return the text.
+    """
+    parts = []
+    extras = None
+    for part, part_extras in results:
+        parts.append(part)
+        if extras is None:
+            extras = [None if extra is None else [] for extra in part_extras]
+        for joined, extra in zip(extras, part_extras):
+            if joined is not None:
+                joined.extend(extra)
+    return ''.join(parts), extras
+
+
+def _compile_stamp(tex_pieces: list[str], compile_command: list[str], inputs: Iterable[str]) -> str:
+    """Return a digest of the tex file made of tex_pieces, compile_command, and
+    the size and modification time of every file in inputs, which are the
+    other files the PDF is compiled from. Missing files count as well.
+    """
+    digest = hashlib.sha256()
+    for piece in tex_pieces:
+        digest.update(piece.encode('UTF-8', 'surrogatepass'))
+    digest.update(b'\0' + json.dumps(compile_command).encode('UTF-8'))
+    for path in sorted(set(inputs)):
+        try:
+            stat = os.stat(path)
+            state = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            state = None
+        digest.update(b'\0' + json.dumps([path, state]).encode('UTF-8'))
+    return digest.hexdigest()
+
+
+def _repair_part(text: str, stages: list[tuple[Any, tuple, dict]]) -> tuple[str, list[Any]]:
+    """Run every (func, args, kwargs) stage in stages on text, in order, for
+    WordFile._repair_parts. Return the text and what else each stage returned,
+    or None for stages that only return the text.
+    """
+    extras = []
+    for func, args, kwargs in stages:
+        result = func(text, *args, **kwargs)
+        text, extra = result if isinstance(result, tuple) else (result, None)
+        extras.append(extra)
+    return text, extras
+
+
+def _batch_convert(path_to_wordfile: str, config: str, overrides: dict) -> tuple[str, Optional[str]]:
+    """Convert one Word file for batch_main(). Return the path of the Word file
+    and a description of what went wrong, or None if nothing did.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='qwl_')
+    try:
+        main(config, overrides, path_to_wordfile, None, True,
+             temp_tex_file=os.path.join(temp_dir, TEMP_TEX_FILENAME))
+    except Exception as e:
+        return path_to_wordfile, f'{type(e).__name__}: {e}'
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return path_to_wordfile, None
+
+
 def list_get(lst: list[Any], index: int, default: Any = None) -> Any:
     """Grab the list at index, or default otherwise.
 
@@ -1035,14 +1436,43 @@ def list_get(lst: list[Any], index: int, default: Any = None) -> Any:
 
 
 if __name__ == '__main__':
+    import argparse
     import sys
-    full_command = sys.argv[1:]
-    if len(full_command) != 0:
-        main_path_to_wordfile = full_command[0]
-        config_mode = list_get(full_command, 1, os.path.join('config_modes', 'config_standard.json'))  # default: config_standard.json
-        main_replacement_mode_path = list_get(full_command, 2)  # default: None
+    if sys.argv[1:2] == ['serve']:
+        import server
+        sys.exit(server.main(sys.argv[2:]))
+    parser = argparse.ArgumentParser(description='Convert Word files to LaTeX.')
+    parser.add_argument('wordfile', nargs='?', help='the Word file to convert')
+    parser.add_argument('config_path', nargs='?', help='the config file to use')
+    parser.add_argument('replacement_path', nargs='?', help='the tex file used in replacement mode')
+    parser.add_argument('--batch', metavar='DIR', help='convert every Word file in DIR instead')
+    parser.add_argument('--config', help='the config file to use')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='how many Word files to convert at once in batch mode')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always run pandoc, even if its output for a Word file is cached')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every stage of the repair and write the timings to a json file')
+    parser.add_argument('--watch', action='store_true',
+                        help='convert the Word file again every time it is saved')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='how many seconds apart the Word file is checked for saves in watch mode')
+    args = parser.parse_args()
+    main_overrides = {'pandoc_cache': False} if args.no_cache else {}
+    if args.profile:
+        main_overrides['profile_stages'] = True
+    config_mode = args.config or args.config_path or os.path.join('config_modes', 'config_standard.json')
+    # default: config_standard.json
+    if args.batch is not None:
+        sys.exit(batch_main(args.batch, config_mode, main_overrides, args.jobs))
+    elif args.watch:
+        if args.wordfile is None:
+            parser.error('--watch needs the Word file to watch')
+        import watch
+        sys.exit(watch.watch(args.wordfile, config_mode, main_overrides, args.interval))
+    elif args.wordfile is not None:
         main_disable_file_prompts: bool = True  # always True
         print('Make sure you include the folder the config files are in!!')
-        main(config_mode, {}, main_path_to_wordfile, main_replacement_mode_path, main_disable_file_prompts)
+        main(config_mode, main_overrides, args.wordfile, args.replacement_path, main_disable_file_prompts)
     else:
         print('No word file specified! Doing nothing.')
@@ -341,6 +341,66 @@ def replace_align_region(text: str,
     else:
         # logging.warning('returning back.')
         return text, True, []
+    replace_with, labels_so_far = _align_replacement(isolated, auto_align, max_line_length, extra_info)
+    end_result = text[:start_replace - 1] + replace_with + text[end_replace:]
+    return end_result, False, labels_so_far
+
+
+def replace_all_align_regions(text: str,
+                              auto_align: bool = False, max_line_length: int = -1,
+                              extra_info: Optional[dict] = None) -> tuple[str, list[str]]:
+    """Convert every raw alignment region to a working LaTeX
+    alignment region.
+
+    Same as calling replace_align_region until no region is left, but
+    the document is only scanned and rebuilt once.
+
+    Returns
+    -------
+        tuple[str, list[str]]
+            Text with all alignment regions processed,
+            and all labels generated by equation
+            comments, in order.
+    """
+    chunks = []
+    labels_so_far = []
+    pos = 0
+    brace_layer = 0
+    while True:
+        temp_al = _scan_align_region(text, pos, brace_layer)
+        if temp_al is None:
+            chunks.append(text[pos:])
+            return ''.join(chunks), labels_so_far
+        isolated, start_replace, end_replace, brace_layer, rescan = temp_al
+        if rescan or start_replace == 0:
+            # replacing this region would change how replace_align_region
+            # scans the document again; let it decide from here on.
+            break
+        replace_with, labels = _align_replacement(isolated, auto_align, max_line_length,
+                                                  {} if extra_info is None else extra_info)
+        labels_so_far.extend(labels)
+        if start_replace - 1 < pos:
+            # the character before \[ belongs to the previous replacement
+            chunks[-1] = chunks[-1][:-1]
+        else:
+            chunks.append(text[pos:start_replace - 1])
+        chunks.append(replace_with)
+        pos = end_replace
+        if '\\[' in replace_with:
+            break
+    text = ''.join(chunks) + text[pos:]
+    while True:
+        text, stat, labels = replace_align_region(text, auto_align, max_line_length, extra_info)
+        labels_so_far.extend(labels)
+        if stat:
+            return text, labels_so_far
+
+
+def _align_replacement(isolated: str, auto_align: bool, max_line_length: int,
+                       extra_info: dict) -> tuple[str, list[str]]:
+    """Return what the raw alignment region isolated is replaced with,
+    and the labels generated by its equation comments.
+    """
     replace_with, has_comment, labels_so_far = process_align_region(isolated, auto_align, max_line_length,
                                                                     extra_info=extra_info)
     proof_line = ''
@@ -350,9 +410,7 @@ def replace_align_region(text: str,
     #     proof_line = '\n\\end{proof}\n'
     align_start = '\n\\begin{align*}\n' if not has_comment else '\n\\begin{align}\n'
     align_end = '\\end{align*}\n' if not has_comment else '\\end{align}\n'
-    end_result = text[:start_replace - 1] + align_start + replace_with.strip() + \
-                 '\n' + align_end + proof_line + text[end_replace:]
-    return end_result, False, labels_so_far
+    return align_start + replace_with.strip() + '\n' + align_end + proof_line, labels_so_far
 
 
 TEST_EQN = r"""
@@ -407,19 +465,41 @@ def detect_align_region(text: str) -> Optional[tuple[str, int, int]]:
             End index + 1 for the first align region found in text.
             Nothing if no align region found.
     """
+    found = _scan_align_region(text, 0, 0)
+    if found is None:
+        # print('ran out of alignment regions to check')
+        return None
+    return found[:3]
+
+
+def _scan_align_region(text: str, pos: int,
+                       brace_layer: int) -> Optional[tuple[str, int, int, int, bool]]:
+    """Detect the first raw alignment region in text[pos:], as if
+    text[:pos] had already been scanned by detect_align_region and
+    left brace_layer behind.
+
+    Return what detect_align_region returns, followed by the brace layer
+    just before the region opened and whether replacing the region changes
+    how the text before it is scanned; that happens if the region opened
+    while an earlier region was still open, or if the \\] it ends with was
+    looked at while scanning before it. Return None if there is no region.
+    """
     # text = 'aaaa(bb()()ccc)dd'
     # istart = []  # stack of indices of opening parentheses
     # d = {}
 
     inside = False  # True if \[ has passed and not closed
-    brace_layer = 0
     last_opening_region = 0
+    opening_brace_layer = brace_layer
+    opened_inside = False
+    lookahead = -1  # the furthest \\] looked at to rule out a region
     prev_is_backslash = False
     prev_is_opening_bracket = False  # if the prev is \[ - the [
     finished_region = [-1, -1]
     found = False
     special_region_info = None
-    for i, c in enumerate(text):  # the massive for loop
+    for i in range(pos, len(text)):  # the massive for loop
+        c = text[i]
         assert not (prev_is_opening_bracket and prev_is_backslash), '[ and \\ at the same time'
 
         if prev_is_opening_bracket and c != '{':
@@ -458,6 +538,7 @@ def detect_align_region(text: str) -> Optional[tuple[str, int, int]]:
                     state = dbl.valid_matrix(last_part)
                     if not state:  # this happens the most often
                         inside = False  # this is rarer.
+                        lookahead = ti_c
                     else:
                         finished_region[0] = last_opening_region
                         finished_region[1] = ti_c + 2
@@ -467,6 +548,8 @@ def detect_align_region(text: str) -> Optional[tuple[str, int, int]]:
 
         if prev_is_backslash:
             if c == '[':
+                opened_inside = inside
+                opening_brace_layer = brace_layer
                 inside = True
                 last_opening_region = i - 1
                 prev_is_opening_bracket = True
@@ -491,9 +574,9 @@ def detect_align_region(text: str) -> Optional[tuple[str, int, int]]:
                               text[special_region_info[1]:finished_region[1]]
             # print(captured_region)
 
-        return captured_region, finished_region[0], finished_region[1]
+        return captured_region, finished_region[0], finished_region[1], opening_brace_layer, \
+            opened_inside or finished_region[0] <= lookahead
     else:
-        # print('ran out of alignment regions to check')
         return None
 
 
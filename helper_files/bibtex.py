@@ -0,0 +1,237 @@
+"""A streaming BibTeX tokenizer, and an index of the entries it finds.
+
+Entries are yielded one at a time from a str or from any bytes-like buffer,
+such as a memory-mapped .bib file, so a bibliography never has to be read
+into one string, and the tokenizer stops as soon as its caller does.
+
+An entry starts at every @ that is not inside braces, and its key runs from
+the first opening brace after the @ to the first comma after that brace,
+which is exactly what extract_authors_from_bib has always used as the key.
+
+I/O functions are NOT allowed.
+"""
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Any, Iterable, Iterator, Optional, Union
+
+Buffer = Union[str, bytes, bytearray, memoryview, Any]  # Any for mmap.mmap
+
+# an escaped brace, an @, an opening brace or a closing brace, as numbered groups
+_EVENTS = re.compile(r'(\\[{}])|(@)|(\{)|(\})')
+_EVENTS_BYTES = re.compile(_EVENTS.pattern.encode('ascii'))
+_AT, _OPEN, _CLOSE = 2, 3, 4
+_FIELD_NAME = re.compile(r'\s*([A-Za-z][\w:.+-]*)\s*=\s*')
+_AUTHOR_SEPARATOR = re.compile(r'\s+and\s+')
+
+
+@dataclass
+class BibEntry:
+    """One entry of a bibliography.
+
+    Instance Attributes:
+        - key: the citation key.
+        - entry_type: the entry type in lowercase, such as 'book'.
+        - authors: the names in the author field, in order.
+        - year: the year field, the year of the date field, or '' if there is neither.
+        - fields: every field of the entry, by lowercase name, with the outer
+          braces or quotes removed.
+    """
+    key: str
+    entry_type: str
+    authors: list[str] = field(default_factory=list)
+    year: str = ''
+    fields: dict[str, str] = field(default_factory=dict)
+
+
+class BibIndex:
+    """The entries of a bibliography, looked up by key, author and year.
+
+    Instance Attributes:
+        - entries: every entry, in the order they appear in the bibliography.
+    """
+    entries: list[BibEntry]
+    _by_key: dict[str, BibEntry]
+    _by_author: dict[str, list[BibEntry]]
+    _by_year: dict[str, list[BibEntry]]
+
+    def __init__(self, entries: Iterable[BibEntry]) -> None:
+        self.entries = list(entries)
+        self._by_key = {}
+        self._by_author = {}
+        self._by_year = {}
+        for entry in self.entries:
+            self._by_key.setdefault(entry.key, entry)
+            for author in entry.authors:
+                self._by_author.setdefault(author.lower(), []).append(entry)
+            if entry.year:
+                self._by_year.setdefault(entry.year, []).append(entry)
+
+    @classmethod
+    def from_buffer(cls, buffer: Buffer) -> 'BibIndex':
+        """Return the index of the bibliography in buffer.
+
+        >>> index = BibIndex.from_buffer('@book{Smith2020,\\n author = {Smith, J. and Doe, A.},'
+        ...                              '\\n year = 2020}\\n@misc{Doe2019, title = "A {B} c"}')
+        >>> index.keys
+        ['Smith2020', 'Doe2019']
+        >>> [entry.key for entry in index.by_author('doe, a.')]
+        ['Smith2020']
+        >>> index.get('Doe2019').fields
+        {'title': 'A {B} c'}
+        """
+        return cls(iter_entries(buffer))
+
+    @property
+    def keys(self) -> list[str]:
+        """The key of every entry, in order, including repeated keys."""
+        return [entry.key for entry in self.entries]
+
+    def get(self, key: str) -> Optional[BibEntry]:
+        """Return the first entry with key, or None if there is none."""
+        return self._by_key.get(key)
+
+    def by_author(self, name: str) -> list[BibEntry]:
+        """Return every entry with an author called name, ignoring case."""
+        return list(self._by_author.get(name.lower(), []))
+
+    def by_year(self, year: Union[int, str]) -> list[BibEntry]:
+        """Return every entry from year."""
+        return list(self._by_year.get(str(year), []))
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return this index as a JSON-compatible dict."""
+        return {'entries': [asdict(entry) for entry in self.entries]}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'BibIndex':
+        """Return the index that to_dict() returned data for."""
+        return cls(BibEntry(**entry) for entry in data['entries'])
+
+
+def iter_entries(buffer: Buffer) -> Iterator[BibEntry]:
+    """Yield every entry of the bibliography in buffer, in order.
+
+    >>> [entry.key for entry in iter_entries(b'@article{a1, note={@x}}\\n@book{b2,}')]
+    ['a1', 'b2']
+    """
+    for start, end in entry_spans(buffer):
+        raw = _decode(buffer[start:end])
+        brace = raw.find('{')
+        entry_type = raw[1:brace].strip().lower() if brace != -1 else ''
+        fields = {}
+        if brace != -1:
+            body = raw[:_closing_brace(raw, brace)]
+            fields = _parse_fields(body, body.find(',', brace) + 1)
+        authors = [name for name in _AUTHOR_SEPARATOR.split(fields.get('author', '').strip()) if name]
+        year = fields.get('year', '') or fields.get('date', '')[:4]
+        yield BibEntry(entry_key(buffer, start), entry_type, authors, year.strip(), fields)
+
+
+def iter_keys(buffer: Buffer) -> Iterator[str]:
+    """Yield the key of every entry of the bibliography in buffer, in order,
+    without parsing the fields.
+    """
+    for start, _ in entry_spans(buffer):
+        yield entry_key(buffer, start)
+
+
+def entry_spans(buffer: Buffer) -> Iterator[tuple[int, int]]:
+    """Yield where each entry of the bibliography in buffer starts and ends.
+
+    An entry starts at an @ with no more unescaped opening braces than
+    unescaped closing braces before it, and ends where the next one starts.
+
+    >>> list(entry_spans('@a{x,\\n}\\n@b{y, t={@}}'))
+    [(0, 8), (8, 20)]
+    """
+    pattern = _EVENTS if isinstance(buffer, str) else _EVENTS_BYTES
+    depth = 0
+    start = None
+    for match in pattern.finditer(buffer):
+        group = match.lastindex
+        if group == _OPEN:
+            depth += 1
+        elif group == _CLOSE:
+            depth -= 1
+        elif group == _AT and depth <= 0:
+            if start is not None:
+                yield start, match.start()
+            start = match.start()
+    if start is not None:
+        yield start, len(buffer)
+
+
+def entry_key(buffer: Buffer, start: int) -> str:
+    """Return the key of the entry starting at start: what is between the
+    first opening brace after start and the first comma after that brace.
+    """
+    brace, comma = ('{', ',') if isinstance(buffer, str) else (b'{', b',')
+    opening = buffer.find(brace, start)
+    return _decode(buffer[opening + 1:buffer.find(comma, opening)])
+
+
+def _decode(chunk: Union[str, bytes]) -> str:
+    """Return chunk as a str."""
+    return chunk if isinstance(chunk, str) else bytes(chunk).decode('utf-8', errors='replace')
+
+
+def _parse_fields(raw: str, i: int) -> dict[str, str]:
+    """Return the fields of the entry raw, whose first field starts at i."""
+    fields = {}
+    n = len(raw)
+    while i < n:
+        match = _FIELD_NAME.match(raw, i)
+        if match is None:
+            break
+        i = match.end()
+        if i < n and raw[i] == '{':
+            end = _closing_brace(raw, i)
+            value, i = raw[i + 1:end], end + 1
+        elif i < n and raw[i] == '"':
+            end = _closing_quote(raw, i)
+            value, i = raw[i + 1:end], end + 1
+        else:
+            end = i
+            while end < n and raw[end] not in ',}':
+                end += 1
+            value, i = raw[i:end].strip(), end
+        fields[match.group(1).lower()] = ' '.join(value.split())
+        comma = raw.find(',', i)
+        if comma == -1:
+            break
+        i = comma + 1
+    return fields
+
+
+def _closing_brace(raw: str, i: int) -> int:
+    """Return where the brace at raw[i] is closed, or len(raw) if it is not."""
+    depth = 0
+    for j in range(i, len(raw)):
+        char = raw[j]
+        if char in '{}' and j > 0 and raw[j - 1] == '\\':
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(raw)
+
+
+def _closing_quote(raw: str, i: int) -> int:
+    """Return where the quote at raw[i] is closed outside of braces, or
+    len(raw) if it is not.
+    """
+    depth = 0
+    for j in range(i + 1, len(raw)):
+        char = raw[j]
+        if j > 0 and raw[j - 1] == '\\':
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == '"' and depth <= 0:
+            return j
+    return len(raw)
@@ -3,11 +3,19 @@
 I/O functions are NOT allowed.
 """
 # import json
+import itertools
 import logging
 import math
+import re
+import sys
+from bisect import bisect_right
 from dataclasses import dataclass, fields
+from functools import lru_cache
 from typing import Optional, Iterable, Callable, Union, Any
 
+from helper_files import bibtex, latex_index
+from helper_files.text_buffer import TextBuffer
+
 # ch = logging.StreamHandler()
 # ch.setLevel(logging.DEBUG)
 PREAMBLE_PATH = ('preamble.txt', 'preamble_LTable.txt', 'preamble_light.txt')
@@ -17,6 +25,9 @@ ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
 ALPHABET_ALL = ALPHABET + ALPHABET.upper() + '1234567890-+.,*/?!='
 MAX_PAGE_LENGTH = 35
 ALLOW_SPACES_IN_LANGUAGES = True
+# keyword arguments to dataclass() that give records __slots__, which needs Python 3.10.
+# On 3.9 they keep a __dict__, and behave the same otherwise.
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
 ENV_FORBIDDEN = ['table', 'tabular', 'longtable', 'minipage', 'texttt', 'enumerate', 'itemize',
                  'align*', 'gather', 'matrix', 'bmatrix', 'pmatrix', 'vmatrix', 'Bmatrix',
                  'Vmatrix']
@@ -439,19 +450,148 @@ def three_way_isolation(text: str, left_index: int, right_index: int) -> tuple[s
 
 def eliminate_all_longtables(text: str, disallow_figures: bool = True,
                              replace_longtable: bool = True, split_longtables: bool = False,
-                             float_type: str = 'h', max_page_len: int = 35) -> str:
+                             float_type: str = 'h', max_page_len: int = 35,
+                             map_tables: Callable = map) -> str:
     """Eliminate all longtables.
     Upper function for the other
 
     If disallow_figures is true, figuring tables will not count anything.
+
+    The longtables and their captions are found in one scan of text, rebuilt
+    with map_tables, which may be the map of a process pool since the tables
+    do not depend on each other, and joined once. If rebuilding a table would
+    change where the next one is found, such as when a longtable is inside
+    another, the rest of text is eliminated one table at a time instead.
+    """
+    lt_start = '\\begin{longtable}'
+    spans, stopped = _scan_longtables(text, disallow_figures)
+    rebuilt = map_tables(_rebuild_longtable, [text[start:end] for start, end, _, _ in spans],
+                         [figure for _, _, _, figure in spans], itertools.repeat(replace_longtable),
+                         itertools.repeat(split_longtables), itertools.repeat(float_type),
+                         itertools.repeat(max_page_len))
+    begins_kept = 0 if replace_longtable else 1
+    tables_so_far = []
+    pieces = []
+    tail = ''  # the end of everything in pieces
+    pos = 0
+    skip = 1
+    for (start, _, after_start, figure), new_table_info in zip(spans, rebuilt):
+        gap = text[pos:start]
+        if new_table_info.count(lt_start) != begins_kept \
+                or _straddles(tail + gap, new_table_info, lt_start) \
+                or _straddles(new_table_info, text[after_start:after_start + len(lt_start)], lt_start):
+            stopped = True
+            break
+        pieces.append(gap)
+        pieces.append(new_table_info)
+        tail = (tail + gap + new_table_info)[-len(lt_start):]
+        pos = after_start
+        skip += begins_kept
+        if figure is not None and figure[0] != '':
+            tables_so_far.append(figure[2])
+    pieces.append(text[pos:])
+    text = ''.join(pieces)
+    if stopped:
+        text = _eliminate_longtables_one_by_one(text, skip, tables_so_far, disallow_figures, replace_longtable,
+                                                split_longtables, float_type, max_page_len)
+    return _reference_tables(text, tables_so_far)
+
+
+def _scan_longtables(text: str, disallow_figures: bool) \
+        -> tuple[list[tuple[int, int, int, Optional[tuple[str, str, str]]]], bool]:
+    """Return every longtable in text that eliminate_all_longtables can rebuild
+    on its own, and whether the scan stopped early at a longtable it cannot.
+
+    Each longtable is given as where it starts, where it ends, where the text
+    after it and its caption starts, and its label, caption and number if it
+    has a caption, or None otherwise.
+    """
+    lt_start = '\\begin{longtable}'
+    lt_end = '\\end{longtable}'
+    spans = []
+    start = text.find(lt_start)
+    while start != -1:
+        end = find_env_end(text, start, 'longtable')
+        if end == -1:
+            return spans, True
+        end += len(lt_end) + 2
+        after_start = end
+        figure = None
+        if not disallow_figures and text.startswith('Table', end):
+            after_start = text.find('\n\n', end)
+            if after_start == -1:
+                return spans, True
+            figure = _table_caption(text[end:after_start], after_start - end)
+        spans.append((start, end, after_start, figure))
+        start = text.find(lt_start, after_start)
+    return spans, False
+
+
+def _rebuild_longtable(during: str, figure: Optional[tuple[str, str, str]], replace_longtable: bool,
+                       split_longtables: bool, float_type: str, max_page_len: int) -> str:
+    """Return the longtable during as eliminate_all_longtables leaves it.
+    figure is the label, caption and number of the table, or None if it has no caption.
+    """
+    if split_longtables:
+        during = longtable_split_detector(during)
+    if figure is None:
+        if replace_longtable:
+            return longtable_eliminator(during, '', '', float_type, max_page_len=max_page_len)
+        return during
+    fig_label, figure_caption, _ = figure
+    if replace_longtable:
+        return longtable_eliminator(during, fig_label, figure_caption, float_type, max_page_len)
+    return add_label_to_longtable(during, figure_caption, fig_label)
+
+
+def _table_caption(after: str, end_figure_index: int) -> tuple[str, str, str]:
+    """Return the label, caption and number of the caption at the start of
+    after, which ends at end_figure_index. The label is empty if the number
+    is not a valid label.
     """
+    table_text_cap = 'Table'
+    temp_figure_text = after[:end_figure_index]
+    temp_figure_text_2 = temp_figure_text[len(table_text_cap) + 1:]
+    end_of_numbering_1 = find_nth(temp_figure_text_2, ':', 1)
+    end_of_numbering_2 = find_nth(temp_figure_text_2, '\n', 1)
+    # we can assert that end of both numbers aren't the same
+    if end_of_numbering_1 == end_of_numbering_2 == -1:
+        end_of_numbering = len(temp_figure_text_2)
+    else:
+        if end_of_numbering_1 < 0:
+            end_of_numbering_1 = end_of_numbering_2
+        if end_of_numbering_2 < 0:
+            end_of_numbering_2 = end_of_numbering_1
+        end_of_numbering = min(end_of_numbering_2, end_of_numbering_1)
+    figure_num = temp_figure_text_2[:end_of_numbering]  # this is actually a string
+    figure_caption = temp_figure_text_2[end_of_numbering + 2:end_figure_index]
+    if figure_num == '' or not check_valid_label(figure_num):  # if the label is invalid, don't add it.
+        fig_label = ''
+    else:
+        fig_label = '\\label{table:p' + figure_num + '}\n'
+    return fig_label, figure_caption, figure_num
+
+
+def _straddles(left: str, right: str, sub: str) -> bool:
+    """Return whether sub occurs in left + right across where they meet.
 
+    >>> _straddles('ab', 'cd', 'bc'), _straddles('abc', 'd', 'bc')
+    (True, False)
+    """
+    return sub in left[len(left) - len(sub) + 1:] + right[:len(sub) - 1]
+
+
+def _eliminate_longtables_one_by_one(text: str, skip: int, tables_so_far: list[str],
+                                     disallow_figures: bool, replace_longtable: bool, split_longtables: bool,
+                                     float_type: str, max_page_len: int) -> str:
+    """Eliminate the longtables from the skipth one onwards, looking for the
+    next one again after each. Add the numbers of the captioned tables to
+    tables_so_far.
+    """
     # i = 1
     lt_start = '\\begin{longtable}'
     lt_end = '\\end{longtable}'
     table_text_cap = 'Table'
-    tables_so_far = []
-    skip = 1
     # j = 1
     while True:
         # find_not_in_environment(text, lt_start, )
@@ -462,47 +602,38 @@ def eliminate_all_longtables(text: str, disallow_figures: bool = True,
             break
         during, before, after = three_way_isolation(text, lt_start_index, lt_end_index)
         if not disallow_figures and after[:len(table_text_cap)] == table_text_cap:
-
             end_figure_index = find_nth(after, '\n\n', 1)
-
-            temp_figure_text = after[:end_figure_index]
-            temp_figure_text_2 = temp_figure_text[len(table_text_cap) + 1:]
-            end_of_numbering_1 = find_nth(temp_figure_text_2, ':', 1)
-            end_of_numbering_2 = find_nth(temp_figure_text_2, '\n', 1)
-            # we can assert that end of both numbers aren't the same
-            if end_of_numbering_1 == end_of_numbering_2 == -1:
-                end_of_numbering = len(temp_figure_text_2)
-            else:
-                if end_of_numbering_1 < 0:
-                    end_of_numbering_1 = end_of_numbering_2
-                if end_of_numbering_2 < 0:
-                    end_of_numbering_2 = end_of_numbering_1
-                end_of_numbering = min(end_of_numbering_2, end_of_numbering_1)
-            figure_num = temp_figure_text_2[:end_of_numbering]  # this is actually a string
-            figure_caption = temp_figure_text_2[end_of_numbering + 2:end_figure_index]
+            figure = _table_caption(after, end_figure_index)
             after = after[end_figure_index:]
-            if figure_num == '' or not check_valid_label(figure_num):  # if the label is invalid, don't add it.
-                fig_label = ''
-            else:
-                fig_label = '\\label{table:p' + figure_num + '}\n'
-                tables_so_far.append(figure_num)
-            if split_longtables:
-                during = longtable_split_detector(during)
-            if replace_longtable:
-                new_table_info = longtable_eliminator(during, fig_label, figure_caption, float_type, max_page_len)
-            else:
-                during = add_label_to_longtable(during, figure_caption, fig_label)
-                new_table_info = during
-                skip += 1
+            if figure[0] != '':
+                tables_so_far.append(figure[2])
         else:
-            if split_longtables:
-                during = longtable_split_detector(during)
-            if replace_longtable:
-                new_table_info = longtable_eliminator(during, '', '', float_type, max_page_len=max_page_len)
-            else:
-                new_table_info = during
-                skip += 1
+            figure = None
+        new_table_info = _rebuild_longtable(during, figure, replace_longtable, split_longtables,
+                                            float_type, max_page_len)
+        if not replace_longtable:
+            skip += 1
         text = before + new_table_info + after
+    return text
+
+
+def _reference_tables(text: str, tables_so_far: list[str]) -> str:
+    """Return text with every Table or table followed by a number in
+    tables_so_far replaced with a reference to that table.
+
+    Every number is replaced in one pass, unless replacing one could make or
+    break the reference to another, as it can when a number ends like the
+    start of "table ".
+
+    >>> _reference_tables('Table 1 and table 2A, not Table 3', ['1', '2A'])
+    'Table \\\\ref{table:p1} and table \\\\ref{table:p2A}, not Table 3'
+    """
+    if not tables_so_far:
+        return text
+    if all(_is_plain_table_number(number) for number in tables_so_far):
+        numbers = dict.fromkeys(tables_so_far)  # the first number that fits wins, as with the replaces below
+        pattern = re.compile('([Tt]able) (' + '|'.join(re.escape(number) for number in numbers) + ')')
+        return pattern.sub(lambda m: m.group(1) + ' \\ref{table:p' + m.group(2) + '}', text)
     new_figures_so_far = ['\\ref{table:p' + x + '}' for x in tables_so_far]
     old_figures_so_far = ['Table ' + y for y in tables_so_far]
     old_figures_so_far_1 = ['table ' + z for z in tables_so_far]
@@ -510,10 +641,20 @@ def eliminate_all_longtables(text: str, disallow_figures: bool = True,
         text = text.replace(old_figures_so_far[i], 'Table ' + new_figures_so_far[i])
     for i in range(0, len(old_figures_so_far_1)):
         text = text.replace(old_figures_so_far_1[i], 'table ' + new_figures_so_far[i])
-        # j += 1
     return text
 
 
+def _is_plain_table_number(number: str) -> bool:
+    """Return whether no Table or table reference can start inside
+    'Table ' + number, other than at its start.
+
+    >>> _is_plain_table_number('4A'), _is_plain_table_number('4 A'), _is_plain_table_number('4Ta')
+    (True, False, False)
+    """
+    return not any(char.isspace() for char in number) \
+        and not any(number.endswith(word[:i]) for word in ('Table', 'table') for i in range(1, len(word) + 1))
+
+
 def replace_not_in_environment(text: str, depth: int, env: str, sub: str, sub2: str) -> str:
     """Replace environment depth
     """
@@ -869,19 +1010,131 @@ def rfind_nth(haystack: str, needle: str, n: int, starter: int = 0,
     return end
 
 
-def do_citations(text: str, bib_contents: str, mode: str = 'apa', brackets: bool = False,
+def do_citations(text: str, bib_contents: Union[str, bibtex.BibIndex], mode: str = 'apa', brackets: bool = False,
                  cite_properities: Optional[dict[str, Any]] = None) -> str:
     """Return text with converted citations.
+    bib_contents is either the text of the .bib file or its index.
     """
     if cite_properities is None:
         cite_properities = {}
-    authors = extract_authors_from_bib(bib_contents)
+    if isinstance(bib_contents, bibtex.BibIndex):
+        authors = bib_contents.keys
+    else:
+        authors = extract_authors_from_bib(bib_contents)
+    single_pass = _citations_single_pass(text, authors, mode, brackets, cite_properities)
+    if single_pass is not None:
+        return single_pass
     text = citation_handler(text, authors, brackets, cite_properities)
     text = bulk_citation_page_handler(text, mode, False, authors, brackets, cite_properities)
     text = multi_cite_handler_bulk(text, authors, cite_properities)
     return text
 
 
+# what an author tag must look like for _citations_single_pass to handle its citations
+_AUTHOR_TAG = re.compile(r'[^\s(),\\{}]+')
+# an opening parenthesis, what could be an author tag, and what follows the tag
+_CITATION_START = re.compile(r'\(([^\s(),\\{}]+)[) ,]')
+
+
+def _citations_single_pass(text: str, authors: list[str], mode: str, brackets: bool,
+                           cite_properities: dict[str, Any]) -> Optional[str]:
+    """Return what citation_handler, bulk_citation_page_handler (with p False) and
+    multi_cite_handler_bulk return when run one after another on text, but
+    in one scan of text instead of one per author per phase.
+
+    Every citation is an opening parenthesis followed by an author tag, and
+    tags never contain a delimiter, so the tag right after a parenthesis
+    decides which author, if any, it cites. The phases only interact when
+    citations are nested or touch each other; return None in those cases, and
+    whenever an author tag could contain a delimiter, since only running the
+    phases one after another gives the right answer then.
+
+    >>> props = {'citation_kw': 'cite'}
+    >>> print(_citations_single_pass('a (x) b (x, p. 3) c (x, y).', ['x', 'y'], 'apa2', False, props))
+    a \\cite{x} b\\cite[3]{x} c \\cite{x,y}.
+    >>> _citations_single_pass('(x, p. 3)', ['x'], 'apa2', False, props) is None
+    True
+    """
+    if not all(_AUTHOR_TAG.fullmatch(author) for author in authors):
+        return None
+    author_set = set(authors)
+    mode = mode.lower()
+    if mode == 'apa1':
+        page_sep = ','
+    elif mode == 'apa2':
+        page_sep = ', p. '
+    else:  # MLA
+        page_sep = ' '
+    pieces = []
+    last = 0  # text[:last] is in pieces
+    # where the last citation rewritten by the page or the multi-author phase ended
+    last_late_end = -1
+    for match in _CITATION_START.finditer(text):
+        src = match.group(1)
+        if src not in author_set:
+            continue
+        start = match.start()
+        after = match.end(1)  # the index after the tag
+        if text[after] == ')':
+            cite_src = '\\' + cite_properities['citation_kw'] + '{' + src + '}'
+            if brackets:
+                cite_src = ' (' + cite_src + ')'
+            end, late, eat = after + 1, False, False
+        else:
+            closing = text.find(')', after)
+            if closing == -1:
+                continue
+            if text.find('(', start + 1, closing) != -1:
+                return None  # something in the citation may be rewritten first
+            if text.startswith(page_sep, after):
+                page_number = text[after + len(page_sep):closing]
+                cite_src = '\\' + cite_properities['citation_kw'] + '[' + page_number + ']{' + src + '}'
+                if brackets:
+                    cite_src = ' (' + cite_src + ')'
+                eat = True
+            elif text.startswith(', ', after):
+                post_cite_ind = after + 2
+                author_list = [src]
+                for author in authors:
+                    if text.find(author + ', ', post_cite_ind, closing) != -1 or \
+                            text.find(author + ')', post_cite_ind, closing + 1) != -1:
+                        author_list.append(author)
+                cite_src = '\\' + cite_properities['citation_kw'] + '{' + ','.join(author_list) + '}'
+                eat = False
+            else:
+                continue
+            end, late = closing + 1, True
+        if eat:
+            # the page phase also replaces the character before the citation
+            if start == 0 or start - 1 == last_late_end:
+                return None
+            if start == last:  # that character ends the citation rewritten just before
+                pieces[-1] = pieces[-1][:-1]
+            else:
+                pieces.append(text[last:start - 1])
+        else:
+            pieces.append(text[last:start])
+        if brackets and _ends_with_citation_start(pieces[-1], author_set, page_sep == ' '):
+            return None  # the space the citation starts with would complete another citation
+        pieces.append(cite_src)
+        last = end
+        if late:
+            last_late_end = end - 1
+    pieces.append(text[last:])
+    return ''.join(pieces)
+
+
+def _ends_with_citation_start(text: str, author_set: set[str], mla: bool) -> bool:
+    """Return whether text ends with an opening parenthesis, an author tag
+    in author_set and a comma, or with no comma if mla.
+    """
+    opening = text.rfind('(')
+    if opening == -1:
+        return False
+    tag = text[opening + 1:]
+    return (tag.endswith(',') and tag[:-1] in author_set) or (mla and tag in author_set)
+
+
 def citation_handler(text: str, citation_list: list[str], brackets: bool = False,
                      cite_properities: Optional[dict[str, Any]] = None) -> str:
     """Handle all non-page citations.
@@ -946,25 +1199,29 @@ def citation_page_handler(text: str, src: str, mode: str = 'apa2', p: bool = Fal
         str_text = '(' + src + ', p. '
     else:  # MLA
         str_text = '(' + src + ' '
-    while True:
-        starter = text.find(str_text)
-        # temp_text = text[starter:]
-        if starter == -1:
-            break
+    buffer = TextBuffer(text)
+    starter = buffer.find(str_text)
+    while starter != -1:
         start_offset = len(str_text)
         end = starter + start_offset  # the index after 'p. '
-        closing_bracket = text.find(')', end)
+        closing_bracket = buffer.find(')', end)
         if closing_bracket == -1:
             break
-        page_number = text[end:closing_bracket]
+        page_number = buffer[end:closing_bracket]
         citation_bound_end = closing_bracket + 1
         if p:
             page_number = 'p. ' + page_number
         cite_src = '\\' + cite_properities['citation_kw'] + '[' + page_number + ']{' + src + '}'
         if brackets:
             cite_src = ' (' + cite_src + ')'
-        text = text[:starter - 1] + cite_src + text[citation_bound_end:]
-    return text
+        if starter == 0:  # text[:-1] keeps everything but the last character
+            buffer.splice(0, citation_bound_end, buffer[0:len(buffer) - 1] + cite_src)
+            starter = buffer.find(str_text)
+            continue
+        buffer.splice(starter - 1, citation_bound_end, cite_src)
+        # nothing before the replacement matched, so only a match that runs into it can be new
+        starter = buffer.find(str_text, max(0, starter - len(str_text)))
+    return str(buffer)
 
 
 def multi_cite_handler_bulk(text: str, srcs: list[str], cite_properities: Optional[dict[str, Any]] = None) -> str:
@@ -1035,11 +1292,14 @@ class LatexEnvironment:
         - end: end text of the LaTeX environment.
         - encapsulation: Formats required
     """
+    __slots__ = ('env_name', 'start', 'end', 'encapsulation', 'initial_newline', 'start_alt', 'priority',
+                 'has_extra_args', 'extra_args_type', 'env_prefix', 'env_suffix', 'env_middlefix')
     env_name: str  # env name, doesn't matter if caps or not
     start: str
     end: str
     encapsulation: str
     initial_newline: bool
+    start_alt: str
     priority: int
     has_extra_args: bool
     extra_args_type: str
@@ -1076,7 +1336,7 @@ class LatexEnvironment:
         self.env_middlefix = env_middlefix
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class _RawLatexEnvironment:
     """Before
     """
@@ -1242,7 +1502,7 @@ def bulk_environment_wrapper(text: str, envs: list[LatexEnvironment], disable_le
     return text
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class EnvironmentInstance:
     """This would have been a dict
     Because we only support end breaking characters,
@@ -1411,6 +1671,9 @@ Now we're out.
 def environment_wrapper_2(text: str, env_info: LatexEnvironment) -> str:
     """An updated version of the environment wrapper which uses a newer word syntax.
     Compatible with the old environment wrapper, though this is always run first.
+
+    The wraps are made on a TextBuffer, so wrapping many environments does not
+    copy the whole document once per environment.
     """
     braces = env_info.extra_args_type != 'bracket'
     if (not braces) and env_info.env_middlefix != '':
@@ -1428,38 +1691,40 @@ def environment_wrapper_2(text: str, env_info: LatexEnvironment) -> str:
 
     keyword_wrapper = '\\' + wrapper + '{' + keyword
 
-    # find nth: haystack, needle, n, starter = None
-    n = 1  # skip
+    buffer = TextBuffer(text)
+    # where the search for the next starter begins, which is where find_nth(text, keyword_wrapper, n)
+    # would find it, as the text before a starter is never changed
+    search_from = 0
     while True:
-        start = find_nth(text, keyword_wrapper, n)
+        start = buffer.find(keyword_wrapper, search_from)
         if start == -1:  # BASE CASE: we couldn't find an environment starter
             break
         start_after = start + len(keyword_wrapper) + 1  # index of the dash
-        if (text[start_after:start_after + 2] not in dashes and text[start_after] != '(') or \
-                text[start - 2:start] != '\n\n':
+        if (buffer[start_after:start_after + 2] not in dashes and _char_at(buffer, start_after) != '(') or \
+                buffer[start - 2:start] != '\n\n':
             # THIS WILL RUN INCASE OF FAILURE
             def_after = start + len(keyword_wrapper)
-            if text[def_after:def_after + 2] == '.}' and text[start - 2:start] == '\n\n':
+            if buffer[def_after:def_after + 2] == '.}' and buffer[start - 2:start] == '\n\n':
                 end_declare = def_after + 2  # the index after \textbf{Definition}
                 # extra_args_name = ''
                 end = end_declare
                 # term = extra_args_name
                 term = ''
-            elif text[def_after:].startswith('} ('):
+            elif buffer[def_after:def_after + 3] == '} (':
                 # assume that no brackets are nested.
-                end_open = text.find(')', def_after + 3)
-                extra_args_name = text[def_after + 3:end_open]
+                end_open = buffer.find(')', def_after + 3)
+                extra_args_name = buffer[def_after + 3:end_open]
                 # end_open + 1 is the period at \textbf{Definition} (Salt).
                 # However, the period is optional.
                 tbf_dot = '\\textbf{.}'
                 tbf_dot2 = '\\textbf{. }'
 
                 # End_declare is the index after the period.
-                if text[end_open + 1] == '.':
+                if _char_at(buffer, end_open + 1) == '.':
                     end_declare = end_open + 2
-                elif text[end_open + 1:].startswith(tbf_dot):
+                elif buffer[end_open + 1:end_open + 1 + len(tbf_dot)] == tbf_dot:
                     end_declare = end_open + 1 + len(tbf_dot)
-                elif text[end_open + 1:].startswith(tbf_dot2):
+                elif buffer[end_open + 1:end_open + 1 + len(tbf_dot2)] == tbf_dot2:
                     end_declare = end_open + 1 + len(tbf_dot2)
                 else:
                     end_declare = end_open + 1
@@ -1468,42 +1733,73 @@ def environment_wrapper_2(text: str, env_info: LatexEnvironment) -> str:
                 # A strip would occur anyway.
             else:
                 # IF THE FALLBACK FAILS
-                n += 1
+                search_from = start + len(keyword_wrapper)
                 continue
                 # otherwise
         else:
-            end = local_env_end(text, start)  # find_nth(text, '}', 1, start_after)
+            end = _buffer_local_env_end(buffer, start)
             # find_endbrace(text, start_after)
-            temp_num = 1 if text[start_after] == '(' else 2
-            term = text[start_after + temp_num:end]
+            temp_num = 1 if buffer[start_after:start_after + 1] == '(' else 2
+            term = buffer[start_after + temp_num:end]
             if term[-1] == ':':
                 term = term[:-1]
             elif term.endswith(').'):
                 term = term[:-2]
             term = term.strip()
-        next_nl_skip = 1
+        next_newline = buffer.find('\n\n', end + 1)
         while True:  # intent: math regions don't break. Actual: Max of one math region.
-            next_newline = find_nth(text, '\n\n', next_nl_skip, end + 1)
             if next_newline == -1:  # base case: there is now next newline. Then give up
                 # next_newline = len(text) - 1
-                return text
+                return str(buffer)
                 # break
 
-            elif text[next_newline + 2:next_newline + 4] == R'\[' \
-                    or text[next_newline + 2:next_newline + 3] in ALPHABET or any(
-                text[next_newline + 2:].startswith(tx) for tx in allowed_terms):
-                next_nl_skip += 1
+            elif buffer[next_newline + 2:next_newline + 4] == R'\[' \
+                    or buffer[next_newline + 2:next_newline + 3] in ALPHABET or any(
+                buffer[next_newline + 2:next_newline + 2 + len(tx)] == tx for tx in allowed_terms):
+                next_newline = buffer.find('\n\n', next_newline + 2)
                 continue
             else:
                 break
 
         extra_args = br[0] + term + br[1] if term != '' else ''
 
-        text = text[:start] + k_begin + extra_args + \
-               env_info.env_suffix + '\n' + text[end + 1:next_newline].strip() + '\n' + \
-               k_end + text[
-                       next_newline:]
-    return text
+        buffer.splice(start, next_newline, k_begin + extra_args + env_info.env_suffix + '\n' +
+                      buffer[end + 1:next_newline].strip() + '\n' + k_end)
+        # every starter that ends before the wrap was already looked at
+        search_from = max(search_from, start - len(keyword_wrapper) + 1)
+    return str(buffer)
+
+
+def _char_at(buffer: TextBuffer, index: int) -> str:
+    """Return buffer[index] the way a str would, raising IndexError if
+    index is out of range.
+
+    Preconditions:
+        - index >= 0
+    """
+    char = buffer[index:index + 1]
+    if char == '':
+        raise IndexError('string index out of range')
+    return char
+
+
+def _buffer_local_env_end(buffer: TextBuffer, index: int) -> int:
+    """Return local_env_end(str(buffer), index), looking at as little of
+    buffer as possible.
+
+    Preconditions:
+        - buffer[index:index + 1] == '\\'
+    """
+    size = 4096
+    while True:
+        window = buffer[index:index + size]
+        try:
+            # buffer[index] is not a brace, so nothing before the window changes the answer
+            return latex_index.LatexIndex(window).local_env_end(0) + index
+        except ValueError:
+            if index + size >= len(buffer):
+                raise
+        size *= 4
 
 
 def environment_wrapper(text: str, env: str, start: str, end: str, env_info: LatexEnvironment,
@@ -1600,6 +1896,9 @@ def text_bound_fixer(text: str, replacement: dict[str, str], n: int = 1) -> str:
     """Detect and fix text environments with
     unicode characters. Also fix text environments that are two characters
     or shorter.
+
+    Every text environment from the nth one onwards is looked at once,
+    in order.
     """
     # logging.warning('text is ' + text)
 
@@ -1607,45 +1906,44 @@ def text_bound_fixer(text: str, replacement: dict[str, str], n: int = 1) -> str:
     unicode_list = list(replacement.keys())
     # n = 1  # ignored count starting from 1
     btext = R'\text{'
-    text_index = find_nth(text, btext, n)
-    if text_index == -1:
-        # logging.warning('could not find another text env')
-        return text
-    starting_index = text_index + len(btext)
-    layers_in = 0
-    min_index = starting_index
-    while True:
-        inner_brace = text.find(R'{', min_index)
-        outer_brace = text.find(R'}', min_index)
-        if outer_brace == -1:
-            # logging.warning('No outer brace')
-            return text
-        if inner_brace == -1:
-            inner_brace = math.inf
-        if inner_brace < outer_brace:
-            layers_in += 1
-            min_index = inner_brace + 1
-            continue
+    buffer = TextBuffer(text)
+    text_index = buffer.find_nth(btext, n)
+    while text_index != -1:
+        starting_index = text_index + len(btext)
+        layers_in = 0
+        min_index = starting_index
+        min_inner_index = starting_index  # never count the same { twice
+        while True:
+            inner_brace = buffer.find(R'{', max(min_index, min_inner_index))
+            outer_brace = buffer.find(R'}', min_index)
+            if outer_brace == -1:
+                # logging.warning('No outer brace')
+                return str(buffer)
+            if inner_brace == -1:
+                inner_brace = math.inf
+            if inner_brace < outer_brace:
+                layers_in += 1
+                min_index = inner_brace + 1
+                min_inner_index = min_index
+                continue
+            else:
+                if layers_in > 0:
+                    layers_in -= 1
+                    min_index = outer_brace - 1
+                else:  # if layers_in == 0
+                    break
+        inner_text = buffer[starting_index:outer_brace]
+        fix_region = check_inner_text(inner_text) or check_char_bulk(inner_text, unicode_list)
+        if fix_region:
+            # logging.warning('fix region detected')
+            for u1, u2 in replacement.items():
+                inner_text = inner_text.replace(u1, u2 + ' ')
+            buffer.splice(text_index, outer_brace + 1, inner_text)
+            # the next \text{ may start in the text that was just put in
+            text_index = buffer.find(btext, max(0, text_index - len(btext) + 1))
         else:
-            if layers_in > 0:
-                layers_in -= 1
-                min_index = outer_brace - 1
-            else:  # if layers_in == 0
-                break
-    inner_text = text[starting_index:outer_brace]
-    fix_region = check_inner_text(inner_text) or check_char_bulk(inner_text, unicode_list)
-    # print(text)
-    if fix_region:
-
-        # logging.warning('fix region detected')
-        for u1, u2 in replacement.items():
-            inner_text = inner_text.replace(u1, u2 + ' ')
-        text = text[:text_index] + inner_text + text[outer_brace + 1:]
-        return text_bound_fixer(text, replacement, n)
-    else:
-        n += 1
-        # logging.warning(n)
-        return text_bound_fixer(text, replacement, n)
+            text_index = buffer.find(btext, starting_index)
+    return str(buffer)
 
 
 def check_inner_text(inner_text: str) -> bool:
@@ -1700,6 +1998,13 @@ def bracket_layers(text: str, index: int,
     >>> bracket_layers(temp_text, 6)
     1
     """
+    if (opening_brace, closing_brace, escape_char) == ('{', '}', True):
+        # the usual braces are answered from the brace depths of the whole text
+        if not (-1 <= index < len(text)) or (index < starting_index and index != -1):
+            raise IndexError('Your index was out of bounds.')
+        ind = latex_index.get_index(text)
+        end = index if index != -1 else len(text) - 1
+        return ind.brace_depth(end) - ind.brace_depth(starting_index - 1)
     if not (len(opening_brace) == 1 and len(closing_brace) == 1):
         escape_char = False
     layer = 0
@@ -1753,14 +2058,16 @@ def split_all_equations(text: str, max_len: int, skip: int = 0,
     """
     equation_labels = []  # this is an equation label. Feel free to
     # screenshot.
-    while True:
+    buffer = TextBuffer(text)
+    starting_index = buffer.find_nth(R'\[', skip + 1)
+    finishing_index = buffer.find_nth(R'\]', skip + 1)
+    while -1 not in (starting_index, finishing_index):
         equation_is_numbered = False
-        starting_index = find_nth(text, R'\[', skip + 1)
-        finishing_index = find_nth(text, R'\]', skip + 1)
-        if -1 in (starting_index, finishing_index):
-            break
         assert starting_index < finishing_index
-        eqn_text = text[starting_index + 2:finishing_index]
+        prev_skip = skip
+        eqn_text = buffer[starting_index + 2:finishing_index]
+        # equation ends inside this equation; they are before the next one.
+        ends_inside = eqn_text.count(R'\]')
         eqn_comment = None
         if numbered_equations and valid_matrix(eqn_text):
             eqn_text, eqn_comment = matrix_equation_extractor(eqn_text)
@@ -1789,19 +2096,23 @@ def split_all_equations(text: str, max_len: int, skip: int = 0,
                                     f' Invalid comments are not plain text or numbers.')
                     eqn_env_text = '\\[' + eqn_text + '  \\]'  # add a backslash before
                     skip += 1
-                text = text[:starting_index] + eqn_env_text + text[finishing_index + 2:]
+                buffer.splice(starting_index, finishing_index + 2, eqn_env_text)
             else:  # skip only if we didn't wrap this around an eqn environment
                 skip += 1
         else:  # otherwise, updates are done, and then we continue.
             if equation_is_numbered:
                 logging.warning(f'Extra long numbered equation: {eqn_comment}. Comment deleted.')
-            text = text[:starting_index] + R'\[' + new_eqn_text + R'\]' + text[finishing_index + 2:]
+            buffer.splice(starting_index, finishing_index + 2, R'\[' + new_eqn_text + R'\]')
             skip += 1
+        # the text before starting_index is untouched, and holds every earlier
+        # equation start, but not the equation ends that were inside this equation.
+        finishing_index = buffer.find_nth(R'\]', skip - prev_skip + 1 + ends_inside, starting_index)
+        starting_index = buffer.find_nth(R'\[', skip - prev_skip + 1, starting_index)
     # if equation_labels:  # if equation_labels isn't empty
     #     text = bulk_labeling(text, equation_labels, )
     # we will not be including refs because of how equations are typed out.
 
-    return text, equation_labels
+    return str(buffer), equation_labels
 
 
 def remove_local_environment(text: str, env: Union[str, list[str]]) -> str:
@@ -1919,6 +2230,14 @@ LHS = AP = A\begin{bmatrix}
 """
 
 
+# how many equations split_equation and calculate_eqn_length remember
+_EQUATION_CACHE_SIZE = 4096
+# the functions calculate_eqn_length counts as plain text, without their backslash
+_EQN_FUNCTION = re.compile(r'\\(?=sin|cos|tan|csc|sec|cot|arcsin|arccos|arctan|log|ln|sqrt)')
+# a command to shorten to one letter, or an escaped character to leave alone
+_ENV_COMMAND = re.compile('\\\\(?:([' + ALPHABET + ']+)(?=[^' + ALPHABET + '])|[^' + ALPHABET + '])')
+
+
 def split_equation(text: str, max_len: int, list_mode: bool = False) -> Union[None, str, list[str]]:
     """Return a split version of an equation.
     text is the raw equation text, and is not wrapped by display style brackets.
@@ -1926,6 +2245,33 @@ def split_equation(text: str, max_len: int, list_mode: bool = False) -> Union[No
     has to be added.
     Return none if the equation does not need to be split.
     If list_mode is set to True, then return as a list of strings.
+
+    Equations that were split recently are not split again.
+    """
+    lines = _split_equation_lines(text, max_len)
+    if lines is None:
+        return None
+    if list_mode:
+        return list(lines)
+    final_str = ''
+    for line in lines:
+        final_str = final_str + '{ ' + line + ' }'
+    return final_str
+
+
+def equation_cache_stats() -> dict[str, dict[str, int]]:
+    """Return how many calls to split_equation and calculate_eqn_length
+    were answered from their caches, and how many were not.
+    """
+    return {name: {'hits': info.hits, 'misses': info.misses}
+            for name, info in (('split_equation', _split_equation_lines.cache_info()),
+                               ('calculate_eqn_length', _eqn_length.cache_info()))}
+
+
+@lru_cache(maxsize=_EQUATION_CACHE_SIZE)
+def _split_equation_lines(text: str, max_len: int) -> Optional[tuple[str, ...]]:
+    """Return the lines split_equation splits text into, or None if it
+    does not need to be split.
     """
     text = text.strip()
     eqn_len = calculate_eqn_length(text)  # split equal signs.
@@ -1982,30 +2328,25 @@ def split_equation(text: str, max_len: int, list_mode: bool = False) -> Union[No
         if cur_line:
             master.append(cur_line)
         # combine everything.
-        new_master = [''.join(cl) for cl in master]
-        final_str = ''
-        if not list_mode:
-            for line in new_master:
-                final_str = final_str + '{ ' + line + ' }'
-            return final_str
-        else:
-            return new_master
+        return tuple(''.join(cl) for cl in master)
     return None
 
 
 def calculate_eqn_length(text: str, disable: Optional[Iterable] = None) -> int:
     """Return the relative length of an equation line.
+
+    Lengths that were calculated recently are not calculated again.
     """
-    # list of defined functions:
-    if disable is None:
-        disable = []
+    return _eqn_length(text, tuple(disable) if disable is not None else ())
 
+
+@lru_cache(maxsize=_EQUATION_CACHE_SIZE)
+def _eqn_length(text: str, disable: tuple[str, ...]) -> int:
+    """Return calculate_eqn_length(text, disable)."""
     replacement_dict = {'+': 'plu', '-': 'miu', '\\times': 'tie'}
     text = replace_many(text, replacement_dict)
 
     text = text.lower()
-    predetermined_functions = {'sin', 'cos', 'tan', 'csc', 'sec', 'cot', 'arcsin', 'arccos', 'arctan',
-                               'log', 'ln', 'sqrt', 'sinh', 'cosh', 'tanh', 'coth'}
     # text = text.replace('\\left', '')
     # text = text.replace('\\right', '')
 
@@ -2026,16 +2367,11 @@ def calculate_eqn_length(text: str, disable: Optional[Iterable] = None) -> int:
         text = remove_matrices(text, 'bmatrix')
         text = remove_matrices(text, 'pmatrix')
 
-    for fun in predetermined_functions:
-        text = text.replace('\\' + fun, fun)
+    text = _EQN_FUNCTION.sub('', text)
 
     text = remove_envs(text)
-    text = text.replace(' ', '')
-    text = text.replace(',', ', ')
-    if disable is None:
-        pass
-    # logging.warning(text)
-    return len(text)
+    # spaces do not count, and commas count twice
+    return len(text) - text.count(' ') + text.count(',')
 
 
 def remove_envs(text: str) -> str:
@@ -2045,29 +2381,7 @@ def remove_envs(text: str) -> str:
     >>> remove_envs(temp_text)
     '(2+4)+(3+6)'
     """
-    backslash_location = -1
-    index_diff = 0
-    first_backslash = False
-    ending_location = -1
-    for i, char in enumerate(text):
-        if not first_backslash and char == '\\':
-            backslash_location = i
-            first_backslash = True
-            continue
-        if first_backslash:
-            if char in ALPHABET:
-                index_diff += 1
-            else:
-                if index_diff == 0:
-                    first_backslash = False
-                else:
-                    ending_location = i
-                    break
-    if backslash_location == -1 or ending_location == -1:
-        return text
-    else:
-        text = text[:backslash_location] + 'j' + text[ending_location:]
-        return remove_envs(text)
+    return _ENV_COMMAND.sub(lambda m: 'j' if m.group(1) else m.group(), text)
 
 
 def index_fourth_closing_bracket(text: str, index: int) -> int:
@@ -2075,24 +2389,21 @@ def index_fourth_closing_bracket(text: str, index: int) -> int:
     """
     bracket_positions = []
     bracket_layers_sep = 0
-    prev_char = None
-    for i, char in enumerate(text):
-        if i <= index:
-            prev_char = char
-            continue
-        else:
-            if prev_char != '\\':
-                if char == '{':
-                    if bracket_layers_sep == 0:
-                        bracket_positions.append(i)
-                    bracket_layers_sep += 1
-                if char == '}':
-                    if bracket_layers_sep == 1:
-                        bracket_positions.append(i)
-                        if len(bracket_positions) == 4:
-                            return i
-                    bracket_layers_sep -= 1
-            prev_char = char
+    prev_char = text[index] if 0 <= index < len(text) else None
+    for i in range(max(index + 1, 0), len(text)):
+        char = text[i]
+        if prev_char != '\\':
+            if char == '{':
+                if bracket_layers_sep == 0:
+                    bracket_positions.append(i)
+                bracket_layers_sep += 1
+            if char == '}':
+                if bracket_layers_sep == 1:
+                    bracket_positions.append(i)
+                    if len(bracket_positions) == 4:
+                        return i
+                bracket_layers_sep -= 1
+        prev_char = char
     return -1
 
 
@@ -2340,29 +2651,17 @@ TEST_BIB = r"""
 def extract_authors_from_bib(bib_text: str) -> list[str]:
     """Return a list of author tags from a .bib file.
 
+    An @ inside braces does not start an entry.
+
     Preconditions:
         - bib_text is the text contents of the .bib file and must be formatted as such.
         - author tags don't have commas
         - none of the file types referenced are in a format that requires an opening brace
+
+    >>> extract_authors_from_bib('@book{Smith2020,\\n note = {me@home}}\\n@misc{Doe2019, year = 2019}')
+    ['Smith2020', 'Doe2019']
     """
-    skip = 1
-    authors = []
-    while True:
-        at_ind = find_nth(bib_text, '@', skip)
-        if at_ind == -1:
-            break
-        # who would ever put an @ symbol inside any field that isn't an author declaration
-        bracket_layer = bracket_layers(bib_text, at_ind)
-        if bracket_layer > 0:
-            logging.info('someone put an @ symbol inside the citation thing')
-            skip += 1
-            continue
-        bracket_afterwards = find_nth(bib_text, '{', 1, at_ind)
-        comma_afterwards = find_nth(bib_text, ',', 1, bracket_afterwards)
-        author_name = bib_text[bracket_afterwards + 1:comma_afterwards]
-        authors.append(author_name)
-        skip += 1
-    return authors
+    return list(bibtex.iter_keys(bib_text))
 
 
 EX_AT = r"""
@@ -2527,41 +2826,33 @@ def any_layer(text: str, index: int, start: str, end: str) -> int:
     >>> any_layer(text_t, 19, start_t, end_t)
     1
     """
-    bsq = start.startswith('\\') or end.startswith('\\')
-    n1 = 1
-    starting_ind = []
-    while True:
-        temp_ind = find_nth(text, start, n1)
-        if temp_ind == -1:
-            break
-        else:
-            if bsq:
-                if not text[temp_ind + len(start)].isalpha():
-                    # prevents mistaking \rightarrow
-                    starting_ind.append(temp_ind)
-            else:
-                starting_ind.append(temp_ind)
-
-            n1 += 1
-    n2 = 1
-    ending_ind = []
-    while True:
-        temp_ind2 = find_nth(text, end, n2)
-        if temp_ind2 == -1:
-            break
-        else:
-            if bsq:
-                if not text[temp_ind2 + len(end)].isalpha():
-                    ending_ind.append(temp_ind2)
-            else:
-                ending_ind.append(temp_ind2)
-            n2 += 1
+    starting_ind, ending_ind = layer_markers(text, start, end)
     start_depth = lst_smaller_index(index, starting_ind)
     ending_depth = lst_smaller_index(index, ending_ind)
     final_depth = start_depth - ending_depth
     return final_depth
 
 
+def layer_markers(text: str, start: str, end: str) -> tuple[list[int], list[int]]:
+    """Return where start occurs in text and where end occurs in text,
+    the way any_layer counts them. If start or end begins with a backslash,
+    occurrences followed by a letter are left out, so \\right is not
+    mistaken for \\r.
+
+    >>> layer_markers('start01end234start0123end789end', 'start', 'end')
+    ([0, 13], [7, 22, 28])
+    """
+    bsq = start.startswith('\\') or end.startswith('\\')
+    markers = ([], [])
+    for marker, found in zip((start, end), markers):
+        temp_ind = text.find(marker)
+        while temp_ind != -1:
+            if not bsq or not text[temp_ind + len(marker)].isalpha():
+                found.append(temp_ind)
+            temp_ind = text.find(marker, temp_ind + len(marker))
+    return markers
+
+
 def lst_smaller_index(item: int, lst: list[int]) -> int:
     """Return the index AFTER where item occurs in list.
     Otherwise, return the index where item is greater than
@@ -2610,22 +2901,12 @@ def local_env_layer(text: str, index: int, local_env: str) -> bool:
     >>> local_env_layer(te, 10, 'wh')
     True
     """
+    ind = latex_index.get_index(text)
     env_kw = '\\' + local_env + '{'
-    closest_starter = text.rfind(env_kw, 0, index)  # type: int
+    closest_starter = ind.rfind(env_kw, index)  # type: int
     if closest_starter == -1:
         return False
-    n = 1
-    # cur_ind = None
-    while True:
-        closest_bracket = find_nth(text, '}', n, closest_starter)
-        if closest_bracket == -1:
-            raise ValueError
-        b_layer = bracket_layers(text, closest_bracket, starting_index=closest_starter)
-        if b_layer == 0:
-            # cur_ind = closest_bracket
-            break
-        else:
-            n += 1
+    closest_bracket = ind.local_env_end(closest_starter)  # raises ValueError if unclosed
     return closest_starter < index < closest_bracket
 
 
@@ -2642,18 +2923,7 @@ def local_env_end(text: str, index: int) -> int:
     >>> local_env_end(te, 6)
     13
     """
-    n = 1
-    while True:
-        closest_bracket = find_nth(text, '}', n, index)
-        if closest_bracket == -1:
-            raise ValueError("Opening bracket without a closing bracket detected")
-        b_layer = bracket_layers(text, closest_bracket, starting_index=index)
-        if b_layer == 0:
-            # cur_ind = closest_bracket
-            break
-        else:
-            n += 1
-    return closest_bracket
+    return latex_index.get_index(text).local_env_end(index)
 
 
 TEST_STR_AGAIN = r"""
@@ -2671,23 +2941,15 @@ def find_not_in_environment(text: str, sub: str, env: Union[str, list[str]],
 
     Return -1 on failure.
     """
-    # skip = 1
     if isinstance(env, str):
         env = [env]
-    while True:
-        ind = find_nth(text, sub, skip, start)
-        if ind == -1:  # always return -1 on failure.
-            return -1
-        failed = False
-        for env_instance in env:
-            if check_in_environment(text, env_instance, ind):
-                failed = True
-                break
-        if failed:
-            skip += 1
-            continue
-        else:
+    text_index = latex_index.get_index(text)
+    ind = text_index.find_nth(sub, skip, start)
+    while ind != -1:
+        if not any(text_index.check_in_environment(env_instance, ind) for env_instance in env):
             return ind
+        ind = text_index.find(sub, ind + len(sub))  # the next occurrence find_nth would reach
+    return -1  # always return -1 on failure.
 
 
 def find_not_in_environment_tolerance(text: str, sub: str, env: dict[str, int],
@@ -2705,20 +2967,14 @@ def find_not_in_environment_tolerance(text: str, sub: str, env: dict[str, int],
     # skip = 1
     if isinstance(env, str):
         env = [env]
-    while True:
-        ind = find_nth(text, sub, skip, start)
-        if ind == -1:  # always return -1 on failure.
-            return -1
-        failed = False
-        for env_instance, depth_overlimit in env.items():
-            if environment_depth(text, ind, env_instance) >= depth_overlimit:
-                failed = True
-                break
-        if failed:
-            skip += 1
-            continue
-        else:
+    text_index = latex_index.get_index(text)
+    ind = text_index.find_nth(sub, skip, start)
+    while ind != -1:
+        if all(text_index.environment_depth(ind, env_instance) < depth_overlimit
+               for env_instance, depth_overlimit in env.items()):
             return ind
+        ind = text_index.find(sub, ind + len(sub))  # the next occurrence find_nth would reach
+    return -1  # always return -1 on failure.
 
 
 def find_not_in_any_env_tolerance(text: str, sub: str,
@@ -2735,18 +2991,13 @@ def find_not_in_any_env_tolerance(text: str, sub: str,
     Return -1 on failure.
     """
     # skip = 1
-    while True:
-        ind = find_nth(text, sub, skip, start)
-        if ind == -1:  # always return -1 on failure.
-            return -1
-        failed = False
-        if environment_depth(text, ind) >= depth_overlimit:
-            failed = True
-        if failed:
-            skip += 1
-            continue
-        else:
+    text_index = latex_index.get_index(text)
+    ind = text_index.find_nth(sub, skip, start)
+    while ind != -1:
+        if text_index.environment_depth(ind) < depth_overlimit:
             return ind
+        ind = text_index.find(sub, ind + len(sub))  # the next occurrence find_nth would reach
+    return -1  # always return -1 on failure.
 
 
 def check_in_environment(text: str, env: str, index: int) -> bool:
@@ -2758,21 +3009,7 @@ def check_in_environment(text: str, env: str, index: int) -> bool:
     >>> check_in_environment(TEST_STR_AGAIN, 'verbatim', 29)
     True
     """
-    if index < 0:
-        index = len(text) - index
-    env_str = '\\begin{' + env + '}'
-    env_end = '\\end{' + env + '}'
-    v1_cie = text.find(env_str, index)  # this is allowed to be -1. Fallback to len(text)
-    if v1_cie == -1:
-        v1_cie = len(text)
-    v2_cie = text.find(env_end, index)
-    if v2_cie == -1:
-        return False
-    v3_cie = text.rfind(env_str, 0, index)
-    if v3_cie == -1:
-        return False
-    v4_cie = text.rfind(env_end, 0, index)  # this is allowed to be -1.
-    return not (v1_cie < v2_cie or v4_cie > v3_cie)
+    return latex_index.get_index(text).check_in_environment(env, index)
 
 
 def do_something_to_local_env(text: str, env: str, func: Callable[[str], str]) -> str:
@@ -3188,6 +3425,10 @@ def detect_if_bib_exists(text: str, bib_keyword: str) -> tuple[bool, str, int]:
     return True, text, r_location + 1
 
 
+# anything verb_encryptor returns
+_VERB_KEY = re.compile('(?:ｗBTｗ|ｗｗBLｗ)[0-9]+⚋⚌⚍⚎⚏ｗ(?:ｗｗ|[^ｗ]+ｗ)')
+
+
 def verb_encryptor(count: int, lang: str = '') -> str:
     """This was a list of verb encryptors, but
     we wouldn't list everything
@@ -3227,21 +3468,66 @@ def what_section_is_this(text: str, index: int) -> Optional[str]:
     Preconditions:
         - index is not inside a section declaration
     """
-    prev_section_location = text.rfind('\\section{', 0, index)
+    ind = latex_index.get_index(text)
+    prev_section_location = ind.rfind('\\section{', index)
     if prev_section_location == -1:
         return None
     else:
-        ps_end = local_env_end(text, prev_section_location)
+        ps_end = ind.local_env_end(prev_section_location)
         section_name = text[prev_section_location + len('\\section{'):ps_end]
         return section_name
 
 
+# a section or chapter heading at the start of a line, possibly inside the hypertarget pandoc wraps it in
+_SECTION_HEADING = re.compile(r'^(?:\\hypertarget\{[^{}\n]*\}\{%\n)?\\(?:section|chapter)\*?\{', re.M)
+
+
+def split_at_sections(text: str, pieces: int) -> list[str]:
+    """Return text split into roughly pieces consecutive parts of similar length.
+    Every part but the first starts at a section or chapter heading that is
+    as deep in braces and environments as the first heading of text, so each
+    part after the first is a run of whole sections.
+
+    >>> split_at_sections('Intro\\n\\\\section{A}\\na\\n\\\\section{B}\\nb', 2)
+    ['Intro\\n\\\\section{A}\\na\\n', '\\\\section{B}\\nb']
+    """
+    bounds = [0] + section_cuts(text, pieces) + [len(text)]
+    return [text[i:j] for i, j in zip(bounds, bounds[1:])]
+
+
+def section_cuts(text: str, pieces: int) -> list[int]:
+    """Return where split_at_sections(text, pieces) would start every part
+    but the first, in order.
+
+    >>> section_cuts('Intro\\n\\\\section{A}\\na\\n\\\\section{B}\\nb', 2)
+    [20]
+    """
+    ind = latex_index.get_index(text)
+    target = len(text) / max(pieces, 1)
+    cuts = []
+    last = 0
+    top_level = None
+    for heading in _SECTION_HEADING.finditer(text):
+        cut = heading.start()
+        depths = (ind.brace_depth(cut - 1), ind.count('\\begin{', cut) - ind.count('\\end{', cut))
+        if top_level is None:
+            top_level = depths  # text before the first heading may not be balanced
+        if cut - last >= target and cut > 0 and depths == top_level:
+            cuts.append(cut)
+            last = cut
+    return cuts
+
+
 def hide_verbatims(text: str, track: str = 'Bibliography', verb_plugin: str = '') -> tuple[str, dict[str, str]]:
     """Hide all verbatim stuff.
     Put them in a dictionary.
 
     Note: the begin and end verbatim calls will still be present in the document. It is merely
     the text contents that are being concealed.
+
+    The environments and the sections they are in are found in one scan of
+    text. If the environments are not one after another, or the title of the
+    section one is in runs into another, the rest are hidden one at a time.
     """
     # if bibliography_keyword != '':
     #     bib_section = '\\section{' + bibliography_keyword + '}'
@@ -3252,12 +3538,70 @@ def hide_verbatims(text: str, track: str = 'Bibliography', verb_plugin: str = ''
 
     # else:
     #     bib_section = 'INVALID'
+    begin = R'\begin{verbatim}'
+    end = R'\end{verbatim}'
+    section = '\\section{'
+    ind = latex_index.get_index(text)
+    begins = ind.positions(begin)
+    ends = ind.positions(end)
+    headings = ind.positions(section)
+    dict_so_far = {}
+    pieces = []
+    pos = 0
+    h = 0  # the next heading to look at
+    last_heading = -1  # the last heading before the environment that is not hidden by then
+    stopped_at = None
+    for i in range(min(len(begins), len(ends))):
+        start_pos_1 = begins[i]  # the index at the backslash of begin
+        start_pos_2 = start_pos_1 + len(begin)  # the index on the char after begin env
+        end_pos_1 = ends[i]
+        if end_pos_1 < start_pos_2 or i > 0 and start_pos_1 < ends[i - 1]:
+            stopped_at = i
+            break
+        while h < len(headings) and headings[h] + len(section) <= start_pos_1:
+            if i == 0 or not begins[i - 1] + len(begin) <= headings[h] < ends[i - 1]:
+                last_heading = headings[h]
+            h += 1
+        curr_section = None
+        if last_heading != -1:
+            try:
+                ps_end = ind.local_env_end(last_heading)
+            except ValueError:
+                stopped_at = i
+                break
+            next_hidden = begins[bisect_right(begins, last_heading)] + len(begin)
+            if ps_end >= next_hidden:  # the title is not the same once that environment is hidden
+                stopped_at = i
+                break
+            curr_section = text[last_heading + len(section):ps_end]
+        during = text[start_pos_2:end_pos_1].replace('“', '"').replace('”', '"').replace("’", "'").replace("‘", "'")
+        code_lang, during = identify_language(during, verb_plugin)
+        if curr_section is None:
+            curr_section = 'NO<T A<P<<<<P>>>LICAB<LE AT THIS T<<IME'
+
+        ve_value = verb_encryptor(i, code_lang)
+        dict_so_far[ve_value] = during
+        if curr_section.strip() == track:
+            dict_so_far['BIBLO'] = dict_so_far[ve_value]
+
+        pieces.extend((text[pos:start_pos_2], '\n', ve_value, '\n'))
+        pos = end_pos_1
+    pieces.append(text[pos:])
+    text = ''.join(pieces)
+    if stopped_at is not None:
+        return _hide_verbatims_one_by_one(text, stopped_at + 1, dict_so_far, track, verb_plugin)
+    return text, dict_so_far
+
+
+def _hide_verbatims_one_by_one(text: str, envs_traversed: int, dict_so_far: dict[str, str],
+                               track: str, verb_plugin: str) -> tuple[str, dict[str, str]]:
+    """Hide the verbatim environments from the envs_traversedth one onwards,
+    looking for the next one again after each, and add them to dict_so_far.
+    """
     env = 'verbatim'
-    envs_traversed = 1
     begin = R'\begin{' + env + '}'
     end = R'\end{' + env + '}'
-    dict_so_far = {}
-    i = 0
+    i = envs_traversed - 1
     while True:
         # print(envs_traversed)
         start_pos_1 = find_nth(text, begin, envs_traversed)  # the index at the backslash of begin
@@ -3294,7 +3638,15 @@ def hide_verbatims(text: str, track: str = 'Bibliography', verb_plugin: str = ''
 
 def show_verbatims(text: str, verb_info: dict[str, str]) -> str:
     """Unhide all verbatim environments.
+
+    Every environment is put back in one pass, unless putting one back
+    could make a key that would then be replaced too.
     """
+    if 'BIBLO' not in verb_info and not any('⚋' in value for value in verb_info.values()):
+        keys = [key for key in _VERB_KEY.findall(text) if key in verb_info]
+        # every key has one ⚋, so if every ⚋ is in a key, no new key can appear
+        if len(keys) == text.count('⚋'):
+            return _VERB_KEY.sub(lambda m: verb_info.get(m.group(), m.group()), text)
     for key, value in verb_info.items():
         text = text.replace(key, value)
     return text
@@ -3556,16 +3908,7 @@ def environment_depth(text: str, index: int, env: Optional[str] = None) -> int:
     If env is not stated, then this applies for all environments.
     """
 
-    if env is not None:
-        be = R'\begin{' + env + '}'
-        en = R'\end{' + env + '}'
-    else:
-        be = R'\begin{'
-        en = R'\end{'
-    ti = text[:index]
-    begins = ti.count(be)
-    ends = ti.count(en)
-    return begins - ends
+    return latex_index.get_index(text).environment_depth(index, env)
 
 
 def find_env_name_begin(text: str, index: int) -> str:
@@ -3613,7 +3956,7 @@ def framed(text: str) -> str:
     """
     skip = 1
     while True:
-        lt_index = find_nth(text, R'\begin{longtable}', skip)
+        lt_index = latex_index.get_index(text).find_nth(R'\begin{longtable}', skip)
         env_d = environment_depth(text, lt_index, 'longtable')
         # forbid_env_tolerance = {'longtable': 2 + env_d}
         if lt_index == -1:
@@ -3641,15 +3984,15 @@ def framed(text: str) -> str:
         #     skip += 1  # skip if the header isn't the environment we look for
         #     continue
         # check if this table is only one wide:
-        if not text[right_index_border:].startswith('\\end{minipage} \\\\\n\\midrule()\n\\endhead\n\\bottomrule()'
-                                                    '\n\\end{longtable}'):
+        if not text.startswith('\\end{minipage} \\\\\n\\midrule()\n\\endhead\n\\bottomrule()'
+                               '\n\\end{longtable}', right_index_border):
             skip += 1
             continue  # if it is not one wide, then this is the wrong table
         # from this point, assume our table is one wide and only has 3 rows
         # table_content_start = text.find(R'\endhead', right_index_border) + len(R'\endhead')
         else:
-            text = text[:lt_index] + '\\begin{framed}\n\n' + cur_header + '\n\n\\end{framed}\n\n' + \
-                   text[lt_end_index + len('\\end{longtable}'):]
+            text = latex_index.get_index(text).splice(lt_index, lt_end_index + len('\\end{longtable}'),
+                                                      '\\begin{framed}\n\n' + cur_header + '\n\n\\end{framed}\n\n').text
     return text
 
 
@@ -3660,16 +4003,18 @@ def longtable_environment(text: str, env: str, env_info: LatexEnvironment) -> st
     The second row is the name of the term, which is case-sensitive.
     The third row is the contents of the environment, which
     one may do anything they want. Even lists are allowed there.
+
+    Tables with no other longtable inside them are converted together at the
+    end, so converting many tables does not copy the whole document once per table.
     """
     # assert env == env_info.env_name
     env_alias = env_info.start_alt
     forbid_envs = ['matrix', 'bmatrix', 'pmatrix', 'minipage', 'align*', 'longtable']
     # forbid_env_tolerance = {'longtable': 2}
     skip = 1
+    edits = []  # (start, end, environment) for the tables converted so far, which are not in text yet
     while True:
-        lt_index = find_nth(text, R'\begin{longtable}', skip)
-        env_d = environment_depth(text, lt_index, 'longtable')
-        forbid_env_tolerance = {'longtable': 2 + env_d}
+        lt_index = latex_index.get_index(text).find_nth(R'\begin{longtable}', skip)
         if lt_index == -1:
             break  # break if we can't find a starting longtable
         # lt_end_index = find_nth(text, R'\end{longtable}', 1, lt_index)
@@ -3681,7 +4026,12 @@ def longtable_environment(text: str, env: str, env_info: LatexEnvironment) -> st
 
         left_border = '\\begin{minipage}[b]{\\linewidth}\\raggedright\n'
         # right_border = '\\end{minipage}'
-        left_index_border = find_nth(text, left_border, 1, lt_index) + len(left_border)
+        left_index_border = find_nth(text, left_border, 1, lt_index)
+        if left_index_border == -1 and edits:
+            # what follows then looks at the start of text, which must have the converted tables
+            text, skip, edits = _apply_edits(text, edits), skip - len(edits), []
+            continue
+        left_index_border += len(left_border)
         # right_index_border = find_nth(text, right_border, 1, lt_index)
         right_index_border = find_env_end(text, left_index_border, 'minipage')
         if right_index_border == -1:
@@ -3696,14 +4046,20 @@ def longtable_environment(text: str, env: str, env_info: LatexEnvironment) -> st
             skip += 1  # skip if the header isn't the environment we look for
             continue
         # check if this table is only one wide:
-        if not text[right_index_border:].startswith(R'\end{minipage} \\'):
+        if not text.startswith(R'\end{minipage} \\', right_index_border):
             skip += 1
             continue  # if it is not one wide, then this is the wrong table
         # from this point, assume our table is one wide and only has 3 rows
         # table_content_start = text.find(R'\endhead', right_index_border) + len(R'\endhead')
+        # only the tables of this environment need their depth
+        forbid_env_tolerance = {'longtable': 2 + environment_depth(text, lt_index, 'longtable')}
 
         table_content_start = find_not_in_environment_tolerance(text, R'\endhead', forbid_env_tolerance,
-                                                                right_index_border) + len(R'\endhead')
+                                                                right_index_border)
+        if table_content_start == -1 and edits:
+            text, skip, edits = _apply_edits(text, edits), skip - len(edits), []
+            continue
+        table_content_start += len(R'\endhead')
         table_content_end = find_not_in_environment_tolerance(text, R'\bottomrule()', forbid_env_tolerance,
                                                               right_index_border)
         # table_content_end = text.find(R'\bottomrule', right_index_border)
@@ -3721,18 +4077,29 @@ def longtable_environment(text: str, env: str, env_info: LatexEnvironment) -> st
             middle_fix = env_info.env_middlefix if env_info.env_middlefix != '[EMPTY]' else ''
             env_starter = R'\begin{' + env.lower() + '}' + middle_fix + extra_args + env_info.env_suffix + '\n\n'
             total_env_contents = env_starter + force_not_inline(table_rows[1]) + '\n' + R'\end{' + env.lower() + '}'
-            text = text[:lt_index] + total_env_contents + text[lt_end_index + len(R'\end{longtable}'):]
         # if len(table_rows) == 2
         elif len(table_rows) == 1:
             forced_brace = '{}' if env_info.extra_args_type == 'brace' else ''
             middle_fix = env_info.env_middlefix if env_info.env_middlefix != '[EMPTY]' else ''
             env_starter = R'\begin{' + env.lower() + '}' + middle_fix + forced_brace + '\n\n'
             total_env_contents = env_starter + force_not_inline(table_rows[0]) + '\n' + R'\end{' + env.lower() + '}'
-            text = text[:lt_index] + total_env_contents + text[lt_end_index + len(R'\end{longtable}'):]
         else:
             skip += 1
             continue
-    return text
+        lt_stop = lt_end_index + len(R'\end{longtable}')
+        if text.find(R'\begin{longtable}', lt_index + 1, lt_stop) == -1 and \
+                R'\begin{longtable}' not in total_env_contents and R'\end{longtable}' not in total_env_contents:
+            # no longtable is inside this one, so converting it does not change the longtable depth
+            # anywhere after it, and it can be converted together with the others at the end
+            edits.append((lt_index, lt_stop, total_env_contents))
+            skip += 1
+            continue
+        if edits:
+            # convert this table the slow way, but only once text has the tables converted so far
+            text, skip, edits = _apply_edits(text, edits), skip - len(edits), []
+            continue
+        text = latex_index.get_index(text).splice(lt_index, lt_stop, total_env_contents).text
+    return _apply_edits(text, edits)
 
 
 TEST_ENV_STR = r"""
@@ -3853,30 +4220,7 @@ def find_env_start(text: str, index: int, env: Optional[str] = None) -> int:
 
     Return -1 on failure, that is, if index happens to not be in an environment.
     """
-    # skip = 1
-    skip_st = 1
-    skip_en = 1
-    if env is not None:
-        env_st = R'\begin{' + env + '}'
-        env_en = R'\end{' + env + '}'
-    else:
-        env_st = R'\begin{'
-        env_en = R'\end{'
-    while True:
-        t_st = rfind_nth(text, env_st, skip_st, 0, index)  # -1 if -1
-        t_en = rfind_nth(text, env_en, skip_en, 0, index)  # big if -1
-        if t_en == -1 and t_st == -1:
-            # could not find any environment beforehand
-            return -1
-        elif t_en == -1:
-            t_en = len(text)
-        if t_st < t_en <= index:
-            skip_st += 1
-            skip_en += 1
-            continue
-        else:
-            # if t_en < t_st, or t_st is later
-            return t_st
+    return latex_index.get_index(text).find_env_start(index, env)
 
 
 def find_env_end(text: str, index: int, env: Optional[str] = None) -> int:
@@ -3889,35 +4233,7 @@ def find_env_end(text: str, index: int, env: Optional[str] = None) -> int:
     Return where the backslash occurs on the environment end.
     Return -1 on failure.
     """
-    skip = 1
-    index += 1
-    skip_st = 1
-    skip_en = 1
-    if env is not None:
-        env_st = R'\begin{' + env + '}'
-        env_en = R'\end{' + env + '}'
-    else:
-        env_st = R'\begin{'
-        env_en = R'\end{'
-    while True:
-        t_st = find_nth(text, env_st, skip_st, index)  # big if -1
-        t_en = find_nth(text, env_en, skip_en, index)  # -1 if -1
-        if t_st == -1:
-            t_st = len(text) + 100
-        if t_en == -1:
-            return -1
-        if t_st < t_en:
-            skip_st += 1
-            skip_en += 1
-            continue
-        else:
-            if skip > 1:
-                skip_st += 1
-                skip_en += 1
-                skip -= 1
-                continue
-            else:
-                return t_en
+    return latex_index.get_index(text).find_env_end(index, env)
 
 
 def modify_equations(text: str, func: Callable[[str], str], inline: bool = False) -> str:
@@ -3933,17 +4249,23 @@ def modify_equations(text: str, func: Callable[[str], str], inline: bool = False
     eqs = '\\[' if not inline else '\\('
     eqen = '\\]' if not inline else '\\)'
     skip = 1
-    while True:
-        st = find_nth(text, eqs, skip)  # the backslash of equation start
+    buffer = TextBuffer(text)
+    st = buffer.find(eqs)  # the backslash of equation start
+    en = buffer.find(eqen)  # the backslash of equation end
+    while st != -1 and en != -1:
         stt = st + len(eqs)  # the character after \[_ (the underscore)
-        en = find_nth(text, eqen, skip)  # the backslash of equation end
-        if st == -1 or en == -1:
-            break
-        eq_contents = text[stt:en]
+        eq_contents = buffer[stt:en]
         new_eq_contents = func(eq_contents)
-        text = text[:stt] + new_eq_contents + text[en:]
         skip += 1
-    return text
+        if en >= stt:
+            buffer.splice(stt, en, new_eq_contents)
+            # the skip-th equation end is the first one after the ends that were in eq_contents
+            en = buffer.find_nth(eqen, eq_contents.count(eqen) + 2, stt)
+        else:  # text[:stt] + new_eq_contents + text[en:]
+            buffer.splice(stt, stt, new_eq_contents + buffer[en:stt])
+            en = buffer.find_nth(eqen, skip)
+        st = buffer.find(eqs, stt)
+    return str(buffer)
 
 
 def blacksquare_detector(text: str) -> str:
@@ -4073,40 +4395,69 @@ def fix_accents(text: str) -> str:
     """Fix accents causing problems.
     """
     # Underbrace
-    skip = 1
-    while True:
-        # pattern:
-        # \overset{above}{︸}
-        overset_ind = find_nth(text, '\\overset', skip)
-        if overset_ind == -1:
-            break
-        overset_end = local_env_end(text, overset_ind)
-        contents = text[overset_ind + len('\\overset') + 1:overset_end]
-        if text[overset_end:overset_end + 5] == '}{︸}}':
-            text = text[:overset_ind] + '\\underbrace{' + contents + '}}' + text[overset_end + 5:]
-        else:
-            skip += 1
+    # pattern:
+    # \overset{above}{︸}
+    # Every fix keeps the braces balanced, so where an \overset ends is
+    # the same before and after the fixes before it, and all of them can
+    # be found in the original text.
+    ind = latex_index.get_index(text)
+    edits = []
+    replaced_until = 0
+    removed = set()  # where a {︸} was removed
+    for overset_ind in ind.positions('\\overset'):
+        if overset_ind < replaced_until:
+            continue  # an \overset not followed by { lost its next character
+        overset_end = ind.local_env_end(overset_ind)
+        # what follows overset_end once the {︸} found so far are removed
+        after, i = '', overset_end
+        while len(after) < 5 and i < len(text):
+            if i in removed:
+                i += 3
+            else:
+                after += text[i]
+                i += 1
+        if after == '}{︸}}':
+            replaced_until = overset_ind + len('\\overset{')
+            removed.add(overset_end + 1)
+            edits.append((overset_ind, replaced_until, '\\underbrace{'))
+            edits.append((overset_end + 1, overset_end + 4, ''))
+    text = _apply_edits(text, edits)
 
     # weird left arrow
     text = text.replace(R'\overset{⃐}', R'\mathbf')
     # print(x)
 
     # overleftrightarrow
-    skip = 1
-    while True:
-        over_lra = '\\overleftrightarrow{}}{'
-        os_ind = find_nth(text, '\\overset{', skip)
-        if os_ind == -1:
-            break
+    ind = latex_index.get_index(text)
+    over_lra = '\\overleftrightarrow{}}{'
+    edits = []
+    for os_ind in ind.positions('\\overset{'):
         os_ind_after = os_ind + len('\\overset{')
-        if text[os_ind_after:os_ind_after + len(over_lra)] == '\\overleftrightarrow{}}{':
-            ending = find_next_closing_bracket(text, os_ind_after + len(over_lra))
-            assert ending != -1
-            contents = text[os_ind_after + len(over_lra):ending]
-            text = text[:os_ind] + '\\overleftrightarrow{' + contents + text[ending:]
-        else:
-            skip += 1
-    return text
+        if text.startswith(over_lra, os_ind_after):
+            # the contents must be closed
+            assert ind.closing_brace(os_ind_after + len(over_lra) - 1) != -1
+            edits.append((os_ind, os_ind_after + len(over_lra), '\\overleftrightarrow{'))
+    return _apply_edits(text, edits)
+
+
+def _apply_edits(text: str, edits: list[tuple[int, int, str]]) -> str:
+    """Return text with text[start:end] replaced with new for every
+    (start, end, new) in edits.
+
+    Preconditions:
+        - the edits do not overlap
+
+    >>> _apply_edits('abcdef', [(4, 5, 'E'), (0, 2, '')])
+    'cdEf'
+    """
+    pieces = []
+    last = 0
+    for start, end, new in sorted(edits):
+        pieces.append(text[last:start])
+        pieces.append(new)
+        last = end
+    pieces.append(text[last:])
+    return ''.join(pieces)
 
 
 def find_next_closing_bracket(text: str, index: int) -> int:
@@ -4154,86 +4505,27 @@ def modify_text_not_in_environments(text: str, key: Callable[[str], str]) -> str
         - local environments
         - equations
 
+    The regions that are not affected are found once per version of text,
+    by LatexIndex.protected_regions().
+
     Preconditions:
         - verbatim is concealed
         - environments are set up in a way such that latex won't cry
+
+    >>> modify_text_not_in_environments('a \\\\(x\\\\) b \\\\emph{c} d', str.upper)
+    'A \\\\(x\\\\) B \\\\emph{c} D'
     """
-    forbidden_regions: list[tuple] = []
-    # layers = 0
-    cur_pos = 0
-    # mode = ''
-    # assert mode in {'', 'local', 'begin', 'inline', 'equation'}
-
-    # the pattern for local is:
-    # \___{
-    # patterns
-    begin_st, begin_en = '\\begin{', '\\end{'
-    inline_st, inline_en = '\\(', '\\)'
-    equation_st, equation_en = '\\[', '\\]'
-    while True:
-        begin_ind = find_fallback(text, begin_st, cur_pos)
-        inline_ind = find_fallback(text, inline_st, cur_pos)
-        equation_ind = find_fallback(text, equation_st, cur_pos)
-        local_ind = nearest_local_env(text, cur_pos)
-        if local_ind == -1:
-            local_ind = len(text)
-        elif local_ind == begin_ind:
-            local_ind = begin_ind + 1  # prevents conflicts, as \begin{} is caught
-        assert local_ind <= len(text)
-        # detect which one is the lowest
-        starters = [begin_ind, inline_ind, equation_ind, local_ind]
-        starter_index = min(starters)
-        # check if lowest is unique
-        num_starters = starters.count(starter_index)
-        if num_starters > 1:
-            break
-        # by this point, we know that the starter is unique
-        # and no error would occur here
-        starter_map = ['begin', 'inline', 'equation', 'local']
-        type_of_starter = starter_map[starters.index(starter_index)]
-        if type_of_starter == 'begin':
-            finish = text.find(begin_en, starter_index)
-            end_of_env = local_env_end(text, finish) + 1
-            # [starter_index:end_of_env] would capture the environment
-            # otherwise, it won't be captured
-        elif type_of_starter == 'inline':
-            end_of_env = text.find(inline_en, starter_index) + len(inline_en)
-        elif type_of_starter == 'equation':
-            end_of_env = text.find(equation_en, starter_index) + len(inline_en)
-        elif type_of_starter == 'local':
-            end_of_env = local_env_end(text, starter_index) + 1
-            if end_of_env == 0:
-                logging.warning('runaway argument on command')
-                assert False  # something wrong happened
-        else:
-            assert False  # impossible to reach this branch
-        # prior = text[:starter_index]
-        # within = text[starter_index:end_of_env]
-        # after = text[end_of_env:]
-        assert starter_index < end_of_env
-        forbidden_bounds = (starter_index, end_of_env)
-        forbidden_regions.append(forbidden_bounds)
-        cur_pos = end_of_env  # cur pos is updated to the end of the environment,
-        # the character after the end of the environment we checked
-
-    # checking forbidden_regions:
-    split_text: list[str] = []  # always alternating between change and stay, starting from change
-    prev_region_end = 0
+    forbidden_regions = latex_index.get_index(text).protected_regions()
     if len(forbidden_regions) == 0:
         return key(text)
-    else:
-        for region in forbidden_regions:
-            split_text.append(text[prev_region_end:region[0]])
-            split_text.append(text[region[0]:region[1]])
-            prev_region_end = region[1]
-        new_str_list = []
-        for i, txt in enumerate(split_text):
-            if i % 2 == 0:  # is even, meaning change
-                new_str_list.append(key(txt))
-            else:
-                new_str_list.append(txt)
-        new_str_list.append(key(text[prev_region_end:]))
-        return ''.join(new_str_list)
+    new_str_list = []  # always alternating between change and stay, starting from change
+    prev_region_end = 0
+    for region_start, region_end in forbidden_regions:
+        new_str_list.append(key(text[prev_region_end:region_start]))
+        new_str_list.append(text[region_start:region_end])
+        prev_region_end = region_end
+    new_str_list.append(key(text[prev_region_end:]))
+    return ''.join(new_str_list)
 
 
 def find_fallback(text: str, sub: str, start: Optional[int] = None, end: Optional[int] = None) -> int:
@@ -4302,93 +4594,31 @@ def modify_text_not_in_environments_encrypted(text: str, key: Callable[[str], st
         - local environments
         - equations
 
+    The regions that are not affected are the same ones
+    modify_text_not_in_environments uses.
+
     Preconditions:
         - verbatim is concealed
         - environments are set up in a way such that latex won't cry
     """
-    forbidden_regions: list[tuple] = []
-    # layers = 0
-    cur_pos = 0
-    # mode = ''
-    # assert mode in {'', 'local', 'begin', 'inline', 'equation'}
-
-    # the pattern for local is:
-    # \___{
-    # patterns
-    begin_st, begin_en = '\\begin{', '\\end{'
-    inline_st, inline_en = '\\(', '\\)'
-    equation_st, equation_en = '\\[', '\\]'
-    while True:
-        begin_ind = find_fallback(text, begin_st, cur_pos)
-        inline_ind = find_fallback(text, inline_st, cur_pos)
-        equation_ind = find_fallback(text, equation_st, cur_pos)
-        local_ind = nearest_local_env(text, cur_pos)
-        if local_ind == -1:
-            local_ind = len(text)
-        elif local_ind == begin_ind:
-            local_ind = begin_ind + 1  # prevents conflicts, as \begin{} is caught
-        assert local_ind <= len(text)
-        # detect which one is the lowest
-        starters = [begin_ind, inline_ind, equation_ind, local_ind]
-        starter_index = min(starters)
-        # check if lowest is unique
-        num_starters = starters.count(starter_index)
-        if num_starters > 1:
-            break
-        # by this point, we know that the starter is unique
-        # and no error would occur here
-        starter_map = ['begin', 'inline', 'equation', 'local']
-        type_of_starter = starter_map[starters.index(starter_index)]
-        if type_of_starter == 'begin':
-            finish = text.find(begin_en, starter_index)
-            end_of_env = local_env_end(text, finish) + 1
-            # [starter_index:end_of_env] would capture the environment
-            # otherwise, it won't be captured
-        elif type_of_starter == 'inline':
-            end_of_env = text.find(inline_en, starter_index) + len(inline_en)
-        elif type_of_starter == 'equation':
-            end_of_env = text.find(equation_en, starter_index) + len(inline_en)
-        elif type_of_starter == 'local':
-            end_of_env = local_env_end(text, starter_index) + 1
-            if end_of_env == 0:
-                logging.warning('runaway argument on command')
-                assert False  # something wrong happened
-        else:
-            assert False  # impossible to reach this branch
-        # prior = text[:starter_index]
-        # within = text[starter_index:end_of_env]
-        # after = text[end_of_env:]
-        assert starter_index < end_of_env
-        forbidden_bounds = (starter_index, end_of_env)
-        forbidden_regions.append(forbidden_bounds)
-        cur_pos = end_of_env  # cur pos is updated to the end of the environment,
-        # the character after the end of the environment we checked
-
-    # checking forbidden_regions:
-    split_text: list[str] = []  # always alternating between change and stay, starting from change
-    prev_region_end = 0
+    forbidden_regions = latex_index.get_index(text).protected_regions()
     if len(forbidden_regions) == 0:
         return key(text)
-    else:
-        encrypted = {}
-        for region in forbidden_regions:
-            split_text.append(text[prev_region_end:region[0]])
-            split_text.append(text[region[0]:region[1]])
-            prev_region_end = region[1]
-        new_str_list = []
-        for i, txt in enumerate(split_text):
-            if i % 2 == 0:  # is even, meaning change
-                new_str_list.append(txt)
-            else:
-                encrypt_key = text_environment_encryptor(i)
-                encrypted[encrypt_key] = txt
-                new_str_list.append(encrypt_key)
-        nst = ''.join(new_str_list)
-        nst = key(nst)
-        for k, v in encrypted.items():
-            nst = nst.replace(k, v)
-        # new_str_list.append(key(text[prev_region_end:]))
-        return nst
+    encrypted = {}
+    new_str_list = []
+    prev_region_end = 0
+    for i, (region_start, region_end) in enumerate(forbidden_regions):
+        new_str_list.append(text[prev_region_end:region_start])
+        encrypt_key = text_environment_encryptor(2 * i + 1)
+        encrypted[encrypt_key] = text[region_start:region_end]
+        new_str_list.append(encrypt_key)
+        prev_region_end = region_end
+    nst = ''.join(new_str_list)
+    nst = key(nst)
+    for k, v in encrypted.items():
+        nst = nst.replace(k, v)
+    # new_str_list.append(key(text[prev_region_end:]))
+    return nst
 
 
 def text_environment_encryptor(count: int) -> str:
@@ -4403,18 +4633,32 @@ def text_environment_encryptor(count: int) -> str:
 
 def formatted_text_encryptor(text: str, envs_to_encrypt: list[str]) -> str:
     """Hide local environment declarations. There will be a decrypt function.
+
+    Every declaration is found in one pass over text. Hiding one never moves
+    where another one ends, since its opening and closing braces are hidden
+    together.
+
+    >>> formatted_text_encryptor('\\\\textbf{a \\\\emph{b}}', ['textbf', 'emph'])
+    '🮥sT1🮥textbf🮥sT2🮥a 🮥sT1🮥emph🮥sT2🮥b🮥eN1🮥🮥eN1🮥'
     """
-    env_st = ['🮥sT1🮥' + z + '🮥sT2🮥' for z in envs_to_encrypt]
+    if not envs_to_encrypt:
+        return text
     env_en = '🮥eN1🮥'
-    for env, env_st_kw in zip(envs_to_encrypt, env_st):
-        env_bg = '\\' + env + '{'
-        while True:
-            st_ind = text.find(env_bg)
-            if st_ind == -1:
-                break
-            en_ind = local_env_end(text, st_ind)
-            text = text[:st_ind] + env_st_kw + text[st_ind + len(env_bg):en_ind] + env_en + text[en_ind + 1:]
-    return text
+    ind = latex_index.get_index(text)
+    pattern = re.compile('\\\\(' + '|'.join(re.escape(env) for env in envs_to_encrypt) + ')\\{')
+    edits = []  # (start, end, replacement), in no particular order
+    for match in pattern.finditer(text):
+        en_ind = ind.local_env_end(match.start())  # raises ValueError if it is never closed
+        edits.append((match.start(), match.end(), '🮥sT1🮥' + match.group(1) + '🮥sT2🮥'))
+        edits.append((en_ind, en_ind + 1, env_en))
+    pieces = []
+    prev_end = 0
+    for start, end, replacement in sorted(edits):
+        pieces.append(text[prev_end:start])
+        pieces.append(replacement)
+        prev_end = end
+    pieces.append(text[prev_end:])
+    return ''.join(pieces)
 
 
 def formatted_text_decryptor(text: str, envs_to_decrypt: list[str]) -> str:
@@ -4661,21 +4905,35 @@ def latexing(text: str) -> str:
     """Latex all LaTeX.
 
     We need to update local env layer to allow the detection of params.
+
+    Replacing a LaTeX never moves a brace or an equation marker before it,
+    so every LaTeX is checked against text as it was given, and the equation
+    markers of text are only found once.
     """
     all_bad_envs = ['texttt', 'includegraphics', 'label', 'ref']
     ltx = '◚LT◞X◩◩'
-    location = len(text)
-    while True:
-        latex = 'LaTeX'
-
-        location = text.rfind(latex, 0, location)
-        if location == -1:
-            break
+    latex = 'LaTeX'
+    locations = latex_index.get_index(text).positions(latex)
+    if not locations:
+        return text.replace(ltx, '\\LaTeX')
+    display = inline = None  # the equation markers, found the first time they are needed
+    pieces = []
+    prev_start = len(text)
+    for location in reversed(locations):
         in_env = local_env_layer_bulk(text, location, all_bad_envs) > 0
-        in_eqn = check_in_equation(text, location)
+        if display is None:
+            display = layer_markers(text, '\\[', '\\]')
+        in_eqn = bisect_right(display[0], location) - bisect_right(display[1], location) == 1
+        if not in_eqn:
+            if inline is None:
+                inline = layer_markers(text, '\\(', '\\)')
+            in_eqn = bisect_right(inline[0], location) - bisect_right(inline[1], location) == 1
         if not (in_env or in_eqn):
-            text = text[:location] + ltx + text[location + len(latex):]
-    return text.replace(ltx, '\\LaTeX')
+            pieces.append(text[location + len(latex):prev_start])
+            pieces.append(ltx)
+            prev_start = location
+    pieces.append(text[:prev_start])
+    return ''.join(reversed(pieces)).replace(ltx, '\\LaTeX')
 
 
 def check_in_equation(text: str, index: int) -> bool:
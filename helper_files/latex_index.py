@@ -0,0 +1,523 @@
+"""An index of where things are in one version of a LaTeX document.
+
+Most helpers answer questions such as "how deep is this index inside a
+longtable?" or "where does this environment end?" by slicing the document
+and searching it again from the start, which makes long documents quadratic.
+A LatexIndex records where each marker it is asked about occurs, once, and
+answers the same questions with binary searches instead.
+
+An index belongs to exactly one string. Use get_index(text) to obtain the
+index of a document; a new one is built whenever the document changes, so an
+index can never be used against text it was not built from. Helpers that know
+the exact edit they made can use LatexIndex.splice() to move an index forward
+to the new text without searching the whole document again.
+
+I/O functions are NOT allowed.
+"""
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Optional
+
+# how many document versions get_index remembers, least recently used first out.
+_CACHE_SIZE = 4
+# how many brace queries an index answers by scanning before building its brace table.
+_SCANS_BEFORE_TABLE = 32
+_BRACE_PATTERN = re.compile('[{}]')
+# a backslash that is not escaped by the character before it
+_COMMAND_PATTERN = re.compile(r'(?<!\\)\\')
+_INDEX_CACHE = []
+
+
+def get_index(text: str) -> 'LatexIndex':
+    """Return the LatexIndex of text, building it if it was not
+    built recently.
+
+    Indices are remembered by identity, not by equality, so looking one up
+    never compares two long documents. The most recently used indices are
+    kept, so a helper that indexes a few short strings for every table does
+    not push out the index of the document it is walking.
+    """
+    for k, ind in enumerate(_INDEX_CACHE):
+        if ind.text is text:
+            if k:
+                _INDEX_CACHE.insert(0, _INDEX_CACHE.pop(k))
+            return ind
+    ind = LatexIndex(text)
+    _remember(ind)
+    return ind
+
+
+def _remember(ind: 'LatexIndex') -> None:
+    """Put ind at the front of the index cache."""
+    _INDEX_CACHE.insert(0, ind)
+    del _INDEX_CACHE[_CACHE_SIZE:]
+
+
+@lru_cache(maxsize=256)
+def has_border(sub: str) -> bool:
+    """Return whether a proper prefix of sub is also a suffix of sub,
+    meaning two occurrences of sub may overlap.
+
+    >>> has_border('\\\\begin{')
+    False
+    >>> has_border('\\n\\n')
+    True
+    """
+    return any(sub.startswith(sub[i:]) for i in range(1, len(sub)))
+
+
+def _slice_start(i: int, n: int) -> int:
+    """Normalize i the way str.find normalizes its start argument."""
+    if i < 0:
+        i = max(0, i + n)
+    return i
+
+
+def _slice_end(i: Optional[int], n: int) -> int:
+    """Normalize i the way slicing normalizes its end argument."""
+    if i is None:
+        return n
+    if i < 0:
+        i = max(0, i + n)
+    return min(i, n)
+
+
+class LatexIndex:
+    """The positions of markers in one version of a LaTeX document.
+    Everything is computed the first time it is asked for.
+
+    Instance Attributes:
+        - text: the document this index was built from.
+
+    Braces follow the same rules as bracket_layers() in helpers: a brace
+    directly after a backslash is escaped, and every other brace counts.
+    The first few brace queries scan the text; after that, a prefix-depth
+    array and a table of matching braces are built once and used instead.
+    """
+    text: str
+    _positions: dict[str, list[int]]
+    _brace_positions: Optional[list[int]]
+    _brace_depths: Optional[list[int]]
+    _matches: Optional[dict[int, int]]
+    _closers_by_depth: Optional[dict[int, list[int]]]
+    _brace_queries: int
+    _depth_events: dict[Optional[str], tuple[array, array]]
+    _command_starts: Optional[list[int]]
+    _regions: Optional[list[tuple[int, int]]]
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._positions = {}
+        self._brace_positions = None
+        self._brace_depths = None
+        self._matches = None
+        self._closers_by_depth = None
+        self._brace_queries = 0
+        self._depth_events = {}
+        self._command_starts = None
+        self._regions = None
+
+    # -------------------------------------------------------------
+    # Substring queries
+    # -------------------------------------------------------------
+    def positions(self, sub: str) -> list[int]:
+        """Return the sorted start of every occurrence of sub, including
+        occurrences that overlap each other. The list is built once per
+        index; do not mutate it.
+        """
+        pos = self._positions.get(sub)
+        if pos is None:
+            pos = []
+            text = self.text
+            i = text.find(sub)
+            while i != -1:
+                pos.append(i)
+                i = text.find(sub, i + 1)
+            self._positions[sub] = pos
+        return pos
+
+    def find(self, sub: str, start: int = 0) -> int:
+        """Same as self.text.find(sub, start)."""
+        n = len(self.text)
+        start = _slice_start(start, n)
+        if start > n:
+            return -1
+        pos = self.positions(sub)
+        k = bisect_left(pos, start)
+        return pos[k] if k < len(pos) else -1
+
+    def rfind(self, sub: str, end: Optional[int] = None) -> int:
+        """Same as self.text.rfind(sub, 0, end)."""
+        end = _slice_end(end, len(self.text))
+        pos = self.positions(sub)
+        k = bisect_right(pos, end - len(sub)) - 1
+        return pos[k] if k >= 0 else -1
+
+    def find_nth(self, sub: str, n: int, start: int = 0) -> int:
+        """Same as find_nth(self.text, sub, n, start) in helpers."""
+        if sub == '' or has_border(sub):
+            # occurrences of sub may overlap, and find_nth skips the overlapping ones
+            ind = self.find(sub, start)
+            while ind >= 0 and n > 1:
+                ind = self.find(sub, ind + len(sub))
+                n -= 1
+            return ind
+        length = len(self.text)
+        start = _slice_start(start, length)
+        if start > length:
+            return -1
+        pos = self.positions(sub)
+        k = bisect_left(pos, start) + max(n, 1) - 1
+        return pos[k] if k < len(pos) else -1
+
+    def count(self, sub: str, end: Optional[int] = None) -> int:
+        """Same as self.text[:end].count(sub)."""
+        end = _slice_end(end, len(self.text))
+        if has_border(sub):
+            return self.text.count(sub, 0, end)
+        return bisect_right(self.positions(sub), end - len(sub))
+
+    # -------------------------------------------------------------
+    # Environment queries
+    # -------------------------------------------------------------
+    def environment_depth(self, index: int, env: Optional[str] = None) -> int:
+        """Same as environment_depth(self.text, index, env) in helpers."""
+        env_st, env_en = _env_markers(env)
+        if has_border(env_st) or has_border(env_en):
+            return self.count(env_st, index) - self.count(env_en, index)
+        ends, depths = self.depth_events(env)
+        k = bisect_right(ends, _slice_end(index, len(self.text)))
+        return depths[k - 1] if k else 0
+
+    def depth_events(self, env: Optional[str] = None) -> tuple[array, array]:
+        """Return where every begin and end marker of env ends, or of any
+        environment if env is None, in order, and the environment depth
+        right after each of them.
+
+        The depth at an index is the depth after the last marker that ends
+        at or before it, so a marker that index is in the middle of does not
+        count yet. The arrays are built once per index and env; do not mutate them.
+
+        >>> get_index('\\\\begin{a}x\\\\begin{b}y\\\\end{b}\\\\end{a}').depth_events()
+        (array('q', [7, 17, 25, 32]), array('q', [1, 2, 1, 0]))
+        """
+        events = self._depth_events.get(env)
+        if events is None:
+            env_st, env_en = _env_markers(env)
+            markers = sorted([(p + len(env_st), 1) for p in self.positions(env_st)] +
+                             [(p + len(env_en), -1) for p in self.positions(env_en)])
+            ends, depths = array('q'), array('q')
+            depth = 0
+            for end, change in markers:
+                depth += change
+                ends.append(end)
+                depths.append(depth)
+            events = self._depth_events[env] = (ends, depths)
+        return events
+
+    def check_in_environment(self, env: str, index: int) -> bool:
+        """Same as check_in_environment(self.text, env, index) in helpers."""
+        if index < 0:
+            index = len(self.text) - index
+        env_str = '\\begin{' + env + '}'
+        env_end = '\\end{' + env + '}'
+        v2 = self.find(env_end, index)
+        if v2 == -1:
+            return False
+        v3 = self.rfind(env_str, index)
+        if v3 == -1:
+            return False
+        v1 = self.find(env_str, index)
+        if v1 == -1:
+            v1 = len(self.text)
+        return not (v1 < v2 or self.rfind(env_end, index) > v3)
+
+    def find_env_end(self, index: int, env: Optional[str] = None) -> int:
+        """Same as find_env_end(self.text, index, env) in helpers."""
+        env_st, env_en = _env_markers(env)
+        index += 1
+        n = len(self.text)
+        if _slice_start(index, n) > n:
+            return -1
+        starts = self.positions(env_st)
+        ends = self.positions(env_en)
+        i = bisect_left(starts, _slice_start(index, n))
+        j = bisect_left(ends, _slice_start(index, n))
+        while True:
+            if j >= len(ends):
+                return -1
+            if i < len(starts) and starts[i] < ends[j]:
+                i += 1
+                j += 1
+            else:
+                return ends[j]
+
+    def find_env_start(self, index: int, env: Optional[str] = None) -> int:
+        """Same as find_env_start(self.text, index, env) in helpers."""
+        env_st, env_en = _env_markers(env)
+        end = _slice_end(index, len(self.text))
+        starts = self.positions(env_st)
+        ends = self.positions(env_en)
+        i = bisect_right(starts, end - len(env_st)) - 1
+        j = bisect_right(ends, end - len(env_en)) - 1
+        while True:
+            t_st = starts[i] if i >= 0 else -1
+            t_en = ends[j] if j >= 0 else -1
+            if t_en == -1 and t_st == -1:
+                return -1
+            elif t_en == -1:
+                t_en = len(self.text)
+            if t_st < t_en <= index:
+                i -= 1
+                j -= 1
+            else:
+                return t_st
+
+    # -------------------------------------------------------------
+    # Brace queries
+    # -------------------------------------------------------------
+    def brace_events(self) -> tuple[list[int], list[int]]:
+        """Return the sorted position of every unescaped brace and every
+        escaped closing brace, and the brace depth right after each of them.
+
+        Together they are a prefix-depth array: the depth at any index is
+        the depth after the last brace at or before it.
+        """
+        if self._brace_positions is None:
+            text = self.text
+            opens = [p for p in self.positions('{') if p == 0 or text[p - 1] != '\\']
+            positions = sorted(opens + self.positions('}'))
+            depths = []
+            matches = {}
+            stack = []
+            depth = 0
+            for p in positions:
+                if text[p] == '{':
+                    depth += 1
+                    stack.append(p)
+                elif p == 0 or text[p - 1] != '\\':
+                    depth -= 1
+                    if stack:
+                        matches[stack.pop()] = p
+                depths.append(depth)
+            self._brace_positions, self._brace_depths, self._matches = positions, depths, matches
+        return self._brace_positions, self._brace_depths
+
+    def brace_depth(self, index: int) -> int:
+        """Return the number of unescaped opening braces minus the number
+        of unescaped closing braces in self.text[:index + 1].
+        """
+        return self.brace_balance(0, index + 1)
+
+    def brace_balance(self, start: int, end: int) -> int:
+        """Return the number of unescaped opening braces minus the number
+        of unescaped closing braces in self.text[start:end].
+
+        Preconditions:
+            - 0 <= start
+        """
+        if end <= start:
+            return 0
+        if self._use_brace_table():
+            positions, depths = self._brace_positions, self._brace_depths
+            k_end = bisect_left(positions, end) - 1
+            k_start = bisect_left(positions, start) - 1
+            return (depths[k_end] if k_end >= 0 else 0) - (depths[k_start] if k_start >= 0 else 0)
+        text = self.text
+        # an escaped brace is a backslash and a brace; count the brace if it is in range
+        esc_start = max(start - 1, 0)
+        return text.count('{', start, end) - text.count('\\{', esc_start, end) - \
+            text.count('}', start, end) + text.count('\\}', esc_start, end)
+
+    def closing_brace(self, index: int) -> int:
+        """Return where the unescaped opening brace at index is closed,
+        or -1 if it is never closed.
+
+        Preconditions:
+            - self.text[index] == '{' and it is not escaped
+        """
+        self.brace_events()
+        return self._matches.get(index, -1)
+
+    def local_env_end(self, index: int) -> int:
+        """Same as local_env_end(self.text, index) in helpers, that is, the
+        first closing brace at or after index where the brace depth counted
+        from index is zero.
+
+        Raise ValueError if an end cannot be found.
+        """
+        text = self.text
+        start = _slice_start(index, len(text))
+        if not self._use_brace_table():
+            # like bracket_layers, a negative index counts braces from the start
+            depth = self.brace_balance(0, start) if index < 0 else 0
+            for match in _BRACE_PATTERN.finditer(text, start):
+                pos = match.start()
+                escaped = pos > 0 and text[pos - 1] == '\\'
+                if text[pos] == '{':
+                    depth += not escaped
+                    continue
+                depth -= not escaped
+                if depth == 0:
+                    return pos
+            raise ValueError("Opening bracket without a closing bracket detected")
+        positions = self._brace_positions
+        k = bisect_left(positions, start)
+        if k < len(positions) and text[positions[k]] == '{' and index >= 0:
+            # the usual case: the first brace opens the local environment
+            closer = self._matches.get(positions[k], -1)
+        else:
+            target = self.brace_balance(0, start) if index >= 0 else 0
+            closers = self._closers().get(target, [])
+            j = bisect_left(closers, start)
+            closer = closers[j] if j < len(closers) else -1
+        if closer == -1:
+            raise ValueError("Opening bracket without a closing bracket detected")
+        return closer
+
+    def _use_brace_table(self) -> bool:
+        """Return whether brace queries should be answered from the brace
+        table. The table is only built once this index was asked enough
+        brace queries to pay for it; until then, they scan the text.
+        """
+        if self._brace_positions is None:
+            self._brace_queries += 1
+            if self._brace_queries <= _SCANS_BEFORE_TABLE:
+                return False
+            self.brace_events()
+        return True
+
+    def _closers(self) -> dict[int, list[int]]:
+        """Map each brace depth to the sorted positions of every closing
+        brace, escaped or not, at which the depth is reached.
+        """
+        if self._closers_by_depth is None:
+            by_depth = {}
+            text = self.text
+            for pos, depth in zip(*self.brace_events()):
+                if text[pos] == '}':
+                    by_depth.setdefault(depth, []).append(pos)
+            self._closers_by_depth = by_depth
+        return self._closers_by_depth
+
+    # -------------------------------------------------------------
+    # Protected regions
+    # -------------------------------------------------------------
+    def command_starts(self) -> list[int]:
+        """Return the sorted position of every backslash that
+        nearest_local_env in helpers would take for the start of a local
+        environment: a backslash not right after another backslash, whose next
+        opening brace comes before its next space. Whether that brace is ever
+        closed is not checked. The list is built once per index; do not mutate it.
+        """
+        if self._command_starts is None:
+            n = len(self.text)
+            starts = []
+            for match in _COMMAND_PATTERN.finditer(self.text):
+                backslash = match.start()
+                next_brace = self.find('{', backslash)
+                next_space = self.find(' ', backslash)
+                if (next_brace if next_brace != -1 else n) < (next_space if next_space != -1 else n):
+                    starts.append(backslash)
+            self._command_starts = starts
+        return self._command_starts
+
+    def protected_regions(self) -> list[tuple[int, int]]:
+        """Return the start and end of every region that
+        modify_text_not_in_environments in helpers must not modify, in order:
+        environments, inline and display equations, and local environments.
+
+        Regions are found the same way that function always found them, one
+        after the other, but every search is a binary search. The list is
+        built once per index; do not mutate it.
+
+        >>> get_index('a \\\\(x\\\\) b \\\\textbf{c} d \\\\begin{e}f\\\\end{e} g').protected_regions()
+        [(2, 7), (10, 20), (23, 40)]
+        """
+        if self._regions is None:
+            self._regions = self._find_protected_regions()
+        return self._regions
+
+    def _find_protected_regions(self) -> list[tuple[int, int]]:
+        """Return protected_regions() without remembering it.
+
+        Stop at the first position where two kinds of region start, like a
+        local environment starting at an inline equation.
+        """
+        n = len(self.text)
+        commands = self.command_starts()
+        regions = []
+        cur_pos = 0
+        while True:
+            starters = [self.find(marker, cur_pos) for marker in ('\\begin{', '\\(', '\\[')]
+            starters = [ind if ind != -1 else n for ind in starters]
+            k = bisect_left(commands, cur_pos)
+            if k == len(commands):
+                local_ind = n
+            else:
+                local_ind = commands[k]
+                self.local_env_end(self.find('{', local_ind))  # raises ValueError if it is never closed
+                if local_ind == starters[0]:
+                    local_ind += 1  # \begin{ is an environment, not a local environment
+            starters.append(local_ind)
+            starter_index = min(starters)
+            if starters.count(starter_index) > 1:
+                break
+            type_of_starter = starters.index(starter_index)
+            if type_of_starter == 0:
+                end_of_env = self.local_env_end(self.find('\\end{', starter_index)) + 1
+            elif type_of_starter == 1:
+                end_of_env = self.find('\\)', starter_index) + 2
+            elif type_of_starter == 2:
+                end_of_env = self.find('\\]', starter_index) + 2
+            else:
+                end_of_env = self.local_env_end(starter_index) + 1
+            assert starter_index < end_of_env
+            regions.append((starter_index, end_of_env))
+            cur_pos = end_of_env
+        return regions
+
+    # -------------------------------------------------------------
+    # Edits
+    # -------------------------------------------------------------
+    def splice(self, start: int, end: int, new: str) -> 'LatexIndex':
+        """Return the index of self.text[:start] + new + self.text[end:],
+        only searching the text around the edit again. The returned index is
+        remembered by get_index().
+
+        Preconditions:
+            - 0 <= start <= end <= len(self.text)
+        """
+        new_text = self.text[:start] + new + self.text[end:]
+        delta = len(new) - (end - start)
+        ind = LatexIndex(new_text)
+        for sub, pos in self._positions.items():
+            ind._positions[sub] = _splice_positions(new_text, pos, sub, start, end, delta, len(new))
+        _remember(ind)
+        return ind
+
+
+def _env_markers(env: Optional[str]) -> tuple[str, str]:
+    """Return the begin and end markers of env, or of any environment
+    if env is None.
+    """
+    if env is not None:
+        return '\\begin{' + env + '}', '\\end{' + env + '}'
+    return '\\begin{', '\\end{'
+
+
+def _splice_positions(new_text: str, pos: list[int], sub: str, start: int, end: int,
+                      delta: int, new_len: int) -> list[int]:
+    """Return the occurrences of sub in new_text, given the occurrences pos
+    of sub in the text before the edit described by start, end and delta.
+    """
+    left = pos[:bisect_right(pos, start - len(sub))]
+    right = [p + delta for p in pos[bisect_left(pos, end):]]
+    mid = []
+    i = new_text.find(sub, max(0, start - len(sub) + 1))
+    while i != -1 and i < start + new_len:
+        mid.append(i)
+        i = new_text.find(sub, i + 1)
+    return left + mid + right
@@ -0,0 +1,150 @@
+"""A piece table for documents that are edited many times in a row.
+
+Helpers that edit a document in a loop usually do
+
+    text = text[:i] + new + text[j:]
+
+which copies the whole document on every edit. A TextBuffer keeps the
+document as a list of pieces, each of which is a slice of a string that is
+never copied, so an edit only touches the pieces around it. Edits made from
+the start of the document towards its end, which is how almost every helper
+walks a document, only ever touch the last few pieces.
+
+A TextBuffer answers the str methods the helpers use (find, find_nth,
+slicing, len) directly. Convert it with str() to hand it to a helper that
+expects a str; the joined string is cached until the next edit.
+
+I/O functions are NOT allowed.
+"""
+from bisect import bisect_right
+from typing import Optional
+
+
+class TextBuffer:
+    """A mutable document made of pieces of immutable strings.
+
+    Representation Invariants:
+        - len(self._sources) == len(self._los) == len(self._his) == len(self._starts)
+        - every piece is non-empty, that is, self._los[k] < self._his[k]
+        - self._starts[k] is where piece k starts in the document
+    """
+    _sources: list[str]
+    _los: list[int]
+    _his: list[int]
+    _starts: list[int]
+    _length: int
+    _joined: Optional[str]
+
+    def __init__(self, text: str = '') -> None:
+        self._sources, self._los, self._his, self._starts = [], [], [], []
+        self._length = 0
+        self._joined = text
+        if text:
+            self._append_pieces([(text, 0, len(text))])
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        if self._joined is None:
+            self._joined = ''.join(src[lo:hi] for src, lo, hi in
+                                   zip(self._sources, self._los, self._his))
+        return self._joined
+
+    def __getitem__(self, key: slice) -> str:
+        """Return the text in the slice key. Only slices with a step of 1
+        are supported.
+        """
+        start, stop, step = key.indices(self._length)
+        assert step == 1, 'TextBuffer slices may not have a step'
+        if self._joined is not None:
+            return self._joined[start:stop]
+        if start >= stop:
+            return ''
+        parts = []
+        k = self._piece_at(start)
+        while k < len(self._starts) and self._starts[k] < stop:
+            src, lo = self._sources[k], self._los[k]
+            offset = self._starts[k] - lo
+            parts.append(src[max(lo, start - offset):min(self._his[k], stop - offset)])
+            k += 1
+        return ''.join(parts)
+
+    def _piece_at(self, index: int) -> int:
+        """Return the piece containing index.
+
+        Preconditions:
+            - 0 <= index < len(self)
+        """
+        return bisect_right(self._starts, index) - 1
+
+    def _append_pieces(self, pieces: list[tuple[str, int, int]]) -> None:
+        """Append non-empty pieces to the end of the piece list."""
+        for src, lo, hi in pieces:
+            if lo < hi:
+                self._sources.append(src)
+                self._los.append(lo)
+                self._his.append(hi)
+                self._starts.append(self._length)
+                self._length += hi - lo
+
+    def find(self, sub: str, start: int = 0) -> int:
+        """Same as str(self).find(sub, start), without joining the pieces.
+        """
+        if self._joined is not None:
+            return self._joined.find(sub, start)
+        if start < 0:
+            start = max(0, start + self._length)
+        if start + len(sub) > self._length:
+            return -1
+        if not sub:
+            return start
+        k = self._piece_at(start)
+        while k < len(self._starts):
+            src, lo, hi = self._sources[k], self._los[k], self._his[k]
+            offset = self._starts[k] - lo
+            found = src.find(sub, max(lo, start - offset), hi)
+            if found != -1:
+                return found + offset
+            # an occurrence can start in this piece and end in a later one
+            boundary = self._starts[k] + hi - lo
+            window_start = max(start, boundary - len(sub) + 1)
+            window = self[window_start:boundary + len(sub) - 1]
+            found = window.find(sub)
+            if found != -1 and window_start + found < boundary:
+                return window_start + found
+            k += 1
+        return -1
+
+    def find_nth(self, sub: str, n: int, start: int = 0) -> int:
+        """Same as find_nth(str(self), sub, n, start) in helpers."""
+        ind = self.find(sub, start)
+        while ind >= 0 and n > 1:
+            ind = self.find(sub, ind + len(sub))
+            n -= 1
+        return ind
+
+    def splice(self, start: int, end: int, new: str) -> None:
+        """Replace self[start:end] with new.
+
+        Preconditions:
+            - 0 <= start <= end <= len(self)
+        """
+        k = self._piece_at(start) if start < self._length else len(self._starts)
+        replacement = []
+        if k < len(self._starts):
+            offset = self._starts[k] - self._los[k]
+            replacement.append((self._sources[k], self._los[k], start - offset))
+        replacement.append((new, 0, len(new)))
+        j = k
+        while j < len(self._starts) and self._starts[j] + self._his[j] - self._los[j] <= end:
+            j += 1
+        if j < len(self._starts):
+            offset = self._starts[j] - self._los[j]
+            replacement.append((self._sources[j], max(self._los[j], end - offset), self._his[j]))
+            j += 1
+        tail = list(zip(self._sources[j:], self._los[j:], self._his[j:]))
+        del self._sources[k:], self._los[k:], self._his[k:], self._starts[k:]
+        self._length = self._starts[-1] + self._his[-1] - self._los[-1] if self._starts else 0
+        self._append_pieces(replacement + tail)
+        self._joined = None
@@ -0,0 +1,105 @@
+"""
+Run a LaTeX engine only as many times as the document needs, the way
+latexmk does.
+
+After every pass, the auxiliary files the engine reads back (.aux, .toc,
+.out and so on) are compared to what they were before the pass. Another
+pass is only run if one of them changed, or if the log asks for one.
+"""
+import hashlib
+import os
+import subprocess
+from typing import Optional
+
+TRACKED_SUFFIXES = ('.aux', '.toc', '.lof', '.lot', '.out', '.bcf', '.bbl')
+# the exact .aux lines hyperref writes at the top of every .aux file, which never
+# change the next pass. Every other line is compared, \gdef and \let lines included.
+_BOILERPLATE_AUX = frozenset((
+    b'\\relax',
+    b'\\providecommand\\hyper@newdestlabel[2]{}',
+    b'\\providecommand\\HyperFirstAtBeginDocument{\\AtBeginDocument}',
+    b'\\HyperFirstAtBeginDocument{\\ifx\\hyper@anchor\\@undefined',
+    b'\\global\\let\\oldcontentsline\\contentsline',
+    b'\\gdef\\contentsline#1#2#3#4{\\oldcontentsline{#1}{#2}{#3}}',
+    b'\\global\\let\\oldnewlabel\\newlabel',
+    b'\\gdef\\newlabel#1#2{\\newlabelxx{#1}#2}',
+    b'\\gdef\\newlabelxx#1#2#3#4#5#6{\\oldnewlabel{#1}{{#2}{#3}}}',
+    b'\\AtEndDocument{\\ifx\\hyper@anchor\\@undefined',
+    b'\\let\\contentsline\\oldcontentsline',
+    b'\\let\\newlabel\\oldnewlabel',
+    b'\\fi}',
+    b'\\global\\let\\hyper@last\\relax',
+    b'\\gdef\\HyperFirstAtBeginDocument#1{#1}',
+    b'\\providecommand*\\HyPL@Entry[1]{}',
+))
+_RERUN_MESSAGES = ('Rerun to get', 'Rerun LaTeX', 'Label(s) may have changed')
+
+
+def run_latex(compile_command: list[str], job_name: str, output_dir: str = '',
+              bibtex_command: Optional[list[str]] = None, max_passes: int = 3) -> tuple[int, bool]:
+    """Run compile_command until the auxiliary files of job_name stop changing,
+    but no more than max_passes times. Run bibtex_command after the first pass
+    if it is not None.
+
+    Return how many times compile_command was run, and whether its last run
+    exited successfully.
+
+    Parameters
+    ----------
+    compile_command
+        the LaTeX engine command.
+    job_name
+        the name of the tex file being compiled, without the suffix.
+    output_dir
+        the folder the engine writes its auxiliary files in, or '' for the
+        current folder.
+    bibtex_command
+        the bibtex command, or None if there is nothing to cite.
+    max_passes
+        the most times compile_command may run.
+    """
+    base = os.path.join(output_dir, job_name)
+    passes = 0
+    while True:
+        before = aux_fingerprint(base)
+        succeeded = subprocess.run(compile_command).returncode == 0
+        passes += 1
+        after = aux_fingerprint(base)
+        if passes == 1 and bibtex_command is not None:
+            print(bibtex_command)
+            subprocess.run(bibtex_command)
+            after = aux_fingerprint(base)
+        if passes >= max_passes:
+            return passes, succeeded
+        if before == after and not _log_asks_for_rerun(base + '.log'):
+            return passes, succeeded
+
+
+def aux_fingerprint(base: str) -> dict[str, Optional[str]]:
+    """Return a digest of every auxiliary file of base that affects the next
+    pass, ignoring the boilerplate .aux lines written on every pass.
+    Missing and boilerplate-only files have the digest None.
+    """
+    fingerprint = {}
+    for suffix in TRACKED_SUFFIXES:
+        try:
+            with open(base + suffix, 'rb') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            fingerprint[suffix] = None
+            continue
+        if suffix == '.aux':
+            lines = [line for line in lines if line.strip() not in _BOILERPLATE_AUX]
+        lines = [line for line in lines if line.strip()]
+        fingerprint[suffix] = hashlib.sha256(b'\n'.join(lines)).hexdigest() if lines else None
+    return fingerprint
+
+
+def _log_asks_for_rerun(log_path: str) -> bool:
+    """Return whether the engine log at log_path asks for another pass."""
+    try:
+        with open(log_path, encoding='UTF-8', errors='replace') as f:
+            log = f.read()
+    except OSError:
+        return False
+    return any(message in log for message in _RERUN_MESSAGES)
@@ -0,0 +1,135 @@
+"""
+Cache what pandoc produces for a Word file, so converting the same Word
+file again with a different config only re-runs the repair stages.
+
+Entries are keyed by the contents of the Word file, the version of pandoc
+and the pandoc command, and hold the tex file pandoc wrote and the media
+folder it extracted. The least recently used entries are removed once the
+cache is larger than its size limit.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+CACHE_FOLDER = 'pandoc_cache'  # used when no cache folder is given; relative to the working directory
+TEX_NAME = 'pandoc_output.tex'
+MEDIA_NAME = 'media'
+
+
+@lru_cache(maxsize=1)
+def pandoc_version() -> Optional[str]:
+    """Return the first line of pandoc --version, or None if pandoc
+    cannot be run.
+    """
+    try:
+        result = subprocess.run(['pandoc', '--version'], capture_output=True, text=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.partition('\n')[0].strip()
+
+
+def cache_key(word_file_path: str, command: list[str]) -> Optional[str]:
+    """Return the key of the entry for converting word_file_path with
+    command, or None if pandoc cannot be run.
+
+    command should not contain the path of the Word file or of the tex
+    file pandoc writes, since the same Word file may be converted from
+    anywhere and into any temp file.
+    """
+    version = pandoc_version()
+    if version is None:
+        return None
+    digest = hashlib.sha256()
+    with open(word_file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(b'\0' + version.encode('utf-8'))
+    for arg in command:
+        digest.update(b'\0' + arg.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load(key: str, media_folder: str, cache_folder: Optional[str] = None) -> Optional[str]:
+    """Return the tex file stored under key, and copy its media folder
+    to media_folder. Return None if nothing is stored under key.
+    """
+    cache_folder = cache_folder or CACHE_FOLDER
+    entry = os.path.join(cache_folder, key)
+    try:
+        with open(os.path.join(entry, TEX_NAME), encoding='UTF-8') as f:
+            tex = f.read()
+    except FileNotFoundError:
+        return None
+    media = os.path.join(entry, MEDIA_NAME)
+    try:
+        if os.path.isdir(media):
+            shutil.copytree(media, media_folder, dirs_exist_ok=True)
+        os.utime(entry)  # mark the entry as recently used
+    except FileNotFoundError:
+        return None  # another process evicted it while it was read
+    return tex
+
+
+def store(key: str, tex: str, media_folder: str, max_size_mb: float,
+          cache_folder: Optional[str] = None) -> None:
+    """Store tex and a copy of media_folder, if it exists, under key.
+    Then remove the least recently used entries until the cache is no
+    larger than max_size_mb.
+    """
+    cache_folder = cache_folder or CACHE_FOLDER
+    os.makedirs(cache_folder, exist_ok=True)
+    # build the entry elsewhere and move it in, so other processes never see half an entry
+    staging = tempfile.mkdtemp(prefix='staging_', dir=cache_folder)
+    try:
+        with open(os.path.join(staging, TEX_NAME), 'w', encoding='UTF-8') as f:
+            f.write(tex)
+        if os.path.isdir(media_folder):
+            shutil.copytree(media_folder, os.path.join(staging, MEDIA_NAME))
+        os.replace(staging, os.path.join(cache_folder, key))
+    except OSError:
+        # another process stored the same entry first
+        shutil.rmtree(staging, ignore_errors=True)
+    evict(max_size_mb, cache_folder)
+
+
+def evict(max_size_mb: float, cache_folder: Optional[str] = None) -> None:
+    """Remove the least recently used entries until the cache is no larger
+    than max_size_mb.
+    """
+    cache_folder = cache_folder or CACHE_FOLDER
+    entries = []
+    for name in os.listdir(cache_folder):
+        path = os.path.join(cache_folder, name)
+        if name.startswith('staging_') or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), _folder_size(path), path))
+        except FileNotFoundError:
+            continue  # another process evicted it just now
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_size_mb * 2 ** 20:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _folder_size(folder: str) -> int:
+    """Return the total size of every file in folder, in bytes. Files that
+    are removed while folder is walked are not counted.
+    """
+    size = 0
+    for root, _, files in os.walk(folder):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except FileNotFoundError:
+                pass
+    return size
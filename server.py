@@ -0,0 +1,347 @@
+"""
+Keep converting Word files in one long-running process, so a conversion does
+not pay for starting Python, importing every module, and reading the configs
+and preambles again.
+
+    python converter.py serve [--host 127.0.0.1] [--port 8765] [--socket PATH]
+                              [--workers 2] [--queue 8]
+
+POST the bytes of a Word file to /convert, with these optional query parameters:
+
+    config     the name of a config in config_modes, such as config_quiet.
+    overrides  a JSON object of preferences that override the config. Only the
+               preferences in ALLOWED_OVERRIDES can be overridden, because
+               the others name files, turn on the shell or put raw LaTeX in
+               the document.
+    name       the name the exported files get, without a suffix.
+
+For example:
+
+    curl --data-binary @paper.docx "http://127.0.0.1:8765/convert?config=config_quiet&name=paper"
+
+The reply is a JSON object with the exported tex file under "tex" and the
+PDF, base64 encoded, under "pdf", which is null if no PDF was compiled.
+GET /health replies with how many jobs are running or waiting.
+
+At most --workers conversions run at once, each in a worker process that
+stays alive between jobs, and at most --queue more wait for a worker. Jobs
+beyond that are turned away with 503 so clients can retry them later.
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+import converter as conv
+import pandoc_cache
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FOLDER = os.path.join(ROOT, 'config_modes')
+DEFAULT_CONFIG = 'config_standard'
+MAX_UPLOAD_SIZE = 64 * 2 ** 20  # the largest Word file accepted, in bytes
+# nobody is at the server to look at a PDF, and the temp folder of a job is removed anyway
+SERVER_OVERRIDES = {'open_after_export': False, 'cleanup': False, 'disable_bib_prompts': True}
+# the preferences a client may override: they only change how the document is repaired
+ALLOWED_OVERRIDES = frozenset({
+    'allow_alignments', 'exclude_preamble', 'disallow_figures', 'forbid_images', 'disable_repair',
+    'hypertarget_remover', 'fix_vectors', 'dollar_sign_equations', 'center_images', 'fix_prime_symbols',
+    'allow_environments', 'disable_legacy_environments', 'prevent_pdf_exports', 'fix_derivatives',
+    'replace_font', 'fix_unicode', 'autodetect_align_symbols', 'pdf_engine', 'max_line_length',
+    'max_line_align', 'fix_texttt', 'combine_aligns', 'special_proofs', 'table_of_contents', 'header_level',
+    'erase_pandoc_preamble', 'label_equations', 'auto_numbering', 'remove_spaces_from_eqns', 'no_secnum',
+    'conceal_verbatims', 'citation_brackets', 'disable_table_figuring', 'modify_tables', 'subsection_limit',
+    'hide_comments', 'allow_abstract', 'small_margins', 'latexing', 'headings', 'conditional_preamble',
+    'big_text', 'max_page_length', 'tufte', 'no_quotes_in_lists', 'no_unicode_fractions', 'center_tikz',
+    'low_memory'
+})
+
+# the contents of every config read by this worker process, and the mtime they were read at
+_CONFIGS: dict[str, tuple[int, dict[str, Any]]] = {}
+
+
+class JobError(Exception):
+    """Exception raised when a conversion job asks for something impossible."""
+
+
+def config_path(name: str) -> str:
+    """Return the path of the config in CONFIG_FOLDER called name, with or
+    without .json. Raise JobError if there is no such config.
+    """
+    file_name = name if name.endswith('.json') else name + '.json'
+    path = os.path.join(CONFIG_FOLDER, file_name)
+    if os.path.basename(file_name) != file_name or not os.path.isfile(path):
+        raise JobError(f'There is no config called {name}.')
+    return path
+
+
+def check_overrides(overrides: Any) -> None:
+    """Raise JobError unless overrides is a JSON object that only overrides
+    preferences in ALLOWED_OVERRIDES, each with a value of the same type as
+    its default.
+    """
+    if not isinstance(overrides, dict):
+        raise JobError('overrides must be a JSON object.')
+    defaults = {f.name: f.default for f in fields(conv.Preferences)}
+    for key, value in overrides.items():
+        if key not in ALLOWED_OVERRIDES:
+            raise JobError(f'The server does not allow overriding {key}.')
+        # bool is a subclass of int, so True would otherwise pass for an int
+        if not isinstance(value, type(defaults[key])) or \
+                (isinstance(value, bool) and not isinstance(defaults[key], bool)):
+            raise JobError(f'{key} must be a {type(defaults[key]).__name__}.')
+
+
+def check_file_name(name: str, what: str) -> None:
+    """Raise JobError unless name is a file name without spaces, so it
+    cannot point outside the folder of a job.
+    """
+    if os.path.basename(name) != name or ' ' in name or name in ('', '.', '..'):
+        raise JobError(f'{what} must be a file name without spaces.')
+
+
+def convert(docx: bytes, config: str, overrides: dict[str, Any], name: str) -> dict[str, Any]:
+    """Convert the Word file whose contents are docx, in a worker process.
+    Return the exported tex file and the base64 encoded PDF, or None if no
+    PDF was compiled.
+    """
+    check_overrides(overrides)
+    check_file_name(name, 'name')
+    preferences, replacement_mode = conv.preferences_from_config(_load_config(config_path(config)),
+                                                                 {**overrides, **SERVER_OVERRIDES})
+    if replacement_mode:
+        raise JobError('Replacement mode needs a tex file to replace into, so the server cannot run it.')
+    if preferences.export_file_name_suffix:
+        check_file_name(name + preferences.export_file_name_suffix, 'export_file_name_suffix')
+    # jobs run in their own folder, so paths in the config must not depend on the working directory
+    preferences.preamble_path = _from_root(preferences.preamble_path)
+    preferences.sty_cls_files = _from_root(preferences.sty_cls_files or [])
+    folder = tempfile.mkdtemp(prefix='qwl_serve_')
+    cwd = os.getcwd()
+    try:
+        os.chdir(folder)
+        with open(name + '.docx', 'wb') as f:
+            f.write(docx)
+        word_file = conv.WordFile(name + '.docx', preferences, disable_file_prompts=True)
+        word_file.sequence()
+        tex_path = word_file.output_path
+        with open(tex_path, encoding='UTF-8') as f:
+            tex = f.read()
+        pdf = None
+        for pdf_path in (tex_path[:-4] + '.pdf', os.path.join(conv.FOLDER_TO_RUN_IN, tex_path[:-4] + '.pdf')):
+            if os.path.isfile(pdf_path):
+                with open(pdf_path, 'rb') as f:
+                    pdf = base64.b64encode(f.read()).decode('ascii')
+                break
+        return {'tex': tex, 'pdf': pdf}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _load_config(path: str) -> dict[str, Any]:
+    """Return the contents of the config at path, only reading it again
+    if it changed since the last time it was read.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _CONFIGS.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _CONFIGS[path] = cached
+    return cached[1]
+
+
+def _from_root(paths: Any) -> Any:
+    """Return paths, a path or a list of paths relative to ROOT, as absolute paths.
+
+    Only paths from the configs on the server go through here; clients
+    cannot override them.
+    """
+    if isinstance(paths, str):
+        return os.path.join(ROOT, paths)
+    return [os.path.join(ROOT, path) for path in paths]
+
+
+def _init_worker(root: str) -> None:
+    """Prepare a worker process. The working directory of a worker changes
+    with every job, so the pandoc cache is kept in root instead.
+
+    Workers ignore Ctrl+C and are shut down by the server instead.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pandoc_cache.CACHE_FOLDER = os.path.join(root, pandoc_cache.CACHE_FOLDER)
+
+
+def _warm_up() -> None:
+    """Read every config and the preambles they use, so the first job of
+    a worker process does not have to.
+    """
+    for file_name in os.listdir(CONFIG_FOLDER):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            preferences, _ = conv.preferences_from_config(_load_config(os.path.join(CONFIG_FOLDER, file_name)), {})
+        except (OSError, ValueError, TypeError):
+            continue  # a broken config only fails the jobs that use it
+        conv.open_multiple_files(_from_root(preferences.preamble_path))
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """An HTTP server that converts Word files in a pool of worker processes.
+
+    Instance Attributes:
+        - pool: the worker processes.
+        - capacity: how many jobs may be running or waiting at once.
+        - jobs: how many jobs are running or waiting.
+    """
+    pool: ProcessPoolExecutor
+    capacity: int
+    jobs: int
+    _lock: threading.Lock
+
+    daemon_threads = True
+
+    def __init__(self, address: Any, workers: int, queue_size: int) -> None:
+        super().__init__(address, _Handler)
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ROOT,))
+        self.capacity = workers + queue_size
+        self.jobs = 0
+        self._lock = threading.Lock()
+        for future in [self.pool.submit(_warm_up) for _ in range(workers)]:
+            future.result()
+
+    def take_slot(self) -> bool:
+        """Count one more job and return True, or return False if there is
+        no room for another job.
+        """
+        with self._lock:
+            if self.jobs >= self.capacity:
+                return False
+            self.jobs += 1
+            return True
+
+    def free_slot(self) -> None:
+        """Count one less job."""
+        with self._lock:
+            self.jobs -= 1
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown()
+
+
+class UnixConversionServer(ConversionServer):
+    """A ConversionServer listening on a Unix socket instead of a port."""
+    address_family = getattr(socket, 'AF_UNIX', socket.AF_INET)
+
+    def server_bind(self) -> None:
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answers the requests of one client of a ConversionServer."""
+    server: ConversionServer
+
+    def do_GET(self) -> None:
+        """Answer GET /health."""
+        if urlparse(self.path).path != '/health':
+            self._reply(404, {'error': 'Not found.'})
+            return
+        self._reply(200, {'jobs': self.server.jobs, 'capacity': self.server.capacity})
+
+    def do_POST(self) -> None:
+        """Answer POST /convert."""
+        url = urlparse(self.path)
+        if url.path != '/convert':
+            self._reply(404, {'error': 'Not found.'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if not 0 < length <= MAX_UPLOAD_SIZE:
+            self._reply(413 if length else 400, {'error': 'Send the Word file as the request body.'})
+            return
+        docx = self.rfile.read(length)
+        query = parse_qs(url.query)
+        try:
+            config = query.get('config', [DEFAULT_CONFIG])[0]
+            overrides = json.loads(query.get('overrides', ['{}'])[0])
+            name = query.get('name', ['document'])[0]
+            check_overrides(overrides)
+            check_file_name(name, 'name')
+        except (ValueError, JobError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+        if not self.server.take_slot():
+            self._reply(503, {'error': 'The server is busy; try again later.'}, {'Retry-After': '1'})
+            return
+        try:
+            result = self.server.pool.submit(convert, docx, config, overrides, name).result()
+        except JobError as e:
+            self._reply(400, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+        else:
+            self._reply(200, result)
+        finally:
+            self.server.free_slot()
+
+    def _reply(self, status: int, body: dict[str, Any], headers: Optional[dict[str, str]] = None) -> None:
+        """Send body as JSON with status and headers."""
+        data = json.dumps(body).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # clients of a Unix socket have no address
+        return str(self.client_address[0]) if self.client_address else 'unix socket'
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Serve until interrupted."""
+    parser = argparse.ArgumentParser(prog='converter.py serve',
+                                     description='Convert Word files sent to a local HTTP server.')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='the port to listen on')
+    parser.add_argument('--socket', metavar='PATH', help='listen on this Unix socket instead of a port')
+    parser.add_argument('--workers', type=int, default=2, help='how many Word files to convert at once')
+    parser.add_argument('--queue', type=int, default=8,
+                        help='how many more jobs may wait for a worker before jobs are turned away')
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.queue < 0:
+        parser.error('there must be at least one worker, and the queue cannot be negative')
+    if args.socket is not None:
+        if not hasattr(socket, 'AF_UNIX'):
+            parser.error('Unix sockets are not supported here; use --port instead')
+        if os.path.exists(args.socket):
+            os.remove(args.socket)  # left behind by a server that did not shut down
+        server = UnixConversionServer(args.socket, args.workers, args.queue)
+        print(f'Serving on {args.socket}', flush=True)
+    else:
+        server = ConversionServer((args.host, args.port), args.workers, args.queue)
+        print(f'Serving on http://{args.host}:{server.server_port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
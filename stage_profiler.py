@@ -0,0 +1,221 @@
+"""
+Time each stage of WordFile.latex_repair, count how often the hot
+helpers are called during it, how often the cached ones were
+answered from their caches, and how much memory the process has used
+at most by the end of it.
+
+Enable it with the profile_stages preference or the --profile flag.
+
+Helper calls are counted per thread, so conversions profiled at the same
+time in different threads do not count each other's calls. Calls made in
+worker processes, when parallel_sections or parallel_tables is on, cannot be
+counted; the stages that make them report their helper calls as unknown.
+
+The counts are partial: only calls made through the helpers module are
+counted. Helpers that work on a latex_index.LatexIndex, and the callers of
+find_env_end and local_env_end that go straight to one, are not. The
+counters are only in place while a profiler is counting, so conversions
+that are not profiled never pay for them.
+"""
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Iterator, Optional
+
+from helper_files import helpers as dbl
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# helpers whose call counts say the most about why a stage is slow
+HOT_HELPERS = ('find_nth', 'rfind_nth', 'bracket_layers', 'local_env_end', 'find_env_end',
+               'find_env_start', 'environment_depth', 'check_in_environment',
+               'find_not_in_environment', 'calculate_eqn_length', 'split_equation')
+
+# the counts of the profiler counting helper calls in this thread, if any
+_COUNTS: ContextVar[Optional[dict[str, int]]] = ContextVar('stage_profiler_counts', default=None)
+_INSTALL_LOCK = threading.Lock()
+# how many profilers are counting, and the hot helpers as they were before any did
+_counting = 0
+_originals: dict[str, Callable] = {}
+
+
+@dataclass(**dbl.DATACLASS_SLOTS)
+class StageRecord:
+    """How one stage of latex_repair went.
+
+    Instance Attributes:
+        - name: the name of the stage.
+        - seconds: wall time spent in the stage.
+        - input_size: length of the text the stage was given.
+        - output_size: length of the text the stage returned.
+        - helper_calls: how many times each hot helper was called through the
+          helpers module during the stage, or None if some of them were called
+          in worker processes, where they are not counted.
+        - cache_stats: how many calls to each cached helper during the stage were
+          answered from its cache (hits) and how many were not (misses).
+        - peak_rss: the most memory the process has used so far, in bytes, when
+          the stage ended, or -1 if it cannot be measured here.
+    """
+    name: str
+    seconds: float
+    input_size: int
+    output_size: int
+    helper_calls: Optional[dict[str, int]] = field(default_factory=dict)
+    cache_stats: dict[str, dict[str, int]] = field(default_factory=dict)
+    peak_rss: int = -1
+
+
+class StageProfiler:
+    """Records a StageRecord for every stage run through run_stage().
+
+    Instance Attributes:
+        - records: the records of every stage, in the order they ran.
+    """
+    records: list[StageRecord]
+    _counts: dict[str, int]
+    _uncounted: bool  # whether helpers were called in worker processes since the last stage ended
+    _complete: bool  # whether every helper call of every stage was counted
+
+    def __init__(self) -> None:
+        self.records = []
+        self._counts = {name: 0 for name in HOT_HELPERS}
+        self._uncounted = False
+        self._complete = True
+
+    @contextmanager
+    def counting_helpers(self) -> Iterator[None]:
+        """Count calls to every hot helper made in this thread until the
+        block exits, including calls from other helpers.
+        """
+        _install_counters()
+        token = _COUNTS.set(self._counts)
+        try:
+            yield
+        finally:
+            _COUNTS.reset(token)
+            _remove_counters()
+
+    def calls_elsewhere(self) -> None:
+        """Note that hot helpers are called in worker processes, where
+        they are not counted, during the stage that is running, or the next
+        one if none is. That stage reports its helper calls as unknown.
+        """
+        self._uncounted = True
+
+    def run_stage(self, name: str, func: Callable, text: str, *args: Any, **kwargs: Any) -> Any:
+        """Return func(text, *args, **kwargs), recording how the call went
+        under name.
+        """
+        before = dict(self._counts)
+        cache_before = dbl.equation_cache_stats()
+        start = time.perf_counter()
+        result = func(text, *args, **kwargs)
+        seconds = time.perf_counter() - start
+        # stages that return a tuple return the text as its first str
+        output = next((r for r in result if isinstance(r, str)), None) if isinstance(result, tuple) else result
+        calls = {h: self._counts[h] - before[h] for h in HOT_HELPERS if self._counts[h] != before[h]}
+        if self._uncounted:
+            calls = None
+            self._uncounted = False
+            self._complete = False
+        cache_stats = {}
+        for helper, stats in dbl.equation_cache_stats().items():
+            change = {k: v - cache_before[helper][k] for k, v in stats.items()}
+            if any(change.values()):
+                cache_stats[helper] = change
+        self.records.append(StageRecord(name, seconds, len(text),
+                                        len(output) if isinstance(output, str) else -1, calls, cache_stats,
+                                        peak_rss()))
+        return result
+
+    def report(self) -> dict[str, Any]:
+        """Return every record and the totals as a JSON-compatible dict."""
+        cache_stats = {}
+        for r in self.records:
+            for helper, stats in r.cache_stats.items():
+                total = cache_stats.setdefault(helper, {'hits': 0, 'misses': 0})
+                for k, v in stats.items():
+                    total[k] += v
+        return {'total_seconds': sum(r.seconds for r in self.records),
+                'peak_rss': max((r.peak_rss for r in self.records), default=-1),
+                'helper_calls': {h: c for h, c in self._counts.items() if c} if self._complete else None,
+                'cache_stats': cache_stats,
+                'stages': [asdict(r) for r in self.records]}
+
+    def write_json(self, path: str) -> None:
+        """Write report() to path."""
+        with open(path, 'w', encoding='UTF-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def print_table(self) -> None:
+        """Print every stage, slowest first."""
+        total = sum(r.seconds for r in self.records) or 1.0
+        print(f'{"stage":32} {"seconds":>9} {"share":>6} {"in":>9} {"out":>9} {"peak MB":>8}  hot helper calls')
+        for r in sorted(self.records, key=lambda record: record.seconds, reverse=True):
+            if r.helper_calls is None:
+                calls = 'not counted, some ran in worker processes'
+            else:
+                calls = ', '.join(f'{h}={c}' + (f' ({r.cache_stats[h]["hits"]} cached)' if h in r.cache_stats else '')
+                                  for h, c in sorted(r.helper_calls.items(), key=lambda x: -x[1]))
+            peak = f'{r.peak_rss / 2 ** 20:8.1f}' if r.peak_rss >= 0 else f'{"?":>8}'
+            print(f'{r.name:32} {r.seconds:9.4f} {r.seconds / total:6.1%} {r.input_size:9} {r.output_size:9} '
+                  f'{peak}  {calls}')
+
+
+def _install_counters() -> None:
+    """Replace every hot helper in the helpers module with one that also
+    counts the call for the profiler counting in this thread, if any, unless
+    another profiler already did. Calls from other helpers go through the
+    module, so they are counted too.
+    """
+    global _counting
+    with _INSTALL_LOCK:
+        if _counting == 0:
+            for name in HOT_HELPERS:
+                _originals[name] = getattr(dbl, name)
+                setattr(dbl, name, _counted(name, _originals[name]))
+        _counting += 1
+
+
+def _remove_counters() -> None:
+    """Put the hot helpers back the way they were once the last profiler
+    counting them stops.
+    """
+    global _counting
+    with _INSTALL_LOCK:
+        _counting -= 1
+        if _counting == 0:
+            for name, func in _originals.items():
+                setattr(dbl, name, func)
+            _originals.clear()
+
+
+def _counted(name: str, func: Callable) -> Callable:
+    """Return func, but counting each call under name for the profiler
+    counting in this thread, if any.
+    """
+    @functools.wraps(func)  # so the helper still pickles by name, for the section pool
+    def counted(*args: Any, **kwargs: Any) -> Any:
+        counts = _COUNTS.get()
+        if counts is not None:
+            counts[name] += 1
+        return func(*args, **kwargs)
+    return counted
+
+
+def peak_rss() -> int:
+    """Return the most memory this process has used so far, in bytes,
+    or -1 if it cannot be measured here.
+    """
+    if resource is None:
+        return -1
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes everywhere else
@@ -0,0 +1,94 @@
+"""
+Convert a Word file again every time it is saved.
+
+    python converter.py --watch paper.docx [--config PATH] [--interval 0.5]
+
+The Word file is polled rather than watched through file system events,
+since Word saves by writing a temp file and renaming it, which those events
+report differently on every OS. A save is acted on once the file stops
+changing, and only if its contents changed.
+
+Every conversion reuses what it can from the ones before it:
+    - pandoc is not run again for a Word file it already converted, as long
+      as the pandoc_cache preference is on.
+    - sections that did not change are not repaired again by the stages that
+      only look inside one section.
+    - the PDF is not compiled again if the tex file did not change.
+"""
+import hashlib
+import os
+import time
+from typing import Any, Optional
+
+import converter as conv
+
+# cleanup would move away the aux files the next LaTeX run compares against, and waits two seconds first
+WATCH_OVERRIDES = {'skip_unchanged_pdf': True, 'cleanup': False}
+
+
+def watch(path: str, config: str, overrides: Optional[dict[str, Any]] = None, interval: float = 0.5) -> int:
+    """Convert the Word file at path with config, then convert it again every
+    time it is saved, until interrupted. Return 0.
+    """
+    overrides = {**(overrides or {}), **WATCH_OVERRIDES}
+    section_cache = {}
+    last_digest = None
+    last_stat = None
+    print(f'Watching {path}. Press Ctrl+C to stop.')
+    try:
+        while True:
+            stat = _stat(path)
+            if stat is not None and stat != last_stat:
+                time.sleep(interval)  # wait for Word to finish saving
+                if _stat(path) != stat:
+                    continue
+                last_stat = stat
+                digest = _digest(path)
+                if digest != last_digest:
+                    last_digest = digest
+                    _convert(path, config, overrides, section_cache)
+                    overrides['open_after_export'] = False  # once is enough; not a new window every save
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print('Stopped watching.')
+    return 0
+
+
+def _convert(path: str, config: str, overrides: dict[str, Any],
+             section_cache: dict[str, tuple[str, list[Any]]]) -> None:
+    """Convert the Word file at path, reusing and adding to section_cache.
+    Report what went wrong instead of raising it, so watching goes on.
+    """
+    start = time.perf_counter()
+    try:
+        preferences, replacement_mode = conv.check_config(config, overrides)
+        if replacement_mode:
+            print('Replacement mode needs a tex file to replace into, so it cannot be watched.')
+            return
+        word_file = conv.WordFile(path, preferences, disable_file_prompts=True, section_cache=section_cache)
+        word_file.sequence()
+    except Exception as e:
+        print(f'Converting {path} failed: {type(e).__name__}: {e}')
+        return
+    print(f'Converted {path} in {time.perf_counter() - start:.2f} s.')
+
+
+def _stat(path: str) -> Optional[tuple[int, int]]:
+    """Return the mtime and size of the file at path, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _digest(path: str) -> Optional[str]:
+    """Return the SHA-256 of the file at path, or None if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()